@@ -0,0 +1,134 @@
+import typing
+from dataclasses import dataclass
+from functools import reduce
+from operator import or_
+from starlette.datastructures import QueryParams
+from tortoise.query_utils import Q
+from utils import pagination
+from accounts.models import User
+from questions.models import Question, Answer
+
+# rows per dashboard page, memory use stays the same whatever the tables
+PAGE_SIZE = 25
+
+
+@dataclass
+class DashboardTable():
+    """
+    One dashboard tab: a model listed with keyset pagination, a set of
+    allowed orderings (each ending with the unique id) and the fields
+    searched by the filter box
+    """
+    model: typing.Any
+    sorts: typing.Dict[str, typing.Sequence[str]]
+    search: typing.Sequence[str]
+    related: typing.Sequence[str] = ()
+    filters: typing.Dict[str, typing.Dict] = None
+
+
+TABLES = {
+    "users": DashboardTable(
+        model=User,
+        sorts={
+            "newest": ("-id",),
+            "username": ("username", "id"),
+            "last_login": ("-last_login", "-id"),
+            "logins": ("-login_count", "-id"),
+        },
+        search=("username__icontains", "email__icontains"),
+    ),
+    "questions": DashboardTable(
+        model=Question,
+        sorts={
+            "newest": ("-id",),
+            "views": ("-view", "-id"),
+            "likes": ("-question_like", "-id"),
+        },
+        search=("title__icontains",),
+        related=("user",),
+        filters={
+            "solved": {"accepted_answer": True},
+            "open": {"accepted_answer": False},
+        },
+    ),
+    "answers": DashboardTable(
+        model=Answer,
+        sorts={
+            "newest": ("-id",),
+            "likes": ("-answer_like", "-id"),
+        },
+        search=("content__icontains",),
+        related=("ans_user",),
+    ),
+}
+
+
+async def summary_counts():
+    """
+    Totals shown above the tabs, one aggregate query each
+    """
+    return {
+        "users": await User.all().count(),
+        "questions": await Question.all().count(),
+        "solved": await Question.filter(accepted_answer=True).count(),
+        "answers": await Answer.all().count(),
+    }
+
+
+async def dashboard_table(request, name):
+    """
+    One page of a dashboard table for ?sort=, ?q=, ?filter= and
+    ?cursor= of the request, unknown values fall back to the defaults
+    """
+    table = TABLES[name]
+    params = QueryParams(request.url.query)
+    sort = params.get("sort")
+    if sort not in table.sorts:
+        sort = "newest"
+    queryset = table.model.all()
+    q = params.get("q", "").strip()
+    if q:
+        queryset = queryset.filter(reduce(or_, [
+            Q(**{field: q}) for field in table.search
+        ]))
+    current_filter = params.get("filter")
+    if table.filters and current_filter in table.filters:
+        queryset = queryset.filter(**table.filters[current_filter])
+    else:
+        current_filter = None
+    keyset = pagination.KeysetPagination(
+        pagination.get_cursor(url=request.url), table.sorts[sort], PAGE_SIZE,
+        model=table.model)
+    seek = keyset.filter()
+    if seek is not None:
+        queryset = queryset.filter(seek)
+    rows = await queryset.limit(keyset.limit()).order_by(
+        *keyset.query_ordering())
+    rows = keyset.paginate(rows)
+    if table.related:
+        await table.model.fetch_for_list(rows, *table.related)
+    # sorting or filtering starts again from the first page
+    base_url = request.url.remove_query_params("cursor")
+    return {
+        "tab": name,
+        "rows": rows,
+        "sort": sort,
+        "q": q,
+        "filter": current_filter,
+        "sort_urls": {
+            key: base_url.include_query_params(sort=key)
+            for key in table.sorts
+        },
+        "filter_urls": {
+            key: base_url.include_query_params(filter=key)
+            for key in table.filters or ()
+        },
+        "all_url": base_url.remove_query_params("filter"),
+        "page_controls": pagination.get_page_controls(
+            url=request.url,
+            current_page=None,
+            total_pages=None,
+            previous_cursor=keyset.previous_cursor,
+            next_cursor=keyset.next_cursor
+        ),
+    }
@@ -0,0 +1,88 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from settings import (
+    PASSWORD_HASH_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_QUEUE,
+)
+from accounts.models import hash_password, check_password
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised instead of queueing when the password hasher is saturated
+    """
+
+
+def hash_rounds(hashed_password):
+    """
+    Work factor of a bcrypt hash, eg. 12 for "$2a$12$..."
+    """
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher():
+    """
+    Runs bcrypt on a dedicated thread pool so hashing never blocks the
+    event loop (bcrypt releases the GIL while it works).
+
+    At most ``workers`` hashes run at once and ``queue_size`` more may
+    wait for a thread, further calls fail right away with
+    PasswordHasherBusy so a login burst cannot pile up unbounded work.
+    """
+
+    def __init__(self, workers, queue_size, rounds):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rounds = rounds
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = None
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="bcrypt")
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password):
+        return await self.run(hash_password, password, self.rounds)
+
+    async def check(self, password, hashed_password):
+        return await self.run(check_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password):
+        """
+        Whether a hash was made with another work factor than the
+        configured one
+        """
+        return hash_rounds(hashed_password) != self.rounds
+
+    async def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "rounds": self.rounds,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, PASSWORD_HASH_ROUNDS)
@@ -5,10 +5,11 @@ from tortoise import fields
 from starlette.authentication import (
     AuthenticationBackend,
     AuthenticationError,
-    SimpleUser,
+    BaseUser,
     AuthCredentials,
 )
-from settings import SECRET_KEY
+from settings import SECRET_KEY, USER_CACHE_TTL, USER_CACHE_SIZE
+from utils.cache import TTLCache
 
 # change this line to set another user as admin user
 ADMIN = "admin"
@@ -16,8 +17,8 @@ ADMIN = "admin"
 
 class User(Model):
     id = fields.IntField(pk=True)
-    username = fields.CharField(max_length=255)
-    email = fields.CharField(max_length=255)
+    username = fields.CharField(max_length=255, unique=True)
+    email = fields.CharField(max_length=255, unique=True)
     joined = fields.DatetimeField(auto_now_add=True)
     last_login = fields.DatetimeField(auto_now=True)
     login_count = fields.IntField()
@@ -27,6 +28,63 @@ class User(Model):
         return self.username
 
 
+# Users resolved from JWT tokens, keyed by the token "user_id" claim. The
+# cached rows are shared between requests and must not be modified. A
+# user deleted or logged in through another worker is seen here after
+# USER_CACHE_TTL seconds at most.
+user_cache = TTLCache(ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE)
+
+
+class UserPrincipal(BaseUser):
+    """
+    Authenticated user of a request, loaded once by the authentication
+    backend, views use ``request.user.id`` or ``request.user.user``
+    instead of querying the user table again
+    """
+
+    def __init__(self, user: User) -> None:
+        self.user = user
+        self.id = user.id
+        self.username = user.username
+
+    @property
+    def is_authenticated(self) -> bool:
+        return True
+
+    @property
+    def display_name(self) -> str:
+        return self.username
+
+    @property
+    def identity(self) -> str:
+        return str(self.id)
+
+
+async def load_user(user_id):
+    """
+    User of a token, from the user cache when possible. Tokens issued
+    before they carried the user id hold the username instead.
+    """
+    user = user_cache.get(user_id)
+    if user is None:
+        if isinstance(user_id, int):
+            user = await User.get_or_none(id=user_id)
+        else:
+            user = await User.get_or_none(username=user_id)
+        if user is not None:
+            user_cache.set(user_id, user)
+    return user
+
+
+def forget_user(user):
+    """
+    Drop a user from the user cache, call when the user logs in or is
+    deleted
+    """
+    user_cache.delete(user.id)
+    user_cache.delete(user.username)
+
+
 class UserAuthentication(AuthenticationBackend):
     async def authenticate(self, request):
         jwt_cookie = request.cookies.get("jwt")
@@ -37,32 +95,36 @@ class UserAuthentication(AuthenticationBackend):
                     str(SECRET_KEY),
                     algorithms=["HS256"]
                 )
-                if SimpleUser(payload["user_id"]).username == ADMIN:
-                    return (
-                        AuthCredentials(["authenticated", ADMIN]),
-                        SimpleUser(payload["user_id"]),
-                    )
-                else:
-                    return (
-                        AuthCredentials(["authenticated"]),
-                        SimpleUser(payload["user_id"]),
-                    )
-            except AuthenticationError:
+            except jwt.InvalidTokenError:
                 raise AuthenticationError("Invalid auth credentials")
+            user = await load_user(payload["user_id"])
+            if user is None:
+                # the user has been deleted
+                return
+            if user.username == ADMIN:
+                return (
+                    AuthCredentials(["authenticated", ADMIN]),
+                    UserPrincipal(user),
+                )
+            else:
+                return (
+                    AuthCredentials(["authenticated"]),
+                    UserPrincipal(user),
+                )
         else:
             # unauthenticated
             return
 
 
-def hash_password(password: str):
-    return bcrypt.hashpw(password, bcrypt.gensalt())
+def hash_password(password: str, rounds: int = 12):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
 
 
 def check_password(password: str, hashed_password):
     return bcrypt.checkpw(password, hashed_password)
 
 
-def generate_jwt(user_id):
+def generate_jwt(user_id: int):
     payload = {"user_id": user_id}
     token = jwt.encode(payload, str(SECRET_KEY),
                        algorithm="HS256").decode("utf-8")
@@ -5,7 +5,8 @@ from accounts.views import (
     login,
     profile,
     dashboard,
-    user_delete
+    user_delete,
+    job_status,
 )
 
 
@@ -19,4 +20,6 @@ accounts_routes = Router([
     Route("/dashboard", endpoint=dashboard, methods=["GET"], name="dashboard"),
     Route("/user-delete/{id:int}", endpoint=user_delete,
           methods=["GET", "POST"], name="user_delete"),
+    Route("/jobs/{id:int}", endpoint=job_status,
+          methods=["GET"], name="job_status"),
 ])
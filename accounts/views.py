@@ -1,65 +1,102 @@
 import datetime
 from settings import templates, BASE_HOST
-from starlette.responses import RedirectResponse
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, RedirectResponse
 from starlette.authentication import requires
-from tortoise.transactions import in_transaction
+from tortoise.exceptions import IntegrityError
+from tortoise.query_utils import Q
 from accounts.forms import RegistrationForm, LoginForm
 from accounts.models import (
     User,
-    check_password,
     generate_jwt,
-    hash_password,
+    forget_user,
     ADMIN,
 )
+from accounts.hashing import password_hasher, PasswordHasherBusy
+from accounts.dashboard import TABLES, dashboard_table, summary_counts
 from questions.models import (
     Question,
     Answer
 )
+from questions.deletion import job_runner
+from questions.viewcounter import view_counter
+from questions.cards import card_cache
+from utils.dbpool import pool_summary
+from utils.jobs import Job
+
+# background jobs listed on the dashboard, latest first
+RECENT_JOBS = 10
+
+
+def busy_response(request, template, form):
+    """
+    Form page telling the user to retry, the password hasher is saturated
+    """
+    user_error = "Too many requests right now, please try again."
+    return templates.TemplateResponse(
+        template,
+        {
+            "request": request,
+            "form": form,
+            "user_error": user_error,
+        },
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
 
 
 async def register(request):
     """
     Validate form, register and authenticate user with JWT token
     """
-    results = await User.all()
     data = await request.form()
     form = RegistrationForm(data)
     username = form.username.data
     email = form.email.data
     password = form.password.data
+    user_error = "User with that email or username already exists."
     if request.method == "POST" and form.validate():
-        for result in results:
-            if email == result.email or username == result.username:
-                user_error = "User with that email or username already exists."
-                return templates.TemplateResponse(
-                    "accounts/register.html",
-                    {
-                        "request": request,
-                        "form": form,
-                        "user_error": user_error
-                    },
-                )
+        # both columns are unique, so this is two index lookups
+        if await User.filter(Q(username=username) | Q(email=email)).first():
+            return templates.TemplateResponse(
+                "accounts/register.html",
+                {
+                    "request": request,
+                    "form": form,
+                    "user_error": user_error
+                },
+            )
+        try:
+            hashed_password = await password_hasher.hash(password)
+        except PasswordHasherBusy:
+            return busy_response(request, "accounts/register.html", form)
         query = User(
             username=username,
             email=email,
             joined=datetime.datetime.now(),
             last_login=datetime.datetime.now(),
             login_count=1,
-            password=hash_password(password),
+            password=hashed_password,
         )
-        await query.save()
-        user_query = await User.get(
-            username=username)
-        hashed_password = user_query.password
-        valid_password = check_password(password, hashed_password)
-        response = RedirectResponse(url="/", status_code=302)
-        if valid_password:
-            response.set_cookie(
-                "jwt", generate_jwt(user_query.username), httponly=True
-            )
-            response.set_cookie(
-                "admin", ADMIN, httponly=True
+        try:
+            await query.save()
+        except IntegrityError:
+            # registered concurrently with the same username or email
+            return templates.TemplateResponse(
+                "accounts/register.html",
+                {
+                    "request": request,
+                    "form": form,
+                    "user_error": user_error
+                },
             )
+        response = RedirectResponse(url="/", status_code=302)
+        response.set_cookie(
+            "jwt", generate_jwt(query.id), httponly=True
+        )
+        response.set_cookie(
+            "admin", ADMIN, httponly=True
+        )
         return response
     return templates.TemplateResponse(
         "accounts/register.html", {
@@ -83,7 +120,8 @@ async def login(request):
             results = await User.get(
                 username=username)
             hashed_password = results.password
-            valid_password = check_password(password, hashed_password)
+            valid_password = await password_hasher.check(
+                password, hashed_password)
             if not valid_password:
                 user_error = "Invalid username or password"
                 return templates.TemplateResponse(
@@ -94,18 +132,27 @@ async def login(request):
                         "user_error": user_error
                     },
                 )
+            if password_hasher.needs_rehash(hashed_password):
+                # the work factor changed, upgrade the stored hash
+                try:
+                    results.password = await password_hasher.hash(password)
+                except PasswordHasherBusy:
+                    pass
             # update login counter and login time
             results.login_count += 1
             results.last_login = datetime.datetime.now()
             await results.save()
+            forget_user(results)
             response = RedirectResponse(BASE_HOST + path, status_code=302)
             response.set_cookie(
-                "jwt", generate_jwt(results.username), httponly=True
+                "jwt", generate_jwt(results.id), httponly=True
             )
             response.set_cookie(
                 "admin", ADMIN, httponly=True
             )
             return response
+        except PasswordHasherBusy:
+            return busy_response(request, "accounts/login.html", form)
         except:  # noqa
             user_error = "Please register you don't have account"
             return templates.TemplateResponse(
@@ -130,21 +177,9 @@ async def user_delete(request):
     """
     id = request.path_params["id"]
     if request.method == "POST":
-        async with in_transaction() as conn:
-            await conn.execute_query(
-                f'DELETE FROM tag WHERE tag.id IN \
-                (SELECT question_tag.tag_id FROM question \
-                JOIN question_tag ON question_tag.question_id = question.id \
-                JOIN "user" ON "user".id = question.user_id \
-                WHERE "user".id = {id})'
-            )
-        async with in_transaction() as conn:
-            await conn.execute_query(
-                f'UPDATE question SET accepted_answer = false \
-                FROM answer, "user" WHERE question.id = answer.question_id \
-                AND "user".id = {id} AND question.accepted_answer = true'
-            )
-        await User.get(id=id).delete()
+        # the questions, answers and likes of the user are deleted first,
+        # in batches of a background job
+        await job_runner.submit("user_delete", id)
         if request.user.username == ADMIN:
             return RedirectResponse(url="/accounts/dashboard", status_code=302)
         request.session.clear()
@@ -155,28 +190,49 @@ async def user_delete(request):
 
 @requires(["authenticated", ADMIN], redirect="index")
 async def dashboard(request):
+    """
+    Summary counts and one page of the selected table, ?tab= picks the
+    table so the other tabs are only loaded when opened
+    """
     if request.user.is_authenticated:
         auth_user = request.user.display_name
-        results = await User.all()
-        questions = await Question.all().prefetch_related('user')
-        answers = await Answer.all()
+        tab = request.query_params.get("tab")
+        if tab not in TABLES:
+            tab = "users"
+        context = await dashboard_table(request, tab)
+        context.update({
+            "request": request,
+            "auth_user": auth_user,
+            "tabs": [
+                (name, request.url.replace(query="tab=" + name))
+                for name in TABLES
+            ],
+            "summary": await summary_counts(),
+            "view_stats": view_counter.stats(),
+            "card_stats": card_cache.stats(),
+            "pools": pool_summary(),
+            "jobs": await Job.all().order_by("-id").limit(RECENT_JOBS),
+        })
         return templates.TemplateResponse(
-            "accounts/dashboard.html",
-            {
-                "request": request,
-                "results": results,
-                "questions": questions,
-                "answers": answers,
-                "auth_user": auth_user
-            },
-        )
+            "accounts/dashboard.html", context)
+
+
+@requires(["authenticated", ADMIN])
+async def job_status(request):
+    """
+    State of a background job, polled by the dashboard
+    """
+    job = await Job.get_or_none(id=request.path_params["id"])
+    if job is None:
+        raise HTTPException(status_code=404)
+    return JSONResponse(job.state())
 
 
 @requires("authenticated", redirect="index")
 async def profile(request):
     if request.user.is_authenticated:
         auth_user = request.user.display_name
-        results = await User.get(username=auth_user)
+        results = request.user.user
         questions = await Question.all().filter(user_id=results.id)
         answers = await Answer.all().filter(ans_user_id=results.id)
         data = await request.form()
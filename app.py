@@ -1,14 +1,51 @@
 from starlette.applications import Starlette
-from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.authentication import AuthenticationMiddleware
 from secure import SecureHeaders
-from starlette.staticfiles import StaticFiles
 from starlette.routing import Route
 from tortoise.contrib.starlette import register_tortoise
-from settings import templates, DB_URI, SECRET_KEY
+from settings import (
+    templates,
+    streaming_templates,
+    TORTOISE_CONFIG,
+    SECRET_KEY,
+    TEMPLATE_WARMUP,
+    STATIC_BUILD_DIR,
+    static_manifest,
+    SESSION_BACKEND,
+    SESSION_DB,
+    SESSION_MAX_AGE,
+    VIEWED_TTL,
+    SQL_INSTRUMENTATION,
+    SLOW_REQUEST_QUERIES,
+    SLOW_REQUEST_DB_MS,
+    METRICS_ENABLED,
+    METRICS_TOKEN,
+    METRICS_PUBLIC,
+    DB_REPLICAS,
+    DB_REPLICA_PIN,
+    DB_REPLICA_RETRY,
+)
 from accounts.models import UserAuthentication
 from accounts.routes import accounts_routes
 from questions.routes import questions_routes
+from questions.fulltext import create_search_index
+from questions.tagging import create_tag_indexes
+from questions.viewcounter import view_counter, VIEWED_KEY
+from questions.deletion import job_runner
+from accounts.hashing import password_hasher
+from utils.conditional import NotModified, not_modified_response
+from utils.templatecache import load_templates
+from utils.staticfiles import HashedStaticFiles
+from utils.middleware import SecureHeadersMiddleware
+from utils.sessions import ServerSessionMiddleware, make_session_store
+from utils.querylog import QueryLogMiddleware, instrument_queries
+from utils.dbpool import instrument_pools, warm_up_pools
+from utils.dbrouter import DatabaseRouter, ReplicaRoutingMiddleware
+from utils.metrics import (
+    MetricsMiddleware,
+    loop_lag_monitor,
+    metrics_endpoint,
+)
 
 
 # Security Headers are HTTP response headers that, when set,
@@ -31,21 +68,50 @@ async def index(request):
 routes = [
     Route("/", index),
 ]
+if METRICS_ENABLED:
+    routes.append(
+        Route("/metrics", metrics_endpoint(METRICS_TOKEN, METRICS_PUBLIC),
+              name="metrics"))
 
 
 app = Starlette(debug=True, routes=routes)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", HashedStaticFiles(
+    directory="static",
+    build_directory=STATIC_BUILD_DIR,
+    manifest=static_manifest,
+), name="static")
 app.mount("/accounts", accounts_routes)
 app.mount("/questions", questions_routes)
 app.add_middleware(AuthenticationMiddleware, backend=UserAuthentication())
-app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+# inside the sessions, which remember recent writes
+db_router = DatabaseRouter(
+    DB_REPLICAS, pin_seconds=DB_REPLICA_PIN, retry_seconds=DB_REPLICA_RETRY)
+app.add_middleware(ReplicaRoutingMiddleware, router=db_router)
+session_store = make_session_store(SESSION_BACKEND, SESSION_DB)
+app.add_middleware(
+    ServerSessionMiddleware,
+    store=session_store,
+    secret_key=SECRET_KEY,
+    max_age=SESSION_MAX_AGE,
+    # the questions viewed are only worth keeping until the filter resets
+    transient_keys=(VIEWED_KEY,),
+    transient_max_age=int(VIEWED_TTL),
+)
 
-# middleware for secure headers
-@app.middleware("http")
-async def set_secure_headers(request, call_next):
-    response = await call_next(request)
-    secure_headers.starlette(response)
-    return response
+# security headers of every response, encoded once
+app.add_middleware(SecureHeadersMiddleware, headers=secure_headers.headers())
+
+# requests by route name, inside the query log to see its queries
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, routes=app.routes)
+
+# outermost, so the queries of every middleware are counted too
+if SQL_INSTRUMENTATION:
+    app.add_middleware(
+        QueryLogMiddleware,
+        max_queries=SLOW_REQUEST_QUERIES,
+        max_db_ms=SLOW_REQUEST_DB_MS,
+    )
 
 
 @app.exception_handler(404)
@@ -58,6 +124,14 @@ async def not_found(request, exc):
     return templates.TemplateResponse(template, context, status_code=404)
 
 
+@app.exception_handler(NotModified)
+async def not_modified(request, exc):
+    """
+    Return an empty HTTP 304 response, the client copy is current.
+    """
+    return not_modified_response(exc)
+
+
 @app.exception_handler(500)
 async def server_error(request, exc):
     """
@@ -68,8 +142,41 @@ async def server_error(request, exc):
     return templates.TemplateResponse(template, context, status_code=500)
 
 
+def warm_up_templates():
+    """
+    Compile every template before the first request.
+    """
+    for env in (templates.env, streaming_templates.env):
+        load_templates(env)
+
+
+if TEMPLATE_WARMUP:
+    app.add_event_handler("startup", warm_up_templates)
+
+# registered before Tortoise so the final flush on shutdown runs while
+# database connections are still open
+app.add_event_handler("startup", view_counter.start)
+app.add_event_handler("shutdown", view_counter.stop)
+app.add_event_handler("shutdown", job_runner.stop)
+app.add_event_handler("shutdown", password_hasher.stop)
+app.add_event_handler("shutdown", session_store.close)
+if METRICS_ENABLED:
+    app.add_event_handler("startup", loop_lag_monitor.start)
+    app.add_event_handler("shutdown", loop_lag_monitor.stop)
+
 register_tortoise(
-    app, db_url=DB_URI,
-    modules={"models": ["accounts.models", "questions.models"]},
+    app, config=TORTOISE_CONFIG,
     generate_schemas=True
 )
+
+# run after the Tortoise startup handler registered above
+app.add_event_handler("startup", warm_up_pools)
+app.add_event_handler("startup", instrument_pools)
+app.add_event_handler("startup", create_search_index)
+app.add_event_handler("startup", create_tag_indexes)
+if SQL_INSTRUMENTATION:
+    app.add_event_handler("startup", instrument_queries)
+app.add_event_handler("startup", db_router.start)
+app.add_event_handler("shutdown", db_router.stop)
+# resumes the jobs left unfinished by the last run
+app.add_event_handler("startup", job_runner.start)
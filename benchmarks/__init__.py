@@ -0,0 +1,6 @@
+import os
+
+# Benchmarks run against their own throwaway databases, settings.py only
+# needs these to be present to import.
+os.environ.setdefault("DB_URI", "sqlite://:memory:")
+os.environ.setdefault("SECRET_KEY", "benchmark")
@@ -0,0 +1,111 @@
+"""
+Latency of concurrent question listings while a prolific user is
+deleted: inline, with the cascading delete of the previous user_delete
+view, and as a background job in batches of --batch-size rows.
+
+Runs against a seeded temporary SQLite file where user 1 owns half of
+the questions and wrote half of the answers.
+
+    python -m benchmarks.deletion --questions 5000 --answers 20000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from tortoise import Tortoise
+import migrations
+from accounts.models import User
+from questions import fulltext
+from questions.deletion import DELETE_STEPS, plan_user_delete
+from questions.models import Question, Answer
+from questions.tagging import release_tags
+from utils.jobs import DONE, FAILED, Job, JobRunner
+from benchmarks.seed import (
+    init_db,
+    seed_answers,
+    seed_questions,
+    seed_tags,
+    temp_db_url,
+)
+
+PAGE_SIZE = 20
+USER_ID = 1
+
+
+async def inline_delete(args):
+    await release_tags(user_id=USER_ID)
+    own = await Question.filter(
+        user_id=USER_ID).values_list("id", flat=True)
+    answered = await Answer.filter(
+        ans_user_id=USER_ID).values_list("question_id", flat=True)
+    await (await User.get(id=USER_ID)).delete()
+    for question_id in own:
+        await fulltext.remove_question(question_id)
+    for question_id in set(answered) - set(own):
+        await fulltext.index_question(question_id)
+
+
+async def job_delete(args):
+    runner = JobRunner(
+        batch_size=args.batch_size, pause=args.pause, interval=0.1)
+    runner.register("user_delete", plan_user_delete, DELETE_STEPS)
+    await runner.start()
+    job = await runner.submit("user_delete", USER_ID)
+    while True:
+        job = await Job.get(id=job.id)
+        if job.status in (DONE, FAILED):
+            break
+        await asyncio.sleep(0.05)
+    await runner.stop()
+    if job.status == FAILED:
+        raise RuntimeError("Deletion job failed: " + job.error)
+
+
+async def run(args, label, delete):
+    await init_db(temp_db_url("bench_deletion"))
+    await seed_questions(args.questions, users=2)
+    await seed_answers(args.answers)
+    await seed_tags(args.tags)
+    # indexes of question_tag the cascades look rows up with
+    await migrations.migrate()
+    await fulltext.reindex()
+    latencies = []
+    deleting = True
+
+    async def reader():
+        while deleting:
+            start = time.perf_counter()
+            await Question.all().order_by("-id").limit(
+                PAGE_SIZE).prefetch_related("user")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    readers = [asyncio.ensure_future(reader())
+               for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    await delete(args)
+    elapsed = time.perf_counter() - start
+    deleting = False
+    await asyncio.gather(*readers)
+    latencies.sort()
+    print("{:>8} {:>10.2f} {:>8} {:>9.2f} {:>9.2f} {:>9.1f}".format(
+        label, elapsed, len(latencies), statistics.median(latencies),
+        latencies[int(len(latencies) * 0.99) - 1], latencies[-1]))
+    await Tortoise.close_connections()
+
+
+async def main(args):
+    print("{:>8} {:>10} {:>8} {:>9} {:>9} {:>9}".format(
+        "delete", "seconds", "reads", "p50 ms", "p99 ms", "max ms"))
+    await run(args, "inline", inline_delete)
+    await run(args, "job", job_delete)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--answers", type=int, default=20000)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--pause", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,102 @@
+"""
+Render time of listing pages with the question card cache on and off.
+
+Loads a window of seeded questions with their authors, tags and answer
+counts once, then renders questions/questions.html for consecutive pages
+over it, so only template work is measured.
+
+    python -m benchmarks.fragments --questions 2000 --page-size 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from starlette.authentication import AuthCredentials, UnauthenticatedUser
+from starlette.requests import Request
+from tortoise import Tortoise
+from app import app
+from settings import templates
+from questions.models import Question
+from questions.listing import answer_counts
+from questions import cards
+from utils.fragments import FragmentCache
+from benchmarks.seed import init_db, seed_questions, temp_db_url
+
+
+def make_request():
+    return Request({
+        "type": "http",
+        "app": app,
+        "router": app.router,
+        "scheme": "http",
+        "server": ("localhost", 8000),
+        "method": "GET",
+        "root_path": "",
+        "path": "/questions/",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost:8000")],
+        "session": {},
+        "auth": AuthCredentials(),
+        "user": UnauthenticatedUser(),
+    })
+
+
+def render_pages(request, pages):
+    template = templates.get_template("questions/questions.html")
+    for results in pages:
+        template.render({
+            "request": request,
+            "results": results,
+            "cards": cards.render_cards(request, results),
+            "page_controls": [],
+        })
+
+
+def timed(request, pages, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render_pages(request, pages)
+        timings.append((time.perf_counter() - start) * 1000 / len(pages))
+    return statistics.median(timings)
+
+
+async def main(args):
+    await init_db(temp_db_url("bench_fragments"))
+    await seed_questions(args.questions)
+    rows = await (
+        Question.all()
+        .prefetch_related("user", "tags")
+        .order_by("-id")
+        .limit(args.questions)
+    )
+    answers = await answer_counts([row.id for row in rows])
+    results = [(row, answers.get(row.id, 0)) for row in rows]
+    pages = [
+        results[offset:offset + args.page_size]
+        for offset in range(0, len(results), args.page_size)
+    ]
+    request = make_request()
+    print("{} questions, {} pages of {}".format(
+        len(results), len(pages), args.page_size))
+    print("{:<8} {:>12} {:>10} {:>12}".format(
+        "cache", "ms/page", "hit ratio", "cache KiB"))
+    for name, maxbytes in (("off", 0), ("on", args.maxbytes)):
+        cards.card_cache = FragmentCache(maxbytes=maxbytes)
+        # first pass fills the cache
+        render_pages(request, pages)
+        ms = timed(request, pages, args.repeat)
+        stats = cards.card_cache.stats()
+        print("{:<8} {:>12.3f} {:>10.2f} {:>12.1f}".format(
+            name, ms, stats["hit_ratio"], stats["bytes"] / 1024))
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--maxbytes", type=int, default=64 * 1024 * 1024)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,73 @@
+"""
+Event-loop latency during a login storm, with bcrypt checks run inline
+on the loop (as before) and on the bounded password hasher.
+
+A ticker task sleeps 1 ms in a loop and records how late it wakes up
+while ``--logins`` password checks are in flight at once.
+
+    python -m benchmarks.hashing --logins 50 --rounds 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from accounts.models import hash_password, check_password
+from accounts.hashing import PasswordHasher, PasswordHasherBusy
+
+TICK = 0.001
+
+
+async def ticker(lags, done):
+    while not done.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append((time.perf_counter() - start - TICK) * 1000)
+
+
+async def inline_login(password, hashed_password):
+    return check_password(password, hashed_password)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def storm(login, logins):
+    lags, done = [], asyncio.Event()
+    tick = asyncio.ensure_future(ticker(lags, done))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[login() for _ in range(logins)], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    rejected = sum(isinstance(r, PasswordHasherBusy) for r in results)
+    return lags, elapsed, rejected
+
+
+async def main(args):
+    hashed_password = hash_password("secret", args.rounds)
+    hasher = PasswordHasher(args.workers, args.queue, args.rounds)
+    print("{} concurrent logins, work factor {}, {} workers, queue {}".format(
+        args.logins, args.rounds, args.workers, args.queue))
+    print("{:<10} {:>8} {:>8} {:>8} {:>9} {:>9}".format(
+        "mode", "p50 ms", "p99 ms", "max ms", "total s", "rejected"))
+    for name, login in (
+            ("inline", lambda: inline_login("secret", hashed_password)),
+            ("executor", lambda: hasher.check("secret", hashed_password))):
+        lags, elapsed, rejected = await storm(login, args.logins)
+        print("{:<10} {:>8.2f} {:>8.2f} {:>8.2f} {:>9.2f} {:>9}".format(
+            name, statistics.median(lags), percentile(lags, 0.99),
+            max(lags), elapsed, rejected))
+    await hasher.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+"""
+Hot lookups with and without the declared indexes on a seeded SQLite
+database. "before" runs each query with SQLite's NOT INDEXED clause, as
+on a database created before the indexes were declared, "after" lets
+the planner use them. The registration duplicate check is compared with
+the previous load-every-user check.
+
+    python -m benchmarks.indexes --users 20000 --questions 50000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from tortoise import Tortoise
+from tortoise.query_utils import Q
+from accounts.models import User
+from benchmarks.seed import (
+    init_db,
+    seed_answers,
+    seed_questions,
+    temp_db_url,
+)
+
+# (name, table, rest of the query, parameters)
+QUERIES = [
+    ("user by username", "user", "WHERE username = ?", ["user{middle}"]),
+    ("user by email", "user", "WHERE email = ?",
+     ["user{middle}@example.com"]),
+    ("questions of a user", "question", "WHERE user_id = ?", ["{user_id}"]),
+    ("answers of a question", "answer", "WHERE question_id = ?",
+     ["{question_id}"]),
+    ("answers of a user", "answer", "WHERE ans_user_id = ?", ["{user_id}"]),
+    ("most viewed page", "question", "ORDER BY view DESC, id DESC LIMIT 20",
+     []),
+    ("newest page", "question", "ORDER BY created DESC, id DESC LIMIT 20",
+     []),
+]
+
+
+async def timed(query, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await query()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def old_duplicate_check(username, email):
+    for user in await User.all():
+        if email == user.email or username == user.username:
+            return True
+    return False
+
+
+async def duplicate_check(username, email):
+    return bool(
+        await User.filter(Q(username=username) | Q(email=email)).first())
+
+
+async def main(args):
+    await init_db(temp_db_url("bench_indexes"))
+    await seed_questions(args.questions, users=args.users)
+    await seed_answers(args.answers)
+    db = Tortoise.get_connection("default")
+    user = await User.get(username="user{}".format(args.users // 2))
+    question_ids = await db.execute_query_dict(
+        "SELECT question_id FROM answer LIMIT 1")
+    values = {
+        "middle": args.users // 2,
+        "user_id": user.id,
+        "question_id": question_ids[0]["question_id"],
+    }
+    print("{} users, {} questions, {} answers".format(
+        args.users, args.questions, args.answers))
+    print("{:<24} {:>12} {:>12}".format("query", "before ms", "after ms"))
+    for name, table, rest, params in QUERIES:
+        params = [param.format(**values) for param in params]
+        timings = []
+        for hint in ("NOT INDEXED", ""):
+            sql = 'SELECT * FROM "{}" {} {}'.format(table, hint, rest)
+            timings.append(await timed(
+                lambda: db.execute_query_dict(sql, params), args.repeat))
+        print("{:<24} {:>12.3f} {:>12.3f}".format(name, *timings))
+    username, email = "newcomer", "newcomer@example.com"
+    before = await timed(
+        lambda: old_duplicate_check(username, email), args.repeat)
+    after = await timed(lambda: duplicate_check(username, email), args.repeat)
+    print("{:<24} {:>12.3f} {:>12.3f}".format(
+        "register check", before, after))
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--questions", type=int, default=50000)
+    parser.add_argument("--answers", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,457 @@
+"""
+In-process load test of every route of questions/routes.py and
+accounts/routes.py, anonymous, as a user and as the admin.
+
+Seeds a local SQLite file through the models (unless --reuse is given
+and the file exists), starts the app with its startup handlers and sends
+each scenario --requests times straight to the ASGI app, keeping cookies
+like a browser. Write scenarios create their own rows and delete them
+again. Prints throughput, p50/p95/p99 latency and queries per request
+(from the SQL instrumentation) and saves them as JSON; --compare prints
+the change against an earlier report.
+
+    python -m benchmarks.load --questions 2000 --requests 50
+    python -m benchmarks.load --reuse --compare benchmarks/results/a.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+PASSWORD = "benchmark"
+class Browser():
+    """
+    Sends requests to the ASGI app with the cookies it was given
+    """
+
+    def __init__(self, app, cookies=None):
+        self.app = app
+        self.cookies = dict(cookies or {})
+
+    async def request(self, method, path, data=None):
+        path, _, query = path.partition("?")
+        body = urlencode(data or {}).encode()
+        headers = [(b"host", b"localhost:8000")]
+        if self.cookies:
+            headers.append((b"cookie", "; ".join(
+                "{}={}".format(k, v) for k, v in self.cookies.items()
+            ).encode()))
+        if method == "POST":
+            headers.append(
+                (b"content-type", b"application/x-www-form-urlencoded"))
+        status = None
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] != "http.response.start":
+                return
+            status = message["status"]
+            for name, value in message["headers"]:
+                if name != b"set-cookie":
+                    continue
+                for key, morsel in SimpleCookie(value.decode()).items():
+                    if morsel.value in ("", "null"):
+                        self.cookies.pop(key, None)
+                    else:
+                        self.cookies[key] = morsel.value
+
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "scheme": "http",
+            "server": ("localhost", 8000),
+            "client": ("127.0.0.1", 50000),
+            "method": method,
+            "root_path": "",
+            "path": path,
+            "query_string": query.encode(),
+            "headers": headers,
+        }
+        await self.app(scope, receive, send)
+        # every query, also those of a streamed body
+        self.queries = scope["query_log"].count
+        return status
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def seed(args):
+    from tortoise import Tortoise
+    from questions import fulltext
+    from benchmarks.seed import (
+        init_db,
+        seed_account,
+        seed_answers,
+        seed_questions,
+        seed_tags,
+    )
+    from settings import PASSWORD_HASH_ROUNDS
+    await init_db(os.environ["DB_URI"])
+    # created first, so they get seeded questions too
+    for username in ("admin", "loadtest"):
+        await seed_account(username, PASSWORD, PASSWORD_HASH_ROUNDS)
+    await seed_questions(args.questions, users=args.users)
+    await seed_answers(args.answers)
+    await seed_tags(args.tags)
+    await fulltext.reindex()
+    await Tortoise.close_connections()
+
+
+def cycle(items, n):
+    return [items[i % len(items)] for i in range(n)]
+
+
+async def read_scenarios(args):
+    """
+    (name, role, [(method, path, form data, expected status)]) of the
+    reads of every page and of the write forms, ids picked from the
+    seeded rows
+    """
+    from accounts.models import User
+    from questions.models import Question, Answer, Tag
+    n = args.requests
+    user = await User.get(username="loadtest")
+    questions = await Question.all().order_by("-id").limit(n)
+    own = await Question.filter(user_id=user.id).order_by("-id").first()
+    answer = await Answer.all().order_by("-id").first()
+    tag = await Tag.filter(question_count__gt=0).first()
+    word = questions[0].title.split()[2]
+    pages = [
+        ("index", "/"),
+        ("questions_all", "/questions/"),
+        ("questions_all page 3", "/questions/?page=3"),
+        ("questions_solved", "/questions/solved"),
+        ("questions_open", "/questions/open"),
+        ("questions_viewed", "/questions/viewed"),
+        ("questions_oldest", "/questions/oldest"),
+        ("tags", "/questions/tags/{}".format(tag.name)),
+        ("tags_categories", "/questions/categories"),
+        ("search", "/questions/search?q={}".format(word)),
+        ("login form", "/accounts/login?next=/"),
+        ("register form", "/accounts/register"),
+    ]
+    plan = []
+    for role in ("anonymous", "user"):
+        for name, path in pages:
+            plan.append((name, role, [("GET", path, None, 200)] * n))
+        plan.append(("question", role, [
+            ("GET", "/questions/{}/{}".format(q.id, q.slug), None, 200)
+            for q in cycle(questions, n)
+        ]))
+    answer_next = "?next=/questions/{}/{}".format(own.id, own.slug)
+    return plan + [
+        ("profile", "user", [("GET", "/accounts/profile", None, 200)] * n),
+        ("dashboard", "admin", [
+            ("GET", "/accounts/dashboard", None, 200)] * n),
+        ("dashboard questions", "admin", [
+            ("GET", "/accounts/dashboard?tab=questions&sort=views",
+             None, 200)] * n),
+        ("question_create form", "user", [
+            ("GET", "/questions/create", None, 200)] * n),
+        ("question_edit form", "user", [
+            ("GET", "/questions/edit/{}".format(own.id), None, 200)] * n),
+        ("answer_create form", "user", [
+            ("GET", "/questions/answer-create" + answer_next,
+             None, 200)] * n),
+        ("answer_edit form", "user", [
+            ("GET", "/questions/answer-edit/{}".format(answer.id),
+             None, 200)] * n),
+        ("question like", "user", [
+            ("POST", "/questions/{}/{}".format(q.id, q.slug),
+             {"question_id": q.id}, 302) for q in cycle(questions, n)]),
+        ("login", "anonymous", [
+            ("POST", "/accounts/login?next=/",
+             {"username": "loadtest", "password": PASSWORD}, 302)] * n),
+        ("logout", "user", [("GET", "/accounts/logout", None, 302)] * n),
+    ]
+
+
+async def create_scenarios(args):
+    """
+    Questions and users created for the later write scenarios
+    """
+    from questions.models import Tag
+    tag = await Tag.filter(question_count__gt=0).first()
+    return [
+        ("question_create", "user", [
+            ("POST", "/questions/create", {
+                "title": "Load test question {}".format(i),
+                "content": "Posted by the load test",
+                "tags": "loadtest, {}".format(tag.name),
+            }, 302) for i in range(args.requests)]),
+        ("register", "anonymous", [
+            ("POST", "/accounts/register", {
+                "username": "loadtest{}".format(i),
+                "email": "loadtest{}@example.com".format(i),
+                "password": PASSWORD,
+                "confirm": PASSWORD,
+            }, 302) for i in range(args.requests)]),
+    ]
+
+
+async def created_questions():
+    from questions.models import Question
+    return await Question.filter(
+        title__startswith="Load test question").order_by("id")
+
+
+async def edit_scenarios(args):
+    questions = await created_questions()
+    return [
+        ("question_edit", "user", [
+            ("POST", "/questions/edit/{}".format(q.id), {
+                "title": "Load test question {} edited".format(q.id),
+                "content": "Edited by the load test",
+                "tags": "loadtest",
+            }, 302) for q in questions]),
+        ("answer_create", "user", [
+            ("POST", "/questions/answer-create?next=/questions/{}/{}".format(
+                q.id, q.slug), {"content": "Load test answer"}, 302)
+            for q in questions]),
+    ]
+
+
+async def delete_scenarios(args):
+    """
+    Answer and delete scenarios on the rows of the write scenarios, the
+    database is left as seeded
+    """
+    from accounts.models import User
+    from questions.models import Answer
+    questions = await created_questions()
+    answers = await Answer.filter(
+        question_id__in=[q.id for q in questions]).order_by("id")
+    registered = await User.filter(
+        username__startswith="loadtest").exclude(username="loadtest")
+    accept = "/questions/accepted-answer?next=/questions/{}/x/{}"
+    return [
+        ("answer_edit", "user", [
+            ("POST", "/questions/answer-edit/{}".format(a.id),
+             {"content": "Edited load test answer"}, 302) for a in answers]),
+        ("accepted_answer form", "user", [
+            ("GET", accept.format(a.question_id, a.id), None, 200)
+            for a in answers]),
+        ("accepted_answer", "user", [
+            ("POST", accept.format(a.question_id, a.id),
+             {"answer_id": a.id}, 302) for a in answers]),
+        ("answer_delete", "user", [
+            ("POST", "/questions/answer-delete/{}".format(a.id), None, 302)
+            for a in answers]),
+        ("question_delete", "user", [
+            ("POST", "/questions/delete/{}".format(q.id), None, 302)
+            for q in questions]),
+        ("user_delete", "admin", [
+            ("POST", "/accounts/user-delete/{}".format(u.id), None, 302)
+            for u in registered]),
+    ]
+
+
+# scenario builders, each run after the scenarios of the one before
+STAGES = [read_scenarios, create_scenarios, edit_scenarios, delete_scenarios]
+
+
+async def run_scenario(app, cookies, requests, concurrency):
+    """
+    Latencies (ms), queries and unexpected statuses of the requests,
+    sent by ``concurrency`` browsers at a time
+    """
+    latencies, queries, errors = [], [], []
+    pending = list(requests)
+
+    async def worker():
+        browser = Browser(app, cookies)
+        while pending:
+            method, path, data, expected = pending.pop(0)
+            start = time.perf_counter()
+            status = await browser.request(method, path, data)
+            latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(browser.queries)
+            if status != expected:
+                errors.append("{} {} -> {}".format(method, path, status))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, queries, errors, time.perf_counter() - start
+
+
+def summary(latencies, queries, errors, elapsed):
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "queries": statistics.mean(queries),
+    }
+
+
+async def finish_jobs():
+    """
+    Wait for the deletions queued by the delete scenarios, they run as
+    background jobs
+    """
+    from utils.jobs import ACTIVE, Job
+    while await Job.filter(status__in=ACTIVE).count():
+        await asyncio.sleep(0.1)
+
+
+async def load(args):
+    from accounts.models import ADMIN, User, generate_jwt
+    from app import app
+    events, replies = asyncio.Queue(), asyncio.Queue()
+    lifespan = asyncio.ensure_future(
+        app({"type": "lifespan"}, events.get, replies.put))
+    await events.put({"type": "lifespan.startup"})
+    await replies.get()
+    report = {}
+    try:
+        cookies = {"anonymous": {}}
+        for role, username in (("user", "loadtest"), ("admin", ADMIN)):
+            user = await User.get(username=username)
+            cookies[role] = {"jwt": generate_jwt(user.id)}
+        cookies["admin"]["admin"] = ADMIN
+        print("{:<28} {:<10} {:>5} {:>8} {:>8} {:>8} {:>8} {:>7}".format(
+            "scenario", "role", "err", "req/s", "p50 ms", "p95 ms",
+            "p99 ms", "queries"))
+        for stage in STAGES:
+            for name, role, requests in await stage(args):
+                if not requests:
+                    continue
+                results = await run_scenario(
+                    app, cookies[role], requests, args.concurrency)
+                row = report["{} ({})".format(name, role)] = summary(
+                    *results)
+                print("{:<28} {:<10} {:>5} {:>8.0f} {:>8.2f} {:>8.2f} "
+                      "{:>8.2f} {:>7.1f}".format(
+                          name, role, row["errors"], row["rps"],
+                          row["p50_ms"], row["p95_ms"], row["p99_ms"],
+                          row["queries"]))
+                for error in results[2][:3]:
+                    print("    unexpected: " + error)
+        await finish_jobs()
+    finally:
+        await events.put({"type": "lifespan.shutdown"})
+        await replies.get()
+        await lifespan
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, path):
+    with open(path) as f:
+        previous = json.load(f)
+    print()
+    print("change against {} ({})".format(path, previous.get("commit")))
+    print("{:<40} {:>10} {:>10} {:>10}".format(
+        "scenario", "p50", "p95", "queries"))
+    for key, row in report["scenarios"].items():
+        old = previous["scenarios"].get(key)
+        if old is None:
+            continue
+        print("{:<40} {:>+9.0%} {:>+9.0%} {:>+10.1f}".format(
+            key[:40],
+            row["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0,
+            row["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0,
+            row["queries"] - old["queries"],
+        ))
+
+
+def main(args):
+    db_path = os.path.abspath(args.db)
+    os.environ["DB_URI"] = "sqlite://" + db_path
+    os.environ.setdefault("SESSION_BACKEND", "memory")
+    # queries per request are read from the request query logs
+    os.environ["SQL_INSTRUMENTATION"] = "true"
+    os.environ.setdefault("SLOW_REQUEST_QUERIES", "1000")
+    os.environ.setdefault("SLOW_REQUEST_DB_MS", "10000")
+    # sizes of the seeded data, kept next to the database for --reuse
+    seeded = {
+        "users": args.users,
+        "questions": args.questions,
+        "answers": args.answers,
+        "tags": args.tags,
+    }
+    if args.reuse and os.path.exists(db_path):
+        with open(db_path + ".json") as f:
+            seeded = json.load(f)
+    else:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        asyncio.run(seed(args))
+        with open(db_path + ".json", "w") as f:
+            json.dump(seeded, f)
+    scenarios_report = asyncio.run(load(args))
+    requests = sum(row["requests"] for row in scenarios_report.values())
+    report = {
+        "commit": git_commit(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": dict(
+            seeded,
+            requests=args.requests,
+            concurrency=args.concurrency,
+        ),
+        "total": {
+            "requests": requests,
+            "errors": sum(
+                row["errors"] for row in scenarios_report.values()),
+        },
+        "scenarios": scenarios_report,
+    }
+    output = args.output or os.path.join(
+        "benchmarks", "results", "load-{}.json".format(
+            report["commit"] or report["created"]))
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print()
+    print("{} requests, {} unexpected statuses, saved to {}".format(
+        requests, report["total"]["errors"], output))
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(
+        tempfile.gettempdir(), "bench_load.sqlite3"))
+    parser.add_argument("--reuse", action="store_true",
+                        help="keep an existing database instead of seeding")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--answers", type=int, default=5000)
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20,
+                        help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--output", help="JSON report path")
+    parser.add_argument("--compare", help="earlier JSON report")
+    main(parser.parse_args())
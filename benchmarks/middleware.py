@@ -0,0 +1,94 @@
+"""
+Requests per second of the index page and a static file through the
+middleware stack with the security headers set by a BaseHTTPMiddleware
+function (as before) and by the pure ASGI SecureHeadersMiddleware.
+
+Both apps have the routes, session and authentication middleware of
+app.py. Requests are sent straight to the ASGI app one after another,
+without a cookie, so no database is needed.
+
+    python -m benchmarks.middleware --requests 2000
+"""
+import argparse
+import asyncio
+import time
+from secure import SecureHeaders
+from starlette.applications import Starlette
+from starlette.middleware.authentication import AuthenticationMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.sessions import SessionMiddleware
+from accounts.models import UserAuthentication
+from app import app
+from utils.middleware import SecureHeadersMiddleware
+
+PATHS = ["/", "/static/css/jumbotron.css", "/static/css/bootstrap.min.css"]
+secure_headers = SecureHeaders()
+
+
+async def set_secure_headers(request, call_next):
+    response = await call_next(request)
+    cache_control = response.headers.get("cache-control")
+    secure_headers.starlette(response)
+    if cache_control is not None:
+        response.headers["cache-control"] = cache_control
+    return response
+
+
+def make_app(asgi):
+    bench = Starlette(routes=app.routes)
+    bench.add_middleware(
+        AuthenticationMiddleware, backend=UserAuthentication())
+    bench.add_middleware(SessionMiddleware, secret_key="benchmark")
+    if asgi:
+        bench.add_middleware(
+            SecureHeadersMiddleware, headers=secure_headers.headers())
+    else:
+        bench.add_middleware(BaseHTTPMiddleware, dispatch=set_secure_headers)
+    return bench
+
+
+async def get(bench, path):
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await bench({
+        "type": "http",
+        "scheme": "http",
+        "server": ("localhost", 8000),
+        "client": ("127.0.0.1", 50000),
+        "method": "GET",
+        "root_path": "",
+        "path": path,
+        "query_string": b"",
+        "headers": [(b"host", b"localhost:8000")],
+    }, receive, send)
+    assert status == 200, (path, status)
+
+
+async def main(args):
+    apps = [("BaseHTTPMiddleware", make_app(False)),
+            ("pure ASGI", make_app(True))]
+    print("{:<32} {:>20} {:>12}".format("path", "middleware", "req/s"))
+    for path in PATHS:
+        for name, bench in apps:
+            for _ in range(args.requests // 10):
+                await get(bench, path)
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                await get(bench, path)
+            elapsed = time.perf_counter() - start
+            print("{:<32} {:>20} {:>12.0f}".format(
+                path, name, args.requests / elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
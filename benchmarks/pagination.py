@@ -0,0 +1,85 @@
+"""
+Compare LIMIT/OFFSET and keyset pagination for page 1 and a deep page
+on a seeded SQLite table.
+
+    python -m benchmarks.pagination --questions 50000 --page 10000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from tortoise import Tortoise
+from utils import pagination
+from questions.models import Question
+from benchmarks.seed import init_db, seed_questions, temp_db_url
+
+ORDERINGS = [("-id",), ("-view", "-id"), ("-created", "-id")]
+
+
+async def timed(query, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await query()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def offset_page(ordering, page, page_size):
+    return await (
+        Question.all()
+        .order_by(*ordering)
+        .limit(page_size)
+        .offset((page - 1) * page_size)
+    )
+
+
+async def keyset_cursor(ordering, page, page_size):
+    """
+    Cursor pointing at ``page``, ie. the key of the last row before it
+    """
+    if page == 1:
+        return None
+    rows = await offset_page(ordering, page - 1, page_size)
+    keyset = pagination.KeysetPagination(None, ordering)
+    return pagination.encode_cursor(keyset.key(rows[-1]))
+
+
+async def keyset_page(ordering, cursor, page_size):
+    keyset = pagination.KeysetPagination(
+        cursor, ordering, page_size, model=Question)
+    queryset = Question.all()
+    seek = keyset.filter()
+    if seek is not None:
+        queryset = queryset.filter(seek)
+    rows = await queryset.order_by(*keyset.query_ordering()).limit(
+        keyset.limit())
+    return keyset.paginate(rows)
+
+
+async def main(args):
+    await init_db(temp_db_url("bench_pagination"))
+    await seed_questions(args.questions)
+    page_size = pagination.Pagination(1, 0).page_size
+    deep = min(args.page, args.questions // page_size)
+    print("{} questions, page size {}".format(args.questions, page_size))
+    print("{:<16} {:>6} {:>12} {:>12}".format(
+        "ordering", "page", "offset ms", "keyset ms"))
+    for ordering in ORDERINGS:
+        for page in (1, deep):
+            cursor = await keyset_cursor(ordering, page, page_size)
+            offset_ms = await timed(
+                lambda: offset_page(ordering, page, page_size), args.repeat)
+            keyset_ms = await timed(
+                lambda: keyset_page(ordering, cursor, page_size), args.repeat)
+            print("{:<16} {:>6} {:>12.3f} {:>12.3f}".format(
+                ",".join(ordering), page, offset_ms, keyset_ms))
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=50000)
+    parser.add_argument("--page", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
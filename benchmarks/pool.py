@@ -0,0 +1,123 @@
+"""
+Connection pool settings under concurrent listing queries: time of the
+first query after startup without and with the pool warm-up, then
+throughput, query latency and waits for a connection at each
+--concurrency, with the statement cache off and at --statement-cache.
+
+Runs read-only against --db-url (eg. a local Postgres with data), or
+against a seeded temporary SQLite file. SQLite has a single connection
+and no statement cache setting, its waits are for the connection lock.
+
+    python -m benchmarks.pool --concurrency 1 8 32
+    python -m benchmarks.pool --db-url postgres://localhost/questions
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from tortoise import Tortoise
+from settings import MODELS
+from benchmarks.seed import init_db, seed_questions, temp_db_url
+from questions.models import Question
+from utils.dbpool import (
+    database_config,
+    instrument_pools,
+    pool_stats,
+    warm_up_pools,
+)
+
+PAGE_SIZE = 20
+
+
+async def listing(offset):
+    start = time.perf_counter()
+    await Question.all().order_by("-id").offset(offset).limit(
+        PAGE_SIZE).prefetch_related("user")
+    return (time.perf_counter() - start) * 1000
+
+
+async def first_query(config, warm_up):
+    await Tortoise.init(config=config)
+    start = time.perf_counter()
+    if warm_up:
+        await warm_up_pools()
+    warm_up_ms = (time.perf_counter() - start) * 1000
+    first_ms = await listing(0)
+    await Tortoise.close_connections()
+    return warm_up_ms, first_ms
+
+
+async def concurrent(args, label, concurrency, pages):
+    stats = pool_stats["default"]
+    stats.reset()
+    rng = random.Random(concurrency)
+    pending = [rng.randrange(pages) * PAGE_SIZE
+               for _ in range(args.requests)]
+    latencies = []
+
+    async def worker():
+        while pending:
+            latencies.append(await listing(pending.pop()))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print("{:>8} {:>12} {:>10.0f} {:>9.2f} {:>9.2f} {:>12.3f} {:>12.2f} "
+          "{:>8}".format(
+              concurrency, label, len(latencies) / elapsed,
+              statistics.median(latencies),
+              latencies[int(len(latencies) * 0.99) - 1],
+              stats.wait_total * 1000 / max(stats.acquired, 1),
+              stats.wait_max * 1000, stats.max_waiting))
+
+
+async def main(args):
+    db_url = args.db_url
+    if not db_url:
+        db_url = temp_db_url("bench_pool")
+        await init_db(db_url)
+        await seed_questions(args.questions)
+        await Tortoise.close_connections()
+
+    for label, cache_size in (("off", 0), (str(args.statement_cache),
+                                            args.statement_cache)):
+        config = database_config(
+            db_url, MODELS,
+            min_size=args.min_size,
+            max_size=args.max_size,
+            statement_cache_size=cache_size,
+        )
+        print("statement cache {}, pool {}-{}".format(
+            label, args.min_size, args.max_size))
+        for warm_up in (False, True):
+            warm_up_ms, first_ms = await first_query(config, warm_up)
+            print("  first query {:.2f} ms {}".format(
+                first_ms, "after a {:.2f} ms warm-up".format(warm_up_ms)
+                if warm_up else "without warm-up"))
+
+        await Tortoise.init(config=config)
+        await warm_up_pools()
+        instrument_pools()
+        pages = max(1, await Question.all().count() // PAGE_SIZE)
+        print("{:>8} {:>12} {:>10} {:>9} {:>9} {:>12} {:>12} {:>8}".format(
+            "clients", "stmt cache", "queries/s", "p50 ms", "p99 ms",
+            "wait avg ms", "wait max ms", "queued"))
+        for concurrency in args.concurrency:
+            await concurrent(args, label, concurrency, pages)
+        await Tortoise.close_connections()
+        pool_stats.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db-url", default="")
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+",
+                        default=[1, 8, 32])
+    parser.add_argument("--min-size", type=int, default=2)
+    parser.add_argument("--max-size", type=int, default=10)
+    parser.add_argument("--statement-cache", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""
+Search latency of the full-text index against the previous icontains
+query on a seeded SQLite corpus.
+
+    python -m benchmarks.search --questions 50000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from tortoise import Tortoise
+from tortoise.query_utils import Q
+from questions import fulltext
+from questions.models import Question
+from benchmarks.seed import init_db, seed_questions, temp_db_url
+
+TERMS = ["python", "postgres migration", "latency", "zzz"]
+PAGE_SIZE = 2
+
+
+async def timed(query, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await query()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def icontains_search(q):
+    queryset = Question.filter(
+        Q(title__icontains=q) |
+        Q(content__icontains=q) |
+        Q(user__username__icontains=q)
+    ).distinct()
+    count = await queryset.count()
+    results = await queryset.limit(PAGE_SIZE)
+    return count, results
+
+
+async def fulltext_search(q):
+    count = await fulltext.count_questions(q)
+    ids = await fulltext.search_questions(q, PAGE_SIZE, 0)
+    return count, ids
+
+
+async def main(args):
+    await init_db(temp_db_url("bench_search"))
+    await seed_questions(args.questions)
+    start = time.perf_counter()
+    await fulltext.reindex()
+    print("{} questions, reindex took {:.1f} s".format(
+        args.questions, time.perf_counter() - start))
+    print("{:<20} {:>8} {:>14} {:>14}".format(
+        "term", "matches", "icontains ms", "fulltext ms"))
+    for term in TERMS:
+        count, _ = await fulltext_search(term)
+        icontains_ms = await timed(lambda: icontains_search(term), args.repeat)
+        fulltext_ms = await timed(lambda: fulltext_search(term), args.repeat)
+        print("{:<20} {:>8} {:>14.3f} {:>14.3f}".format(
+            term, count, icontains_ms, fulltext_ms))
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,132 @@
+import datetime
+import os
+import random
+import tempfile
+from tortoise import Tortoise
+from settings import MODELS
+from accounts.models import User, hash_password
+from questions.models import Question, Answer, Tag
+
+BATCH_SIZE = 1000
+WORDS = (
+    "async await python starlette tortoise orm query index cache page "
+    "session cookie template jinja render stream request response header "
+    "database postgres sqlite migration schema table column join count "
+    "user login password token answer question tag search rank vector "
+    "server worker event loop thread pool latency throughput benchmark"
+).split()
+
+
+def sentence(rng, words):
+    """
+    ``words`` random words from the vocabulary
+    """
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def temp_db_url(name):
+    """
+    SQLite URL of a fresh database file in the temp directory
+    """
+    path = os.path.join(tempfile.gettempdir(), "{}.sqlite3".format(name))
+    if os.path.exists(path):
+        os.remove(path)
+    return "sqlite://{}".format(path)
+
+
+async def init_db(db_url):
+    await Tortoise.init(db_url=db_url, modules=MODELS)
+    await Tortoise.generate_schemas()
+
+
+async def seed_questions(count, users=10, seed=0):
+    """
+    Insert ``users`` users and ``count`` questions in bulk batches
+    """
+    rng = random.Random(seed)
+    await User.bulk_create([
+        User(
+            username="user{}".format(i),
+            email="user{}@example.com".format(i),
+            login_count=1,
+            password="!",
+        )
+        for i in range(users)
+    ])
+    user_ids = await User.all().order_by("id").values_list("id", flat=True)
+    start = datetime.datetime(2019, 1, 1)
+    for offset in range(0, count, BATCH_SIZE):
+        await Question.bulk_create([
+            Question(
+                title="Question {} {}".format(i, sentence(rng, 6)),
+                slug="question-{}".format(i),
+                content=sentence(rng, 60),
+                created=start + datetime.timedelta(minutes=i),
+                view=(i * 7919) % 1000,
+                user_id=user_ids[i % len(user_ids)],
+            )
+            for i in range(offset, min(offset + BATCH_SIZE, count))
+        ])
+
+
+async def seed_answers(count, seed=0):
+    """
+    Insert ``count`` answers spread over the seeded questions and users
+    """
+    rng = random.Random(seed)
+    user_ids = await User.all().values_list("id", flat=True)
+    question_ids = await Question.all().values_list("id", flat=True)
+    start = datetime.datetime(2019, 1, 1)
+    for offset in range(0, count, BATCH_SIZE):
+        await Answer.bulk_create([
+            Answer(
+                content=sentence(rng, 30),
+                created=start + datetime.timedelta(minutes=i),
+                question_id=rng.choice(question_ids),
+                ans_user_id=rng.choice(user_ids),
+            )
+            for i in range(offset, min(offset + BATCH_SIZE, count))
+        ])
+
+
+async def seed_tags(count, per_question=3, seed=0):
+    """
+    Insert ``count`` catalog tags and attach up to ``per_question`` of
+    them to every seeded question, with matching tag counters
+    """
+    rng = random.Random(seed)
+    await Tag.bulk_create([
+        Tag(name="{}-{}".format(rng.choice(WORDS), i)) for i in range(count)
+    ])
+    tag_ids = await Tag.all().order_by("id").values_list("id", flat=True)
+    question_ids = await Question.all().values_list("id", flat=True)
+    db = Tortoise.get_connection("default")
+    links = [
+        (question_id, tag_id)
+        for question_id in question_ids
+        for tag_id in rng.sample(tag_ids, min(per_question, len(tag_ids)))
+    ]
+    for offset in range(0, len(links), BATCH_SIZE):
+        await db.execute_many(
+            "INSERT INTO question_tag (question_id, tag_id) VALUES (?, ?)",
+            links[offset:offset + BATCH_SIZE])
+    counts = {}
+    for _, tag_id in links:
+        counts[tag_id] = counts.get(tag_id, 0) + 1
+    by_count = {}
+    for tag_id, total in counts.items():
+        by_count.setdefault(total, []).append(tag_id)
+    for total, ids in by_count.items():
+        await Tag.filter(id__in=ids).update(question_count=total)
+
+
+async def seed_account(username, password, rounds=4):
+    """
+    A user that can log in with ``password``
+    """
+    return await User.create(
+        username=username,
+        email="{}@example.com".format(username),
+        login_count=1,
+        password=hash_password(password, rounds),
+    )
@@ -0,0 +1,112 @@
+"""
+Cookie size and session overhead per request after a visitor opened
+``--views`` questions, with the signed cookie session and one
+viewed_question_<id> key per question (as before) and with the server
+side stores and the viewed bloom filter.
+
+Requests go through the session middleware to an app that only checks
+and marks the question as viewed, the cookie is carried over between
+requests like a browser would.
+
+    python -m benchmarks.sessions --views 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from http.cookies import SimpleCookie
+from starlette.middleware.sessions import SessionMiddleware
+from questions.viewcounter import has_viewed, mark_viewed
+from utils.sessions import (
+    MemorySessionStore,
+    SQLiteSessionStore,
+    ServerSessionMiddleware,
+)
+
+
+async def cookie_app(scope, receive, send):
+    key = "viewed_question_{}".format(scope["path"].strip("/"))
+    if not scope["session"].get(key):
+        scope["session"][key] = True
+    await send({"type": "http.response.start", "status": 200,
+                "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def bloom_app(scope, receive, send):
+    question_id = int(scope["path"].strip("/"))
+    if not has_viewed(scope["session"], question_id):
+        mark_viewed(scope["session"], question_id)
+    await send({"type": "http.response.start", "status": 200,
+                "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+class Browser():
+    def __init__(self, app):
+        self.app = app
+        self.cookie = ""
+        self.sent = 0
+
+    async def get(self, path):
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] != "http.response.start":
+                return
+            for name, value in message["headers"]:
+                if name == b"set-cookie":
+                    morsel = SimpleCookie(value.decode())["session"]
+                    self.cookie = morsel.value
+                    self.sent += len(value)
+
+        headers = []
+        if self.cookie:
+            headers.append(
+                (b"cookie", "session={}".format(self.cookie).encode()))
+        await self.app({"type": "http", "path": path, "headers": headers},
+                       receive, send)
+
+
+async def run(name, app, views):
+    browser = Browser(app)
+    start = time.perf_counter()
+    for question_id in range(1, views + 1):
+        await browser.get("/{}".format(question_id))
+    opening = (time.perf_counter() - start) * 1000 / views
+    # revisits leave the session unchanged
+    timings = []
+    for question_id in range(1, views + 1):
+        start = time.perf_counter()
+        await browser.get("/{}".format(question_id))
+        timings.append((time.perf_counter() - start) * 1000)
+    print("{:<16} {:>12} {:>14.1f} {:>12.3f} {:>12.3f}".format(
+        name, len(browser.cookie), browser.sent / 1024, opening,
+        statistics.median(timings)))
+
+
+async def main(args):
+    path = os.path.join(tempfile.gettempdir(), "bench_sessions.sqlite3")
+    if os.path.exists(path):
+        os.remove(path)
+    sqlite_store = SQLiteSessionStore(path)
+    print("{} questions opened, then each revisited".format(args.views))
+    print("{:<16} {:>12} {:>14} {:>12} {:>12}".format(
+        "session", "cookie bytes", "Set-Cookie KiB", "ms/open",
+        "ms/revisit"))
+    await run("signed cookie", SessionMiddleware(
+        cookie_app, secret_key="benchmark"), args.views)
+    await run("memory store", ServerSessionMiddleware(
+        bloom_app, MemorySessionStore(), secret_key="benchmark"), args.views)
+    await run("sqlite store", ServerSessionMiddleware(
+        bloom_app, sqlite_store, secret_key="benchmark"), args.views)
+    await sqlite_store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--views", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,99 @@
+"""
+Bytes sent and serve time of the static files of a page load, served by
+Starlette's StaticFiles (as before) and by HashedStaticFiles from a
+build_static directory with each Accept-Encoding.
+
+    python -m benchmarks.static --repeat 200
+"""
+import argparse
+import asyncio
+import shutil
+import statistics
+import tempfile
+import time
+from starlette.staticfiles import StaticFiles
+from utils.staticfiles import HashedStaticFiles, build_static
+
+# the files linked from base.html
+PAGE_FILES = [
+    "css/bootstrap.min.css",
+    "css/jumbotron.css",
+    "images/icons/icon-72x72.png",
+    "js/jquery-3.3.1.slim.min.js",
+    "js/popper.min.js",
+    "js/bootstrap.min.js",
+]
+
+
+async def get(app, path, accept_encoding):
+    """
+    Response headers and body size
+    """
+    headers, size = {}, 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.start":
+            headers.update(
+                (k.decode(), v.decode()) for k, v in message["headers"])
+        size += len(message.get("body", b""))
+
+    await app({
+        "type": "http",
+        "method": "GET",
+        "path": "/" + path,
+        "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }, receive, send)
+    return headers, size
+
+
+async def page_load(app, paths, accept_encoding):
+    size = 0
+    for path in paths:
+        size += (await get(app, path, accept_encoding))[1]
+    return size
+
+
+async def main(args):
+    build_directory = tempfile.mkdtemp(prefix="bench_static")
+    try:
+        manifest = build_static("static", build_directory)
+        before = StaticFiles(directory="static")
+        after = HashedStaticFiles(
+            directory="static",
+            build_directory=build_directory,
+            manifest=manifest,
+        )
+        hashed = [manifest[path] for path in PAGE_FILES]
+        print("{} files per page load".format(len(PAGE_FILES)))
+        print("{:<22} {:>10} {:>12} {:>8}".format(
+            "server", "KiB", "ms/page", "pages/s"))
+        for name, app, paths, accept_encoding in (
+            ("StaticFiles", before, PAGE_FILES, "gzip, deflate, br"),
+            ("hashed identity", after, hashed, "identity"),
+            ("hashed gzip", after, hashed, "gzip, deflate"),
+            ("hashed br", after, hashed, "gzip, deflate, br"),
+        ):
+            size = await page_load(app, paths, accept_encoding)
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                await page_load(app, paths, accept_encoding)
+                timings.append(time.perf_counter() - start)
+            ms = statistics.median(timings) * 1000
+            print("{:<22} {:>10.1f} {:>12.3f} {:>8.0f}".format(
+                name, size / 1024, ms, 1000 / ms))
+        headers, _ = await get(after, hashed[0], "br")
+        print("cache-control: {}".format(headers["cache-control"]))
+    finally:
+        shutil.rmtree(build_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""
+Time to first byte, total time and peak memory of a long question page
+rendered into one string (as before) and streamed.
+
+Seeds one question with ``--answers`` answers, then serves its page with
+each response class into an ASGI send that only counts bytes. Times
+include the queries, peak memory is the tracemalloc peak of one request.
+
+    python -m benchmarks.streaming --answers 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from tortoise import Tortoise
+from settings import templates, streaming_templates
+from questions.forms import QuestionLikesForm, AnswerLikesForm
+from questions.models import Question, Answer
+from questions.thread import answer_stream
+from benchmarks.fragments import make_request
+from benchmarks.seed import init_db, seed_answers, seed_questions, temp_db_url
+
+
+def context(request, question, answer_results, answer_count):
+    return {
+        "request": request,
+        "item": question,
+        "path": request.url.path,
+        "likes_form": AnswerLikesForm(),
+        "question_likes_form": QuestionLikesForm(),
+        "answer_results": answer_results,
+        "answer_count": answer_count,
+        "question_liked": False,
+        "liked_answers": set(),
+    }
+
+
+async def buffered(request, question_id):
+    question = await Question.get(id=question_id).prefetch_related(
+        "user", "tags")
+    answers = await Answer.filter(question_id=question_id).prefetch_related(
+        "ans_user").order_by("-id")
+    return templates.TemplateResponse(
+        "questions/question.html",
+        context(request, question, answers, len(answers)))
+
+
+async def streamed(request, question_id):
+    question = await Question.get(id=question_id).prefetch_related(
+        "user", "tags")
+    return streaming_templates.TemplateResponse(
+        "questions/question.html",
+        context(
+            request,
+            question,
+            answer_stream(question_id),
+            await Answer.filter(question_id=question_id).count()))
+
+
+async def serve(view, question_id):
+    """
+    Seconds to the first body byte and to the end of the response
+    """
+    first_byte, size = None, 0
+    start = time.perf_counter()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal first_byte, size
+        body = message.get("body", b"")
+        if body and first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(body)
+
+    request = make_request()
+    response = await view(request, question_id)
+    await response(request.scope, receive, send)
+    return first_byte, time.perf_counter() - start, size
+
+
+async def main(args):
+    await init_db(temp_db_url("bench_streaming"))
+    await seed_questions(1)
+    await seed_answers(args.answers)
+    question_id = (await Question.first()).id
+    print("question page with {} answers".format(args.answers))
+    print("{:<10} {:>10} {:>10} {:>12} {:>10}".format(
+        "response", "ttfb ms", "total ms", "peak KiB", "page KiB"))
+    for name, view in (("buffered", buffered), ("streamed", streamed)):
+        # warm the template caches
+        await serve(view, question_id)
+        ttfbs, totals = [], []
+        for _ in range(args.repeat):
+            ttfb, total, size = await serve(view, question_id)
+            ttfbs.append(ttfb * 1000)
+            totals.append(total * 1000)
+        tracemalloc.start()
+        await serve(view, question_id)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("{:<10} {:>10.2f} {:>10.2f} {:>12.1f} {:>10.1f}".format(
+            name, statistics.median(ttfbs), statistics.median(totals),
+            peak / 1024, size / 1024))
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--answers", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,125 @@
+"""
+Posting questions with many tags at each --concurrency: the previous
+write path (a get-or-create and an insert per tag, outside of any
+transaction) against the bulk one (tags resolved in one query, the
+question_tag rows inserted in one statement, all in a transaction).
+
+Tags are drawn from a --vocabulary of names, so concurrent posts race
+to create the same new tags. After each run the tag counters are
+checked against the question_tag rows.
+
+    python -m benchmarks.tags --tags 5 20 --concurrency 1 16
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import random
+import statistics
+import time
+from tortoise import Tortoise
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+from questions.models import Question, Tag
+from questions.tagging import add_tags
+from utils.querylog import QueryLog, current_log, instrument_queries
+from benchmarks.seed import init_db, seed_questions, temp_db_url
+
+
+def new_question(i):
+    return Question(
+        title="Tagged question {}".format(i),
+        slug="tagged-question-{}".format(i),
+        content="Posted by the tag benchmark",
+        created=datetime.datetime.now(),
+        user_id=1,
+    )
+
+
+async def per_tag_post(i, names):
+    question = new_question(i)
+    await question.save()
+    for name in names:
+        tag = await Tag.get_or_none(name=name)
+        if tag is None:
+            try:
+                tag = await Tag.create(name=name)
+            except IntegrityError:
+                tag = await Tag.get(name=name)
+        await question.tags.add(tag)
+    await Tag.filter(name__in=names).update(
+        question_count=F("question_count") + 1)
+
+
+async def bulk_post(i, names):
+    question = new_question(i)
+    async with in_transaction():
+        await question.save()
+        await add_tags(question.id, names)
+
+
+async def consistent():
+    linked = await Tortoise.get_connection("default").execute_query_dict(
+        "SELECT COUNT(*) AS count FROM question_tag")
+    counted = sum(await Tag.all().values_list("question_count", flat=True))
+    return linked[0]["count"] == counted
+
+
+async def run(args, label, post, tags, concurrency):
+    await init_db(temp_db_url("bench_tags"))
+    await seed_questions(0, users=1)
+    instrument_queries()
+    rng = random.Random(concurrency)
+    vocabulary = ["tag{}".format(i) for i in range(args.vocabulary)]
+    pending = [(i, rng.sample(vocabulary, tags))
+               for i in range(args.posts)]
+    latencies = []
+    queries = []
+
+    async def worker():
+        while pending:
+            i, names = pending.pop()
+            log = QueryLog()
+            token = current_log.set(log)
+            start = time.perf_counter()
+            await post(i, names)
+            latencies.append((time.perf_counter() - start) * 1000)
+            current_log.reset(token)
+            queries.append(log.count)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print("{:>5} {:>8} {:>9} {:>8.0f} {:>9.2f} {:>9.2f} {:>9.1f} {:>11}"
+          .format(tags, concurrency, label, len(latencies) / elapsed,
+                  statistics.median(latencies),
+                  latencies[int(len(latencies) * 0.99) - 1],
+                  statistics.mean(queries),
+                  "yes" if await consistent() else "NO"))
+    await Tortoise.close_connections()
+
+
+async def main(args):
+    # the per-tag path expects to lose races on new tags, aiosqlite logs
+    # each of them with a traceback
+    logging.getLogger("aiosqlite").setLevel(logging.CRITICAL)
+    print("{:>5} {:>8} {:>9} {:>8} {:>9} {:>9} {:>9} {:>11}".format(
+        "tags", "clients", "path", "posts/s", "p50 ms", "p99 ms",
+        "queries", "consistent"))
+    for tags in args.tags:
+        for concurrency in args.concurrency:
+            for label, post in (("per-tag", per_tag_post),
+                                ("bulk", bulk_post)):
+                await run(args, label, post, tags, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=200)
+    parser.add_argument("--tags", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--concurrency", type=int, nargs="+",
+                        default=[1, 16])
+    asyncio.run(main(parser.parse_args()))
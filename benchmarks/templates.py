@@ -0,0 +1,165 @@
+"""
+Cold-start cost of the templates with and without the bytecode cache and
+the startup warm-up.
+
+First loads every template into fresh environments, compiling from
+source or reading the filled bytecode cache. Then starts the app in a
+new process per configuration on an empty SQLite database and times
+the startup and the first and second request of a few pages.
+
+    python -m benchmarks.templates
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import jinja2
+from benchmarks.seed import temp_db_url
+
+PAGES = ["/", "/accounts/login?next=/", "/questions/"]
+# (name, bytecode cache filled, warm-up)
+CONFIGS = [
+    ("compile on demand", False, False),
+    ("bytecode cache", True, False),
+    ("warm-up", False, True),
+    ("cache + warm-up", True, True),
+]
+
+
+def load_all(bytecode_cache, enable_async):
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader("templates"),
+        autoescape=True,
+        enable_async=enable_async,
+        bytecode_cache=bytecode_cache,
+    )
+    start = time.perf_counter()
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
+    return (time.perf_counter() - start) * 1000
+
+
+def compile_times(cache_dir, repeat):
+    print("{:<10} {:>14} {:>14}".format("env", "compile ms", "bytecode ms"))
+    for name, enable_async in (("sync", False), ("async", True)):
+        cache = jinja2.FileSystemBytecodeCache(cache_dir, name + "-%s")
+        # fills the cache
+        load_all(cache, enable_async)
+        print("{:<10} {:>14.2f} {:>14.2f}".format(
+            name,
+            statistics.median(
+                load_all(None, enable_async) for _ in range(repeat)),
+            statistics.median(
+                load_all(cache, enable_async) for _ in range(repeat)),
+        ))
+
+
+async def get(app, url):
+    path, _, query = url.partition("?")
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app({
+        "type": "http",
+        "scheme": "http",
+        "server": ("localhost", 8000),
+        "client": ("127.0.0.1", 50000),
+        "method": "GET",
+        "root_path": "",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(b"host", b"localhost:8000")],
+    }, receive, send)
+
+
+async def child():
+    """
+    Runs in the app process, prints the timings as JSON
+    """
+    start = time.perf_counter()
+    from app import app
+    timings = {"import": time.perf_counter() - start}
+    start = time.perf_counter()
+    events, replies = asyncio.Queue(), asyncio.Queue()
+    await events.put({"type": "lifespan.startup"})
+    lifespan = asyncio.ensure_future(
+        app({"type": "lifespan"}, events.get, replies.put))
+    await replies.get()
+    timings["startup"] = time.perf_counter() - start
+    try:
+        for attempt in ("first", "second"):
+            for page in PAGES:
+                start = time.perf_counter()
+                await get(app, page)
+                timings[attempt + " " + page] = time.perf_counter() - start
+    finally:
+        await events.put({"type": "lifespan.shutdown"})
+        await replies.get()
+        await lifespan
+    print(json.dumps({key: value * 1000 for key, value in timings.items()}))
+
+
+def app_times(cache_dir, repeat):
+    print("{:<20} {:>9} {:>10} {:>10} {:>10}".format(
+        "config", "import", "startup", "1st req", "2nd req"))
+    for name, filled, warmup in CONFIGS:
+        runs = []
+        for _ in range(repeat):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            env = dict(
+                os.environ,
+                DB_URI=temp_db_url("bench_templates"),
+                SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"),
+                TEMPLATE_CACHE_DIR=cache_dir if filled else "",
+                TEMPLATE_WARMUP=str(warmup),
+            )
+            if filled:
+                subprocess.run(
+                    [sys.executable, "manage.py", "precompile-templates"],
+                    env=env, check=True, stdout=subprocess.DEVNULL)
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.templates", "--child"],
+                env=env, check=True, stdout=subprocess.PIPE).stdout
+            runs.append(json.loads(output.decode().splitlines()[-1]))
+        row = {
+            key: statistics.median(run[key] for run in runs)
+            for key in runs[0]
+        }
+        print("{:<20} {:>9.1f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+            name, row["import"], row["startup"],
+            sum(row["first " + page] for page in PAGES),
+            sum(row["second " + page] for page in PAGES),
+        ))
+
+
+def main(args):
+    cache_dir = tempfile.mkdtemp(prefix="bench_templates")
+    try:
+        compile_times(cache_dir, args.repeat)
+        print()
+        print("ms, requests summed over {}".format(", ".join(PAGES)))
+        app_times(os.path.join(cache_dir, "app"), args.runs)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child())
+    else:
+        main(args)
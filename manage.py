@@ -0,0 +1,86 @@
+"""
+Management commands, run from the project directory:
+
+    python manage.py migrate    create missing tables, then apply pending
+                                schema and data migrations, run it before
+                                starting a new version of the app
+    python manage.py reindex    rebuild the full-text search index
+    python manage.py reconcile-likes
+                                reset like counters to their legacy base
+                                plus the like ledger
+    python manage.py precompile-templates
+                                fill the template bytecode cache
+    python manage.py build-static
+                                fingerprint and precompress static files
+
+The last two need no database, run them at build time.
+"""
+import argparse
+from tortoise import Tortoise, run_async
+from settings import (
+    templates,
+    streaming_templates,
+    TORTOISE_CONFIG,
+    TEMPLATE_CACHE_DIR,
+    STATIC_BUILD_DIR,
+)
+import migrations
+from questions import fulltext
+from questions.likes import reconcile_like_counts
+from utils.templatecache import load_templates
+from utils.staticfiles import build_static
+
+
+async def migrate(args):
+    for name in await migrations.migrate():
+        print("Applied {}".format(name))
+
+
+async def reindex(args):
+    total = await fulltext.reindex()
+    print("Indexed {} questions".format(total))
+
+
+async def reconcile_likes(args):
+    fixed = await reconcile_like_counts()
+    print("Fixed {} like counters".format(fixed))
+
+
+async def precompile_templates(args):
+    if not TEMPLATE_CACHE_DIR:
+        print("TEMPLATE_CACHE_DIR is empty, nothing to precompile")
+        return
+    for env in (templates.env, streaming_templates.env):
+        names = load_templates(env)
+    print("Compiled {} templates into {}".format(
+        len(names), TEMPLATE_CACHE_DIR))
+
+
+async def build_static_files(args):
+    manifest = build_static("static", STATIC_BUILD_DIR)
+    print("Built {} static files into {}".format(
+        len(manifest), STATIC_BUILD_DIR))
+
+
+COMMANDS = {
+    "migrate": migrate,
+    "reindex": reindex,
+    "reconcile-likes": reconcile_likes,
+    "precompile-templates": precompile_templates,
+    "build-static": build_static_files,
+}
+# commands that run without a database connection
+OFFLINE_COMMANDS = {"precompile-templates", "build-static"}
+
+
+async def main(args):
+    if args.command not in OFFLINE_COMMANDS:
+        await Tortoise.init(config=TORTOISE_CONFIG)
+    await COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    run_async(main(parser.parse_args()))
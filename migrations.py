@@ -0,0 +1,257 @@
+"""
+Schema and data migrations for databases created by generate_schemas.
+
+generate_schemas only creates missing tables, so changes to existing
+tables are applied here, in order, by ``python manage.py migrate`` once
+the missing tables are generated. Each migration is recorded in the
+schema_migration table and written so that it is also a no-op on a
+freshly generated schema.
+"""
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+MIGRATIONS = []
+
+
+def migration(func):
+    """
+    Register a migration, they run in definition order
+    """
+    MIGRATIONS.append(func)
+    return func
+
+
+def is_postgres(db):
+    return db.capabilities.dialect == "postgres"
+
+
+async def column_exists(db, table, column):
+    if is_postgres(db):
+        rows = await db.execute_query_dict(
+            "SELECT column_name AS name FROM information_schema.columns "
+            "WHERE table_name = $1", [table])
+    else:
+        rows = await db.execute_query_dict(
+            'PRAGMA table_info("{}")'.format(table))
+    return column in {row["name"] for row in rows}
+
+
+async def table_indexes(db, table):
+    """
+    Return (is_unique, columns) of every index and unique constraint of
+    ``table``, columns in index order
+    """
+    if is_postgres(db):
+        rows = await db.execute_query_dict(
+            "SELECT i.indexrelid AS index, i.indisunique AS unique, "
+            "a.attname AS name FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indrelid "
+            "CROSS JOIN LATERAL unnest(i.indkey) "
+            "WITH ORDINALITY AS k(attnum, position) "
+            "JOIN pg_attribute a ON a.attrelid = c.oid "
+            "AND a.attnum = k.attnum "
+            "WHERE c.relname = $1 ORDER BY i.indexrelid, k.position",
+            [table])
+        indexes = {}
+        for row in rows:
+            unique, columns = indexes.setdefault(
+                row["index"], (row["unique"], []))
+            columns.append(row["name"])
+        return [
+            (unique, tuple(columns)) for unique, columns in indexes.values()
+        ]
+    indexes = []
+    for index in await db.execute_query_dict(
+            'PRAGMA index_list("{}")'.format(table)):
+        info = await db.execute_query_dict(
+            'PRAGMA index_info("{}")'.format(index["name"]))
+        columns = [row["name"] for row in sorted(
+            info, key=lambda row: row["seqno"])]
+        indexes.append((bool(index["unique"]), tuple(columns)))
+    return indexes
+
+
+async def has_unique_index(db, table, columns):
+    """
+    Whether ``table`` has a unique index or constraint on exactly
+    ``columns``, in any order
+    """
+    return any(
+        unique and set(indexed) == set(columns)
+        for unique, indexed in await table_indexes(db, table)
+    )
+
+
+async def has_index(db, table, columns):
+    """
+    Whether an index of ``table`` starts with ``columns``, in this order,
+    and so can serve lookups on them
+    """
+    return any(
+        indexed[:len(columns)] == tuple(columns)
+        for _, indexed in await table_indexes(db, table)
+    )
+
+
+def model_indexes(model):
+    """
+    Return (is_unique, columns) of the indexes declared on a model:
+    unique and indexed fields (foreign keys by their column),
+    Meta.unique_together and Meta.indexes
+    """
+    meta = model._meta
+    declared = []
+    for name, field in meta.fields_map.items():
+        if field.pk or name not in meta.fields_db_projection:
+            continue
+        column = meta.fields_db_projection[name]
+        if field.unique:
+            declared.append((True, (column,)))
+        elif field.index:
+            declared.append((False, (column,)))
+    for unique, together in ((True, meta.unique_together),
+                             (False, meta.indexes)):
+        for fields in together:
+            declared.append((unique, tuple(
+                meta.fields_map[name].source_field or name
+                for name in fields
+            )))
+    return declared
+
+
+async def create_model_indexes(conn):
+    """
+    Create the declared indexes missing from the tables, returns the
+    names of the created indexes. Unique indexes fail if the table
+    already holds duplicates, which then have to be fixed by hand.
+    """
+    created = []
+    for model in Tortoise.apps["models"].values():
+        table = model._meta.table
+        for unique, columns in model_indexes(model):
+            if unique and await has_unique_index(conn, table, columns):
+                continue
+            if not unique and await has_index(conn, table, columns):
+                continue
+            name = "{}_{}_{}".format(
+                table, "_".join(columns), "uniq" if unique else "idx")
+            await conn.execute_query(
+                'CREATE {}INDEX "{}" ON "{}" ({})'.format(
+                    "UNIQUE " if unique else "", name, table,
+                    ", ".join('"{}"'.format(column) for column in columns)))
+            created.append(name)
+    return created
+
+
+@migration
+async def tag_catalog(conn):
+    """
+    One tag row per name with a maintained question_count: normalize
+    names, point question_tag at the oldest tag of each name, drop the
+    duplicates and index the join table
+    """
+    if not await column_exists(conn, "tag", "question_count"):
+        await conn.execute_query(
+            "ALTER TABLE tag "
+            "ADD COLUMN question_count INT NOT NULL DEFAULT 0")
+    await conn.execute_query("UPDATE tag SET name = LOWER(TRIM(name))")
+    await conn.execute_query(
+        "UPDATE question_tag SET tag_id = ("
+        "SELECT MIN(canonical.id) FROM tag "
+        "JOIN tag canonical ON canonical.name = tag.name "
+        "WHERE tag.id = question_tag.tag_id)")
+    # the same question may now point at one tag twice
+    await conn.execute_query(
+        "CREATE TABLE question_tag_dedup AS "
+        "SELECT DISTINCT question_id, tag_id FROM question_tag")
+    await conn.execute_query("DELETE FROM question_tag")
+    await conn.execute_query(
+        "INSERT INTO question_tag (question_id, tag_id) "
+        "SELECT question_id, tag_id FROM question_tag_dedup")
+    await conn.execute_query("DROP TABLE question_tag_dedup")
+    await conn.execute_query(
+        "DELETE FROM tag WHERE id NOT IN "
+        "(SELECT MIN(id) FROM tag GROUP BY name)")
+    await conn.execute_query(
+        "UPDATE tag SET question_count = (SELECT COUNT(*) FROM question_tag "
+        "WHERE question_tag.tag_id = tag.id)")
+    if not await has_unique_index(conn, "tag", ["name"]):
+        await conn.execute_query(
+            "CREATE UNIQUE INDEX tag_name_uniq ON tag (name)")
+    await conn.execute_query(
+        "CREATE UNIQUE INDEX IF NOT EXISTS question_tag_uniq "
+        "ON question_tag (question_id, tag_id)")
+    await conn.execute_query(
+        "CREATE INDEX IF NOT EXISTS question_tag_tag_idx "
+        "ON question_tag (tag_id, question_id)")
+
+
+@migration
+async def question_version(conn):
+    """
+    Version counter of questions used by the card cache
+    """
+    if not await column_exists(conn, "question", "version"):
+        await conn.execute_query(
+            "ALTER TABLE question ADD COLUMN version INT NOT NULL DEFAULT 1")
+
+
+@migration
+async def declared_indexes(conn):
+    """
+    Indexes declared on the models: unique usernames and emails, foreign
+    keys used as filters and the keyset pagination indexes
+    """
+    await create_model_indexes(conn)
+
+
+@migration
+async def legacy_like_base(conn):
+    """
+    Likes counted before the like ledger have no ledger rows, keep the
+    counts above the ledger totals as the base the counters are
+    reconciled on top of
+    """
+    for table, counter in (("question", "question_like"),
+                           ("answer", "answer_like")):
+        if await column_exists(conn, table, counter + "_base"):
+            continue
+        await conn.execute_query(
+            "ALTER TABLE {table} "
+            "ADD COLUMN {counter}_base INT NOT NULL DEFAULT 0".format(
+                table=table, counter=counter))
+        ledger_total = (
+            "(SELECT COUNT(*) FROM {counter} "
+            "WHERE {counter}.{table}_id = {table}.id)".format(
+                table=table, counter=counter))
+        await conn.execute_query(
+            "UPDATE {table} SET {counter}_base = {counter} - {total} "
+            "WHERE {counter} > {total}".format(
+                table=table, counter=counter, total=ledger_total))
+
+
+async def migrate():
+    """
+    Create the missing tables, then apply pending migrations, each in its
+    own transaction, and return their names
+    """
+    # migrations read and index every model table, tables of models
+    # added since the database was created have to exist first
+    await Tortoise.generate_schemas(safe=True)
+    db = Tortoise.get_connection("default")
+    await db.execute_query(
+        "CREATE TABLE IF NOT EXISTS schema_migration ("
+        "name VARCHAR(255) NOT NULL PRIMARY KEY)")
+    rows = await db.execute_query_dict("SELECT name FROM schema_migration")
+    done = {row["name"] for row in rows}
+    applied = []
+    for func in MIGRATIONS:
+        if func.__name__ in done:
+            continue
+        async with in_transaction() as conn:
+            await func(conn)
+            await conn.execute_query(
+                "INSERT INTO schema_migration (name) VALUES ('{}')".format(
+                    func.__name__))
+        applied.append(func.__name__)
+    return applied
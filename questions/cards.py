@@ -0,0 +1,69 @@
+from markupsafe import Markup
+from tortoise.expressions import F
+from settings import templates, FRAGMENT_CACHE_BYTES
+from utils.fragments import FragmentCache
+from questions.models import Question
+
+# Rendered question cards of the listing pages, keyed by question id. A
+# card is reused while the question version (bumped on edits, answers and
+# accepted answers) and the counters it shows are unchanged. The version
+# lives in the database, so other workers notice edits too.
+card_cache = FragmentCache(maxbytes=FRAGMENT_CACHE_BYTES)
+
+
+def card_stamp(request, question, answer_count):
+    # links are absolute, so the host is part of the stamp
+    return (
+        question.version,
+        question.view,
+        question.question_like,
+        question.accepted_answer,
+        answer_count,
+        request.url.scheme,
+        request.url.netloc,
+    )
+
+
+def render_cards(request, results):
+    """
+    HTML of the cards for (question, answer_count) pairs, rendering only
+    the ones missing from the cache
+    """
+    template = None
+    cards = []
+    for question, answer_count in results:
+        stamp = card_stamp(request, question, answer_count)
+        card = card_cache.get(question.id, stamp)
+        if card is None:
+            if template is None:
+                template = templates.get_template(
+                    "questions/question_card.html")
+            card = template.render({
+                "request": request,
+                "item": question,
+                "answer_count": answer_count,
+            })
+            card_cache.set(question.id, stamp, card)
+        cards.append(Markup(card))
+    return cards
+
+
+async def invalidate_cards(question_ids):
+    """
+    Bump the version of changed questions and drop their cards, call
+    after a question is edited, answered or gets an accepted answer
+    """
+    question_ids = list(question_ids)
+    if not question_ids:
+        return
+    await Question.filter(id__in=question_ids).update(
+        version=F("version") + 1)
+    forget_cards(question_ids)
+
+
+def forget_cards(question_ids):
+    """
+    Drop the cards of deleted questions
+    """
+    for question_id in question_ids:
+        card_cache.delete(question_id)
@@ -0,0 +1,63 @@
+from settings import COUNT_CACHE_TTL, ESTIMATED_COUNTS, COUNT_ESTIMATE_CAP
+from utils.cache import TTLCache
+from questions.models import Question
+
+# Count keys are tuples of listing name and filter values, eg. ("tags", tag).
+# Listings over the whole table (all, viewed, oldest) share one key.
+ALL_QUESTIONS = ("questions",)
+
+count_cache = TTLCache(ttl=COUNT_CACHE_TTL)
+
+
+async def table_estimate():
+    """
+    Planner row estimate of the question table, Postgres only
+    """
+    db = Question._meta.db
+    if db.capabilities.dialect != "postgres":
+        return None
+    rows = await db.execute_query_dict(
+        "SELECT reltuples::bigint AS estimate FROM pg_class "
+        "WHERE relname = 'question'"
+    )
+    if not rows or rows[0]["estimate"] < 0:
+        return None
+    return rows[0]["estimate"]
+
+
+async def estimated_count(key, queryset):
+    """
+    Return (count, is_estimate). Counting stops at COUNT_ESTIMATE_CAP
+    rows, the unfiltered table uses planner statistics on Postgres.
+    """
+    if key == ALL_QUESTIONS:
+        estimate = await table_estimate()
+        if estimate is not None and estimate > COUNT_ESTIMATE_CAP:
+            return estimate, True
+    ids = await queryset.limit(COUNT_ESTIMATE_CAP + 1).values_list(
+        "id", flat=True)
+    if len(ids) > COUNT_ESTIMATE_CAP:
+        return COUNT_ESTIMATE_CAP, True
+    return len(ids), False
+
+
+async def listing_count(key, queryset):
+    """
+    Cached (count, is_estimate) of a listing
+    """
+    result = count_cache.get(key)
+    if result is None:
+        if ESTIMATED_COUNTS:
+            result = await estimated_count(key, queryset)
+        else:
+            result = await queryset.count(), False
+        count_cache.set(key, result)
+    return result
+
+
+def invalidate_counts():
+    """
+    Drop cached counts, called when questions are created, deleted or
+    change between solved and open
+    """
+    count_cache.clear()
@@ -0,0 +1,166 @@
+from collections import Counter
+from tortoise.expressions import F
+from settings import (
+    JOB_BATCH_SIZE,
+    JOB_BATCH_PAUSE,
+    JOB_LEASE,
+    JOB_POLL_INTERVAL,
+)
+from accounts.models import User, forget_user
+from questions.models import Question, Answer, QuestionLike, AnswerLike
+from questions import fulltext
+from questions.tagging import release_tags
+from questions.cards import forget_cards
+from questions.counts import invalidate_counts
+from utils.jobs import JobRunner, Step
+
+# Users and questions are deleted by background jobs in batches, the rows
+# they cascade to are deleted first in the same order as the plan: likes
+# of the user (with their counters), answers (resetting accepted answers),
+# questions (with their tags and search documents), then the user. Each
+# batch leaves the counters, the search index and the tag catalog
+# consistent with the rows left: the questions that lose answers are
+# reindexed in the batch that deletes them.
+
+
+async def plan_question_delete(question_id):
+    answer_ids = await Answer.filter(
+        question_id=question_id).order_by("id").values_list("id", flat=True)
+    return [("answers", answer_ids), ("questions", [question_id])]
+
+
+async def plan_user_delete(user_id):
+    own_ids = await Question.filter(
+        user_id=user_id).order_by("id").values_list("id", flat=True)
+    own = set(own_ids)
+    question_likes = await QuestionLike.filter(
+        user_id=user_id).order_by("id").values_list("id", "question_id")
+    answer_like_ids = await AnswerLike.filter(
+        user_id=user_id).order_by("id").values_list("id", flat=True)
+    answers = await Answer.filter(
+        ans_user_id=user_id).order_by("id").values_list("id", "question_id")
+    answers_elsewhere = [
+        (answer_id, question_id) for answer_id, question_id in answers
+        if question_id not in own]
+    answers_on_own = await Answer.filter(
+        question__user_id=user_id).order_by("id").values_list("id", flat=True)
+    return [
+        ("question_likes", [like_id for like_id, question_id
+                            in question_likes if question_id not in own]),
+        ("answer_likes", answer_like_ids),
+        ("answers", [answer_id for answer_id, _ in answers_elsewhere]
+         + answers_on_own),
+        ("questions", own_ids),
+        ("users", [user_id]),
+    ]
+
+
+async def decrement(model, counter, ids):
+    """
+    Take one off ``counter`` of the rows of ``model`` for each time their
+    id is in ``ids``
+    """
+    by_amount = {}
+    for row_id, amount in Counter(ids).items():
+        by_amount.setdefault(amount, []).append(row_id)
+    for amount, row_ids in by_amount.items():
+        await model.filter(id__in=row_ids).update(
+            **{counter: F(counter) - amount})
+
+
+async def delete_question_likes(ids):
+    question_ids = await QuestionLike.filter(
+        id__in=ids).values_list("question_id", flat=True)
+    await decrement(Question, "question_like", question_ids)
+    await QuestionLike.filter(id__in=ids).delete()
+
+
+async def delete_answer_likes(ids):
+    answer_ids = await AnswerLike.filter(
+        id__in=ids).values_list("answer_id", flat=True)
+    await decrement(Answer, "answer_like", answer_ids)
+    await AnswerLike.filter(id__in=ids).delete()
+    # answer counters are shown on the question page, see like_answer()
+    question_ids = await Answer.filter(
+        id__in=list(set(answer_ids))).values_list("question_id", flat=True)
+    await Question.filter(id__in=list(set(question_ids))).update(
+        version=F("version") + 1)
+
+
+async def delete_answers(ids):
+    """
+    Delete answers, their questions lose the accepted answer if it is
+    one of them and are reindexed without them
+    """
+    rows = await Answer.filter(id__in=ids).values_list(
+        "question_id", "is_accepted_answer")
+    question_ids = list({question_id for question_id, _ in rows})
+    accepted = [question_id for question_id, is_accepted in rows
+                if is_accepted]
+    if accepted:
+        await Question.filter(id__in=accepted).update(accepted_answer=False)
+    await Answer.filter(id__in=ids).delete()
+    await Question.filter(id__in=question_ids).update(
+        version=F("version") + 1)
+    await fulltext.index_questions(question_ids)
+    return question_ids
+
+
+async def delete_questions(ids):
+    """
+    Delete questions, answers left cascade with them
+    """
+    # tags stay in the catalog, only their counters go down
+    await release_tags(id__in=ids)
+    await Question.filter(id__in=ids).delete()
+    await fulltext.remove_questions(ids)
+    return ids
+
+
+async def delete_users(ids):
+    users = await User.filter(id__in=ids)
+    # likes, answers and questions posted since the job was planned
+    await delete_question_likes(await QuestionLike.filter(
+        user_id__in=ids).values_list("id", flat=True))
+    await delete_answer_likes(await AnswerLike.filter(
+        user_id__in=ids).values_list("id", flat=True))
+    answered = await delete_answers(await Answer.filter(
+        ans_user_id__in=ids).values_list("id", flat=True))
+    question_ids = await Question.filter(
+        user_id__in=ids).values_list("id", flat=True)
+    if question_ids:
+        await delete_questions(question_ids)
+    await User.filter(id__in=ids).delete()
+    return users, list(set(answered) | set(question_ids))
+
+
+def questions_changed(question_ids):
+    forget_cards(question_ids)
+    invalidate_counts()
+
+
+def users_deleted(result):
+    users, question_ids = result
+    for user in users:
+        forget_user(user)
+    questions_changed(question_ids)
+
+
+DELETE_STEPS = {
+    "question_likes": Step(delete_question_likes),
+    "answer_likes": Step(delete_answer_likes),
+    "answers": Step(delete_answers, after=questions_changed),
+    # planned by jobs queued before answers were reindexed in their batch
+    "reindex": Step(fulltext.index_questions),
+    "questions": Step(delete_questions, after=questions_changed),
+    "users": Step(delete_users, after=users_deleted),
+}
+
+job_runner = JobRunner(
+    batch_size=JOB_BATCH_SIZE,
+    pause=JOB_BATCH_PAUSE,
+    lease=JOB_LEASE,
+    interval=JOB_POLL_INTERVAL,
+)
+job_runner.register("question_delete", plan_question_delete, DELETE_STEPS)
+job_runner.register("user_delete", plan_user_delete, DELETE_STEPS)
@@ -12,6 +12,7 @@ class QuestionForm(Form):
 class QuestionEditForm(Form):
     title = StringField(validators=[InputRequired()])
     content = TextAreaField(validators=[InputRequired()])
+    tags = StringField(validators=[InputRequired()])
 
 
 class AnswerForm(Form):
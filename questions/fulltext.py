@@ -0,0 +1,288 @@
+import re
+from collections import namedtuple
+from tortoise.transactions import in_transaction
+from questions.models import Question, Answer
+from questions.tagging import placeholders
+
+# Full-text index of questions, kept in a side table keyed by question id:
+# an FTS5 virtual table on SQLite, a tsvector column with a GIN index on
+# Postgres. Each document holds the title, content, author username, tag
+# names and the content of all answers.
+
+SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS question_fts USING fts5("
+    "title, content, username, tags, answers, "
+    "tokenize = 'porter unicode61')",
+]
+SQLITE_DELETE = "DELETE FROM question_fts WHERE rowid = ?"
+SQLITE_DELETE_MANY = "DELETE FROM question_fts WHERE rowid IN ({})"
+SQLITE_INSERT = (
+    "INSERT INTO question_fts "
+    "(rowid, title, content, username, tags, answers) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+# bm25 weights follow the column order, lower scores rank first
+SQLITE_RANKED = (
+    "SELECT rowid AS id, "
+    "bm25(question_fts, 10.0, 2.0, 4.0, 4.0, 1.0) AS rank "
+    "FROM question_fts WHERE question_fts MATCH ?"
+)
+SQLITE_ORDERING = ("rank", "-id")
+SQLITE_COUNT = (
+    "SELECT COUNT(*) AS count FROM question_fts WHERE question_fts MATCH ?"
+)
+
+POSTGRES_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS question_search ("
+    "question_id INT PRIMARY KEY REFERENCES question (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS question_search_document_idx "
+    "ON question_search USING GIN (document)",
+]
+POSTGRES_DELETE = "DELETE FROM question_search WHERE question_id = $1"
+POSTGRES_DELETE_MANY = (
+    "DELETE FROM question_search WHERE question_id = ANY($1::int[])"
+)
+POSTGRES_INSERT = (
+    "INSERT INTO question_search (question_id, document) VALUES ($1, "
+    "setweight(to_tsvector('english', $2), 'A') || "
+    "setweight(to_tsvector('english', $3), 'C') || "
+    "setweight(to_tsvector('simple', $4), 'B') || "
+    "setweight(to_tsvector('simple', $5), 'B') || "
+    "setweight(to_tsvector('english', $6), 'D')) "
+    "ON CONFLICT (question_id) DO UPDATE SET document = EXCLUDED.document"
+)
+POSTGRES_RANKED = (
+    "SELECT question_id AS id, ts_rank_cd(document, query) AS rank "
+    "FROM question_search, to_tsquery('english', $1) query "
+    "WHERE document @@ query"
+)
+POSTGRES_ORDERING = ("-rank", "-id")
+POSTGRES_COUNT = (
+    "SELECT COUNT(*) AS count FROM question_search "
+    "WHERE document @@ to_tsquery('english', $1)"
+)
+
+REINDEX_BATCH_SIZE = 500
+
+# a search result, ordered by rank then id as a keyset
+Ranked = namedtuple("Ranked", ["id", "rank"])
+# types of the (rank, id) values of a search cursor
+RANKED_KEY_TYPES = (float, int)
+
+
+def get_db():
+    # the connection of the transaction in progress, if any, so index
+    # writes commit or roll back with the rows they index
+    return Question._meta.db
+
+
+def is_postgres(db):
+    return db.capabilities.dialect == "postgres"
+
+
+def match_expression(db, q):
+    """
+    Turn user input into a prefix match of all its words, eg. "asyncio
+    tortoise" matches documents containing asyncio* and tortoise*
+    """
+    words = re.findall(r"\w+", q.lower())
+    if not words:
+        return None
+    if is_postgres(db):
+        return " & ".join("{}:*".format(word) for word in words)
+    return " ".join('"{}"*'.format(word) for word in words)
+
+
+async def create_search_index():
+    """
+    Create the full-text index if it does not exist yet
+    """
+    db = get_db()
+    for statement in POSTGRES_SCHEMA if is_postgres(db) else SQLITE_SCHEMA:
+        await db.execute_script(statement)
+
+
+async def write_document(db, question, answers):
+    values = [
+        question.id,
+        question.title,
+        question.content,
+        question.user.username,
+        " ".join(tag.name for tag in question.tags),
+        "\n".join(answers),
+    ]
+    if is_postgres(db):
+        await db.execute_query(POSTGRES_INSERT, values)
+    else:
+        await db.execute_query(SQLITE_DELETE, [question.id])
+        await db.execute_query(SQLITE_INSERT, values)
+
+
+async def write_documents(db, questions):
+    """
+    Write the documents of questions fetched with their user and tags,
+    their answers are read in one query
+    """
+    answers = {question.id: [] for question in questions}
+    rows = await (
+        Answer.filter(question_id__in=list(answers))
+        .values_list("question_id", "content")
+    )
+    for question_id, content in rows:
+        answers[question_id].append(content)
+    for question in questions:
+        await write_document(db, question, answers[question.id])
+
+
+async def index_question(question_id):
+    """
+    (Re)build the document of one question, call after the question or
+    one of its answers is created, edited or deleted
+    """
+    db = get_db()
+    question = await (
+        Question.get_or_none(id=question_id)
+        .prefetch_related("user", "tags")
+    )
+    if question is None:
+        await remove_question(question_id)
+        return
+    answers = await (
+        Answer.filter(question_id=question_id)
+        .values_list("content", flat=True)
+    )
+    await write_document(db, question, answers)
+
+
+async def remove_question(question_id):
+    """
+    Drop a deleted question from the index
+    """
+    db = get_db()
+    if is_postgres(db):
+        await db.execute_query(POSTGRES_DELETE, [question_id])
+    else:
+        await db.execute_query(SQLITE_DELETE, [question_id])
+
+
+async def index_questions(question_ids):
+    """
+    (Re)build the documents of several questions in a few queries, the
+    deleted ones are dropped from the index
+    """
+    question_ids = list(question_ids)
+    if not question_ids:
+        return
+    questions = await (
+        Question.filter(id__in=question_ids)
+        .prefetch_related("user", "tags")
+    )
+    await write_documents(get_db(), questions)
+    await remove_questions(
+        set(question_ids) - {question.id for question in questions})
+
+
+async def remove_questions(question_ids):
+    """
+    Drop deleted questions from the index with one statement
+    """
+    question_ids = list(question_ids)
+    if not question_ids:
+        return
+    db = get_db()
+    if is_postgres(db):
+        await db.execute_query(POSTGRES_DELETE_MANY, [question_ids])
+    else:
+        await db.execute_query(
+            SQLITE_DELETE_MANY.format(", ".join("?" * len(question_ids))),
+            question_ids)
+
+
+def search_ordering():
+    """
+    Ordering of search results from the best ranked, as keyset fields
+    """
+    return POSTGRES_ORDERING if is_postgres(get_db()) else SQLITE_ORDERING
+
+
+async def search_ranked(q, limit, offset=0, keyset=None):
+    """
+    Return the Ranked questions matching ``q``, best ranked first, from
+    ``offset`` or from the cursor of a KeysetPagination over
+    search_ordering()
+    """
+    db = get_db()
+    expression = match_expression(db, q)
+    if expression is None:
+        return []
+    ordering = search_ordering()
+    params = [expression]
+    seek = ""
+    if keyset is not None:
+        ordering = keyset.query_ordering()
+        if keyset.values is not None:
+            # rank past the cursor, or the same rank and an id past it
+            (_, rank_descending), (_, id_descending) = keyset.fields
+            seek = " WHERE rank {0} %s OR (rank = %s AND id {1} %s)".format(
+                "<" if rank_descending != keyset.before else ">",
+                "<" if id_descending != keyset.before else ">")
+            rank, question_id = keyset.values
+            params += [rank, rank, question_id]
+    order = ", ".join(
+        "{} DESC".format(field[1:]) if field.startswith("-")
+        else "{} ASC".format(field)
+        for field in ordering)
+    sql = "SELECT id, rank FROM ({}) ranked{} ORDER BY {} LIMIT %s OFFSET %s"
+    sql = sql.format(
+        POSTGRES_RANKED if is_postgres(db) else SQLITE_RANKED, seek, order)
+    params += [limit, offset]
+    sql = sql % tuple(placeholders(db, len(params) - 1, start=2))
+    rows = await db.execute_query_dict(sql, params)
+    return [Ranked(row["id"], row["rank"]) for row in rows]
+
+
+async def search_questions(q, limit, offset):
+    """
+    Return question ids matching ``q``, best ranked first
+    """
+    return [row.id for row in await search_ranked(q, limit, offset)]
+
+
+async def count_questions(q):
+    """
+    Number of questions matching ``q``, answered from the index alone
+    """
+    db = get_db()
+    expression = match_expression(db, q)
+    if expression is None:
+        return 0
+    sql = POSTGRES_COUNT if is_postgres(db) else SQLITE_COUNT
+    rows = await db.execute_query_dict(sql, [expression])
+    return rows[0]["count"]
+
+
+async def reindex():
+    """
+    Rebuild the whole index in batches, returns the number of questions
+    """
+    db = get_db()
+    await create_search_index()
+    if is_postgres(db):
+        await db.execute_script("TRUNCATE question_search")
+    else:
+        await db.execute_script("DELETE FROM question_fts")
+    last_id, total = 0, 0
+    while True:
+        questions = await (
+            Question.filter(id__gt=last_id)
+            .prefetch_related("user", "tags")
+            .order_by("id")
+            .limit(REINDEX_BATCH_SIZE)
+        )
+        if not questions:
+            return total
+        async with in_transaction() as conn:
+            await write_documents(conn, questions)
+        last_id = questions[-1].id
+        total += len(questions)
@@ -0,0 +1,103 @@
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+from questions.models import Question, Answer, QuestionLike, AnswerLike
+
+# The like ledger (question_like and answer_like tables) is the source of
+# truth, Question.question_like and Answer.answer_like are denormalized
+# counters bumped atomically with each ledger row and repaired by
+# reconcile_like_counts(). Likes counted before the ledger existed have no
+# rows, the legacy_like_base migration keeps them in the *_like_base
+# columns which the counters are reconciled on top of.
+
+RECONCILE_BATCH_SIZE = 1000
+
+
+async def like_question(user_id, question_id):
+    """
+    Record a like, returns False if the user already liked the question
+    """
+    try:
+        async with in_transaction():
+            # the unique index only settles concurrent likes of one user
+            if await question_liked_by(user_id, question_id):
+                return False
+            await QuestionLike.create(user_id=user_id, question_id=question_id)
+            await Question.filter(id=question_id).update(
+                question_like=F("question_like") + 1)
+    except IntegrityError:
+        return False
+    return True
+
+
+async def like_answer(user_id, answer_id):
+    """
+    Record a like, returns False if the user already liked the answer
+    """
+    try:
+        async with in_transaction():
+            if await liked_answer_ids(user_id, [answer_id]):
+                return False
+            await AnswerLike.create(user_id=user_id, answer_id=answer_id)
+            await Answer.filter(id=answer_id).update(
+                answer_like=F("answer_like") + 1)
+            # answer counters are shown on the question page only, its
+            # version keeps conditional GETs of the page honest
+            question_ids = await Answer.filter(id=answer_id).values_list(
+                "question_id", flat=True)
+            await Question.filter(id__in=question_ids).update(
+                version=F("version") + 1)
+    except IntegrityError:
+        return False
+    return True
+
+
+async def question_liked_by(user_id, question_id):
+    """
+    Whether the user liked the question
+    """
+    return bool(await QuestionLike.filter(
+        user_id=user_id, question_id=question_id).count())
+
+
+async def liked_answer_ids(user_id, answer_ids):
+    """
+    Ids of the given answers the user liked, in one query
+    """
+    if not answer_ids:
+        return set()
+    return set(await AnswerLike.filter(
+        user_id=user_id, answer_id__in=answer_ids
+    ).values_list("answer_id", flat=True))
+
+
+async def reconcile_like_counts():
+    """
+    Reset like counters to their legacy base plus the ledger totals, in
+    id ranges of RECONCILE_BATCH_SIZE rows, returns the number of
+    counters fixed
+    """
+    fixed = 0
+    for model, table, counter, ledger in (
+        (Question, "question", "question_like", "question_like"),
+        (Answer, "answer", "answer_like", "answer_like"),
+    ):
+        db = model._meta.db
+        last = await model.all().order_by("-id").first()
+        if last is None:
+            continue
+        for start in range(0, last.id, RECONCILE_BATCH_SIZE):
+            total = (
+                "({counter}_base + (SELECT COUNT(*) FROM {ledger} "
+                "WHERE {ledger}.{fk} = {table}.id))".format(
+                    counter=counter, ledger=ledger, fk=table + "_id",
+                    table=table)
+            )
+            fixed += (await db.execute_query(
+                "UPDATE {table} SET {counter} = {total} "
+                "WHERE id > {start} AND id <= {end} "
+                "AND {counter} <> {total}".format(
+                    table=table, counter=counter, total=total,
+                    start=start, end=start + RECONCILE_BATCH_SIZE)
+            ))[0]
+    return fixed
@@ -0,0 +1,190 @@
+from tortoise.functions import Count
+from utils import pagination
+from utils.conditional import make_etag, check_etag
+from questions.models import Question
+from questions.counts import listing_count
+from questions import fulltext
+from questions.cards import render_cards
+
+# numbered (LIMIT/OFFSET) pages stop here, deeper pages use keyset cursors
+NUMBERED_PAGES = 50
+
+
+async def answer_counts(ids):
+    """
+    Return a {question_id: answer_count} mapping for the given questions
+    using a single grouped query
+    """
+    if not ids:
+        return {}
+    rows = await (
+        Question.filter(id__in=ids)
+        .annotate(answer_count=Count("question"))
+        .values_list("id", "answer_count")
+    )
+    return dict(rows)
+
+
+async def numbered_page(request, queryset, ordering, count_key,
+                        count_queryset):
+    """
+    Shallow pages addressed by ?page=N with numbered page controls
+    """
+    page_query = pagination.get_page_number(url=request.url)
+    count, is_estimate = await listing_count(count_key, count_queryset)
+    paginator = pagination.Pagination(
+        page_query, count, max_pages=NUMBERED_PAGES, is_estimate=is_estimate)
+    results = (
+        await queryset
+        .limit(paginator.page_size)
+        .offset(paginator.offset())
+        .order_by(*ordering)
+    )
+    next_cursor = None
+    if (results and paginator.is_truncated() and
+            paginator.current_page() == paginator.total_pages()):
+        keyset = pagination.KeysetPagination(None, ordering)
+        next_cursor = pagination.encode_cursor(keyset.key(results[-1]))
+    page_controls = pagination.get_page_controls(
+        url=request.url,
+        current_page=paginator.current_page(),
+        total_pages=paginator.total_pages(),
+        next_cursor=next_cursor,
+        is_estimate=is_estimate
+    )
+    return results, page_controls, count, is_estimate
+
+
+async def keyset_page(request, queryset, ordering, cursor):
+    """
+    Deep pages addressed by an opaque ?cursor= token, no count needed
+    """
+    keyset = pagination.KeysetPagination(
+        cursor, ordering, model=queryset.model)
+    seek = keyset.filter()
+    if seek is not None:
+        queryset = queryset.filter(seek)
+    rows = (
+        await queryset
+        .limit(keyset.limit())
+        .order_by(*keyset.query_ordering())
+    )
+    results = keyset.paginate(rows)
+    page_controls = pagination.get_page_controls(
+        url=request.url,
+        current_page=None,
+        total_pages=None,
+        previous_cursor=keyset.previous_cursor,
+        next_cursor=keyset.next_cursor
+    )
+    return results, page_controls
+
+
+def listing_etag(request, results, count):
+    """
+    ETag of a listing page from its count and the fields of its rows that
+    change what their cards show, answers and edits bump the version
+    """
+    return make_etag(request, count, [
+        (row.id, row.version, row.view, row.question_like,
+         row.accepted_answer)
+        for row in results
+    ])
+
+
+async def listing_context(request, results, page_controls, count,
+                          is_estimate):
+    """
+    Answer with 304 when the client copy of the page is current,
+    otherwise load authors, tags and answer counts and render the cards
+    """
+    etag = listing_etag(request, results, (count, is_estimate))
+    check_etag(request, etag)
+    await Question.fetch_for_list(results, "user", "tags")
+    answers = await answer_counts([row.id for row in results])
+    results = [(row, answers.get(row.id, 0)) for row in results]
+    return {
+        "results": results,
+        "cards": render_cards(request, results),
+        "page_controls": page_controls,
+        "count": count,
+        "count_is_estimate": is_estimate,
+        "etag": etag,
+    }
+
+
+async def question_listing(request, queryset, ordering, count_key,
+                           count_queryset=None):
+    """
+    Paginated questions with authors, tags and answer counts.
+
+    The number of queries is constant whatever the page size: one count
+    (served from the count cache when possible, skipped in keyset mode),
+    one page select, one prefetch for users, one for tags and one grouped
+    answer count. Cards are rendered through the card cache. A request
+    whose If-None-Match still matches stops after the page select with
+    NotModified.
+    ``ordering`` must end with a unique field so it can be
+    used as a keyset, ``count_key`` identifies the listing and its filter
+    in the count cache.
+    """
+    if count_queryset is None:
+        count_queryset = queryset
+    cursor = pagination.get_cursor(url=request.url)
+    if cursor is None:
+        results, page_controls, count, is_estimate = await numbered_page(
+            request, queryset, ordering, count_key, count_queryset)
+    else:
+        results, page_controls = await keyset_page(
+            request, queryset, ordering, cursor)
+        count, is_estimate = None, False
+    return await listing_context(
+        request, results, page_controls, count, is_estimate)
+
+
+async def search_listing(request, q):
+    """
+    Paginated full-text search results in rank order, with the same
+    authors, tags and answer counts as the other listings. Like the
+    other listings, the last numbered page links on to keyset pages,
+    keyed by (rank, id).
+    """
+    ordering = fulltext.search_ordering()
+    cursor = pagination.get_cursor(url=request.url)
+    if cursor is None:
+        page_query = pagination.get_page_number(url=request.url)
+        count = await fulltext.count_questions(q)
+        paginator = pagination.Pagination(
+            page_query, count, max_pages=NUMBERED_PAGES)
+        ranked = await fulltext.search_ranked(
+            q, paginator.page_size, paginator.offset())
+        next_cursor = None
+        if (ranked and paginator.is_truncated() and
+                paginator.current_page() == paginator.total_pages()):
+            keyset = pagination.KeysetPagination(None, ordering)
+            next_cursor = pagination.encode_cursor(keyset.key(ranked[-1]))
+        page_controls = pagination.get_page_controls(
+            url=request.url,
+            current_page=paginator.current_page(),
+            total_pages=paginator.total_pages(),
+            next_cursor=next_cursor
+        )
+    else:
+        keyset = pagination.KeysetPagination(
+            cursor, ordering, types=fulltext.RANKED_KEY_TYPES)
+        ranked = keyset.paginate(
+            await fulltext.search_ranked(q, keyset.limit(), keyset=keyset))
+        page_controls = pagination.get_page_controls(
+            url=request.url,
+            current_page=None,
+            total_pages=None,
+            previous_cursor=keyset.previous_cursor,
+            next_cursor=keyset.next_cursor
+        )
+        count = None
+    ids = [row.id for row in ranked]
+    rows = await Question.filter(id__in=ids)
+    by_id = {row.id: row for row in rows}
+    results = [by_id[id] for id in ids if id in by_id]
+    return await listing_context(
+        request, results, page_controls, count, False)
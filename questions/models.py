@@ -10,11 +10,20 @@ class Question(Model):
     created = fields.DatetimeField(auto_now_add=True)
     view = fields.IntField(default=0)
     question_like = fields.IntField(default=0)
+    # likes counted before the like ledger existed, see questions.likes
+    question_like_base = fields.IntField(default=0)
     accepted_answer = fields.BooleanField(default=False)
+    # bumped when the rendered question card changes, see questions.cards
+    version = fields.IntField(default=1)
     tags = fields.ManyToManyField(
         'models.Tag', related_name='tags', through='question_tag')
     user = fields.ForeignKeyField(
-        'models.User', related_name='user', on_delete=fields.CASCADE)
+        'models.User', related_name='user', on_delete=fields.CASCADE,
+        index=True)
+
+    class Meta:
+        # keyset pagination seeks on (ordering column, id)
+        indexes = (("view", "id"), ("created", "id"))
 
     def __str__(self):
         return self.title
@@ -25,16 +34,50 @@ class Answer(Model):
     content = fields.TextField()
     created = fields.DatetimeField(auto_now_add=True)
     answer_like = fields.IntField(default=0)
+    answer_like_base = fields.IntField(default=0)
     is_accepted_answer = fields.BooleanField(default=False)
     ans_user = fields.ForeignKeyField(
-        'models.User', related_name='ans_user', on_delete=fields.CASCADE)
+        'models.User', related_name='ans_user', on_delete=fields.CASCADE,
+        index=True)
     question = fields.ForeignKeyField(
-        'models.Question', related_name='question', on_delete=fields.CASCADE)
+        'models.Question', related_name='question', on_delete=fields.CASCADE,
+        index=True)
 
 
 class Tag(Model):
     id = fields.IntField(pk=True)
-    name = fields.CharField(max_length=255)
+    name = fields.CharField(max_length=255, unique=True)
+    # number of questions tagged with this tag, kept up to date on writes
+    question_count = fields.IntField(default=0)
 
     def __str__(self):
         return self.name
+
+
+class QuestionLike(Model):
+    id = fields.IntField(pk=True)
+    created = fields.DatetimeField(auto_now_add=True)
+    user = fields.ForeignKeyField(
+        'models.User', related_name='question_likes',
+        on_delete=fields.CASCADE)
+    question = fields.ForeignKeyField(
+        'models.Question', related_name='likes', on_delete=fields.CASCADE,
+        index=True)
+
+    class Meta:
+        table = "question_like"
+        unique_together = (("user", "question"),)
+
+
+class AnswerLike(Model):
+    id = fields.IntField(pk=True)
+    created = fields.DatetimeField(auto_now_add=True)
+    user = fields.ForeignKeyField(
+        'models.User', related_name='answer_likes', on_delete=fields.CASCADE)
+    answer = fields.ForeignKeyField(
+        'models.Answer', related_name='likes', on_delete=fields.CASCADE,
+        index=True)
+
+    class Meta:
+        table = "answer_like"
+        unique_together = (("user", "answer"),)
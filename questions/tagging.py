@@ -0,0 +1,141 @@
+from collections import Counter
+from tortoise.expressions import F
+from questions.models import Tag
+
+# generate_schemas creates the question_tag join table without indexes,
+# they keep a tag from being linked twice and serve lookups by tag
+QUESTION_TAG_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS question_tag_uniq "
+    "ON question_tag (question_id, tag_id)",
+    "CREATE INDEX IF NOT EXISTS question_tag_tag_idx "
+    "ON question_tag (tag_id, question_id)",
+)
+
+
+async def create_tag_indexes():
+    """
+    Create the indexes of the question_tag table if they do not exist yet
+    """
+    db = Tag._meta.db
+    for statement in QUESTION_TAG_INDEXES:
+        await db.execute_query(statement)
+
+
+def parse_tags(value):
+    """
+    Normalized tag names from comma-separated input, without empty names
+    and duplicates
+    """
+    names = []
+    for item in value.split(","):
+        name = item.strip().lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def placeholders(db, count, start=1):
+    """
+    ``count`` query parameters in the style of the connection's dialect
+    """
+    if db.capabilities.dialect == "postgres":
+        return ["$%d" % number for number in range(start, start + count)]
+    return ["?"] * count
+
+
+async def resolve_tags(names):
+    """
+    Ids of the catalog tags for ``names`` by name, the missing ones are
+    created with a single statement. Names another request inserts at
+    the same time are skipped by the conflict clause and read back.
+    """
+    if not names:
+        return {}
+    tags = dict(await Tag.filter(name__in=names).values_list("name", "id"))
+    missing = [name for name in names if name not in tags]
+    if missing:
+        db = Tag._meta.db
+        await db.execute_query(
+            "INSERT INTO tag (name, question_count) VALUES %s "
+            "ON CONFLICT (name) DO NOTHING" % ", ".join(
+                "(%s, 0)" % param
+                for param in placeholders(db, len(missing))),
+            missing)
+        tags.update(await Tag.filter(name__in=missing).values_list(
+            "name", "id"))
+    return tags
+
+
+async def link_tags(question_id, tag_ids):
+    """
+    Insert the question_tag rows of a question in one statement
+    """
+    if not tag_ids:
+        return
+    db = Tag._meta.db
+    params = placeholders(db, len(tag_ids) * 2)
+    rows = zip(params[::2], params[1::2])
+    await db.execute_query(
+        "INSERT INTO question_tag (question_id, tag_id) VALUES %s" %
+        ", ".join("(%s, %s)" % row for row in rows),
+        [value for tag_id in tag_ids for value in (question_id, tag_id)])
+
+
+async def unlink_tags(question_id, tag_ids):
+    """
+    Delete the question_tag rows of a question for ``tag_ids``
+    """
+    if not tag_ids:
+        return
+    db = Tag._meta.db
+    params = placeholders(db, len(tag_ids) + 1)
+    await db.execute_query(
+        "DELETE FROM question_tag WHERE question_id = %s "
+        "AND tag_id IN (%s)" % (params[0], ", ".join(params[1:])),
+        [question_id] + list(tag_ids))
+
+
+async def add_tags(question_id, names):
+    """
+    Attach catalog tags to a new question and bump their counters, run
+    within a transaction so the question never has part of its tags
+    """
+    tag_ids = list((await resolve_tags(names)).values())
+    await link_tags(question_id, tag_ids)
+    if tag_ids:
+        await Tag.filter(id__in=tag_ids).update(
+            question_count=F("question_count") + 1)
+
+
+async def set_tags(question_id, names):
+    """
+    Replace the tags of a question with ``names``, only the added and
+    removed tags are written and have their counters adjusted. Run
+    within a transaction.
+    """
+    current = dict(await Tag.filter(tags__id=question_id).values_list(
+        "name", "id"))
+    removed = [tag_id for name, tag_id in current.items()
+               if name not in names]
+    await unlink_tags(question_id, removed)
+    if removed:
+        await Tag.filter(id__in=removed).update(
+            question_count=F("question_count") - 1)
+    await add_tags(question_id, [
+        name for name in names if name not in current])
+
+
+async def release_tags(**question_filter):
+    """
+    Decrement the counters of tags used by the questions matching
+    ``question_filter`` (eg. id=1 or user_id=2), call before deleting them
+    """
+    tag_ids = await Tag.filter(
+        **{"tags__" + key: value for key, value in question_filter.items()}
+    ).values_list("id", flat=True)
+    by_amount = {}
+    for tag_id, amount in Counter(tag_ids).items():
+        by_amount.setdefault(amount, []).append(tag_id)
+    for amount, ids in by_amount.items():
+        await Tag.filter(id__in=ids).update(
+            question_count=F("question_count") - amount)
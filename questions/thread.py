@@ -0,0 +1,32 @@
+from questions.models import Answer
+from questions.likes import liked_answer_ids
+
+# Answers of the question page are queried this many at a time while the
+# page streams, newest first.
+ANSWER_BATCH_SIZE = 200
+
+
+async def answer_stream(question_id, user_id=None, liked_answers=None,
+                        batch_size=ANSWER_BATCH_SIZE):
+    """
+    Answers of a question in keyset batches, each batch with its authors.
+    The ids of the answers the user liked are added to liked_answers
+    before the batch is yielded.
+    """
+    last_id = None
+    while True:
+        queryset = Answer.filter(question_id=question_id)
+        if last_id is not None:
+            queryset = queryset.filter(id__lt=last_id)
+        batch = await queryset.order_by("-id").limit(batch_size)
+        if not batch:
+            return
+        await Answer.fetch_for_list(batch, "ans_user")
+        if user_id is not None and liked_answers is not None:
+            liked_answers.update(await liked_answer_ids(
+                user_id, [answer.id for answer in batch]))
+        for answer in batch:
+            yield answer
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1].id
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from tortoise.expressions import F
+from settings import (
+    VIEW_FLUSH_INTERVAL,
+    VIEW_FLUSH_MAX_PENDING,
+    VIEWED_FILTER_BYTES,
+    VIEWED_TTL,
+)
+from questions.models import Question
+from utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+# session key of the questions viewed in the session
+VIEWED_KEY = "viewed"
+
+
+class ViewCounter():
+    """
+    Write-behind question view counter.
+
+    Views are summed in memory and written periodically as batched
+    ``view = view + n`` updates, so concurrent viewers never lose
+    increments and a hot question costs one write per flush instead of
+    one full row save per view. Pending views are lost if the process is
+    killed without a clean shutdown.
+    """
+
+    def __init__(self, interval, max_pending):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = {}
+        self.pending_since = None
+        self.last_flush = None
+        self.flushes = 0
+        self.flushed_views = 0
+        self._wakeup = None
+        self._task = None
+
+    def increment(self, question_id, count=1):
+        if not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending[question_id] = self.pending.get(question_id, 0) + count
+        if len(self.pending) >= self.max_pending and self._wakeup:
+            self._wakeup.set()
+
+    def pending_views(self, question_id):
+        """
+        Views of the question counted by this process and not written yet
+        """
+        return self.pending.get(question_id, 0)
+
+    async def flush(self):
+        """
+        Write pending views, one UPDATE per distinct increment
+        """
+        pending, since = self.pending, self.pending_since
+        self.pending, self.pending_since = {}, None
+        by_count = {}
+        for question_id, count in pending.items():
+            by_count.setdefault(count, []).append(question_id)
+        try:
+            for count, ids in by_count.items():
+                await Question.filter(id__in=ids).update(
+                    view=F("view") + count)
+        except Exception:
+            # put the views back, the next flush retries them
+            for question_id, count in pending.items():
+                self.increment(question_id, count)
+            self.pending_since = since
+            raise
+        self.last_flush = time.monotonic()
+        self.flushes += 1
+        self.flushed_views += sum(pending.values())
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self.pending:
+                continue
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flushing question views failed")
+
+    async def start(self):
+        # the event has to be bound to the running loop
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        """
+        Stop the flush loop and write what is left
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.pending:
+            await self.flush()
+
+    def stats(self):
+        """
+        Lag metrics: pending questions and views, age of the oldest
+        unwritten view and time since the last flush, in seconds
+        """
+        now = time.monotonic()
+        return {
+            "pending_questions": len(self.pending),
+            "pending_views": sum(self.pending.values()),
+            "lag": now - self.pending_since if self.pending_since else 0.0,
+            "since_last_flush": (
+                now - self.last_flush if self.last_flush else None),
+            "flushes": self.flushes,
+            "flushed_views": self.flushed_views,
+        }
+
+
+view_counter = ViewCounter(VIEW_FLUSH_INTERVAL, VIEW_FLUSH_MAX_PENDING)
+
+
+def viewed_filter(session):
+    """
+    Start time and bloom filter of the questions viewed in the session,
+    a fresh filter once VIEWED_TTL has passed
+    """
+    since, bits = session.get(VIEWED_KEY, (0, None))
+    if bits is None or time.time() - since > VIEWED_TTL:
+        return time.time(), BloomFilter(VIEWED_FILTER_BYTES)
+    return since, BloomFilter.loads(bits)
+
+
+def has_viewed(session, question_id):
+    return question_id in viewed_filter(session)[1]
+
+
+def mark_viewed(session, question_id):
+    since, viewed = viewed_filter(session)
+    viewed.add(question_id)
+    session[VIEWED_KEY] = [since, viewed.dumps()]
@@ -1,11 +1,9 @@
 import datetime
-import itertools as it
-from settings import templates, BASE_HOST
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+from settings import templates, streaming_templates, BASE_HOST
 from starlette.responses import RedirectResponse
 from starlette.authentication import requires
-from tortoise.query_utils import Q
-from tortoise.transactions import in_transaction
-from utils import pagination
 from questions.forms import (
     QuestionForm,
     AnswerForm,
@@ -15,51 +13,35 @@ from questions.forms import (
     QuestionLikesForm,
     AcceptedAnswerForm
 )
-from accounts.models import (
-    User,
-    ADMIN
-)
+from accounts.models import ADMIN
 from questions.models import (
     Question,
     Answer,
     Tag,
 )
+from questions.listing import question_listing, search_listing
+from questions import fulltext
+from questions.tagging import parse_tags, add_tags, set_tags
+from questions.deletion import job_runner
+from questions.viewcounter import view_counter, has_viewed, mark_viewed
+from questions.likes import like_question, like_answer, question_liked_by
+from questions.thread import answer_stream
+from questions.counts import ALL_QUESTIONS, invalidate_counts
+from questions.cards import invalidate_cards, forget_cards
+from utils.conditional import make_etag, check_etag, etag_headers
 
 
 async def questions_all(request):
     """
     All questions
     """
-    page_query = pagination.get_page_number(url=request.url)
-    count = await Question.all().count()
-    paginator = pagination.Pagination(page_query, count)
-    results = (
-        await Question.all()
-        .prefetch_related("user", "tags")
-        .limit(paginator.page_size)
-        .offset(paginator.offset())
-        .order_by('-id')
-    )
-    answer_count = []
-    for row in results:
-        r = (
-            await Answer.all()
-            .prefetch_related("question")
-            .filter(question__id=row.id).count()
-        )
-        answer_count.append(r)
-    page_controls = pagination.get_page_controls(
-        url=request.url,
-        current_page=paginator.current_page(),
-        total_pages=paginator.total_pages()
+    context = await question_listing(
+        request, Question.all(), ("-id",), ALL_QUESTIONS
     )
+    context["request"] = request
     return templates.TemplateResponse(
-        "questions/questions.html",
-        {
-            "request": request,
-            "results": zip(results, answer_count),
-            "page_controls": page_controls,
-        }
+        "questions/questions.html", context,
+        headers=etag_headers(context["etag"])
     )
 
 
@@ -67,36 +49,13 @@ async def questions_solved(request):
     """
     Solved questions
     """
-    page_query = pagination.get_page_number(url=request.url)
-    count = await Question.filter(accepted_answer=True).count()
-    paginator = pagination.Pagination(page_query, count)
-    results = (
-        await Question.filter(accepted_answer=True)
-        .prefetch_related("user", "tags")
-        .limit(paginator.page_size)
-        .offset(paginator.offset())
-        .order_by('-id')
-    )
-    answer_count = []
-    for row in results:
-        r = (
-            await Answer.all()
-            .prefetch_related("question")
-            .filter(question__id=row.id).count()
-        )
-        answer_count.append(r)
-    page_controls = pagination.get_page_controls(
-        url=request.url,
-        current_page=paginator.current_page(),
-        total_pages=paginator.total_pages()
+    context = await question_listing(
+        request, Question.filter(accepted_answer=True), ("-id",), ("solved",)
     )
+    context["request"] = request
     return templates.TemplateResponse(
-        "questions/questions.html",
-        {
-            "request": request,
-            "results": zip(results, answer_count),
-            "page_controls": page_controls
-        }
+        "questions/questions.html", context,
+        headers=etag_headers(context["etag"])
     )
 
 
@@ -104,36 +63,13 @@ async def questions_open(request):
     """
     Unsolved questions
     """
-    page_query = pagination.get_page_number(url=request.url)
-    count = await Question.filter(accepted_answer=False).count()
-    paginator = pagination.Pagination(page_query, count)
-    results = (
-        await Question.filter(accepted_answer=False)
-        .prefetch_related("user", "tags")
-        .limit(paginator.page_size)
-        .offset(paginator.offset())
-        .order_by('-id')
-    )
-    answer_count = []
-    for row in results:
-        r = (
-            await Answer.all()
-            .prefetch_related("question")
-            .filter(question__id=row.id).count()
-        )
-        answer_count.append(r)
-    page_controls = pagination.get_page_controls(
-        url=request.url,
-        current_page=paginator.current_page(),
-        total_pages=paginator.total_pages()
+    context = await question_listing(
+        request, Question.filter(accepted_answer=False), ("-id",), ("open",)
     )
+    context["request"] = request
     return templates.TemplateResponse(
-        "questions/questions.html",
-        {
-            "request": request,
-            "results": zip(results, answer_count),
-            "page_controls": page_controls
-        }
+        "questions/questions.html", context,
+        headers=etag_headers(context["etag"])
     )
 
 
@@ -141,36 +77,13 @@ async def questions_viewed(request):
     """
     Most viewed questions
     """
-    page_query = pagination.get_page_number(url=request.url)
-    count = await Question.all().count()
-    paginator = pagination.Pagination(page_query, count)
-    results = (
-        await Question.all()
-        .prefetch_related("user", "tags")
-        .limit(paginator.page_size)
-        .offset(paginator.offset())
-        .order_by('-view')
-    )
-    answer_count = []
-    for row in results:
-        r = (
-            await Answer.all()
-            .prefetch_related("question")
-            .filter(question__id=row.id).count()
-        )
-        answer_count.append(r)
-    page_controls = pagination.get_page_controls(
-        url=request.url,
-        current_page=paginator.current_page(),
-        total_pages=paginator.total_pages()
+    context = await question_listing(
+        request, Question.all(), ("-view", "-id"), ALL_QUESTIONS
     )
+    context["request"] = request
     return templates.TemplateResponse(
-        "questions/questions.html",
-        {
-            "request": request,
-            "results": zip(results, answer_count),
-            "page_controls": page_controls
-        }
+        "questions/questions.html", context,
+        headers=etag_headers(context["etag"])
     )
 
 
@@ -178,36 +91,13 @@ async def questions_oldest(request):
     """
     Oldest questions
     """
-    page_query = pagination.get_page_number(url=request.url)
-    count = await Question.all().count()
-    paginator = pagination.Pagination(page_query, count)
-    results = (
-        await Question.all()
-        .prefetch_related("user", "tags")
-        .limit(paginator.page_size)
-        .offset(paginator.offset())
-        .order_by('id')
-    )
-    answer_count = []
-    for row in results:
-        r = (
-            await Answer.all()
-            .prefetch_related("question")
-            .filter(question__id=row.id).count()
-        )
-        answer_count.append(r)
-    page_controls = pagination.get_page_controls(
-        url=request.url,
-        current_page=paginator.current_page(),
-        total_pages=paginator.total_pages()
+    context = await question_listing(
+        request, Question.all(), ("id",), ALL_QUESTIONS
     )
+    context["request"] = request
     return templates.TemplateResponse(
-        "questions/questions.html",
-        {
-            "request": request,
-            "results": zip(results, answer_count),
-            "page_controls": page_controls
-        }
+        "questions/questions.html", context,
+        headers=etag_headers(context["etag"])
     )
 
 
@@ -217,44 +107,44 @@ async def question(request):
     """
     id = request.path_params["id"]
     path = request.url.path
+    viewed = has_viewed(request.session, id)
+    if viewed:
+        # the view is already counted, a current client copy costs one
+        # small query; answers, edits and likes all change the validators
+        validators = await Question.filter(id=id).values_list(
+            "version", "view", "question_like")
+        if validators:
+            version, view, question_like = validators[0]
+            check_etag(request, make_etag(
+                request, version, view + view_counter.pending_views(id),
+                question_like))
     results = await Question.get(id=id).prefetch_related("user", "tags")
     # update question views per session
-    session_key = 'viewed_question_{}'.format(results.id)
-    if not request.session.get(session_key, False):
-        results.view += 1
-        await results.save()
-        request.session[session_key] = True
-    # question and answer likes per session
-    try:
-        qus_data = await request.form()
-        question_likes_form = QuestionLikesForm(qus_data)
-        ans_data = await request.form()
-        likes_form = AnswerLikesForm(ans_data)
-        if request.method == "POST":
-            result = await Question.get(
-                id=question_likes_form.question_id.data)
-            session_key_quslike = 'liked_question_{}'.format(result.id)
-            if not request.session.get(session_key_quslike, False):
-                result.question_like += 1
-                await result.save()
-                request.session[session_key_quslike] = True
-                return RedirectResponse(BASE_HOST + path, status_code=302)
-    except ValueError:
-        if request.method == "POST":
-            result = await Answer.get(id=likes_form.answer_id.data)
-            session_key_like = 'liked_answer_{}'.format(result.id)
-            if not request.session.get(session_key_like, False):
-                result.answer_like += 1
-                await result.save()
-                request.session[session_key_like] = True
-                return RedirectResponse(BASE_HOST + path, status_code=302)
-    answer_results = (
-        await Answer.all()
-        .prefetch_related("ans_user", "question")
-        .filter(question__id=id)
-        .order_by("-id")
-    )
-    return templates.TemplateResponse(
+    if not viewed:
+        view_counter.increment(results.id)
+        mark_viewed(request.session, results.id)
+    # views are written in batches by the view counter, shown right away
+    results.view += view_counter.pending_views(results.id)
+    data = await request.form()
+    question_likes_form = QuestionLikesForm(data)
+    likes_form = AnswerLikesForm(data)
+    user = None
+    if request.user.is_authenticated:
+        user = request.user
+    # question and answer likes, recorded once per user in the like ledger
+    if request.method == "POST":
+        answer_id = likes_form.answer_id.data
+        if user is not None and question_likes_form.question_id.data:
+            await like_question(user.id, results.id)
+        elif user is not None and answer_id and answer_id.isdigit():
+            await like_answer(user.id, int(answer_id))
+        return RedirectResponse(BASE_HOST + path, status_code=302)
+    question_liked, liked_answers = False, set()
+    if user is not None:
+        question_liked = await question_liked_by(user.id, results.id)
+    # the head and navbar go out at once, answers are queried in batches
+    # while the page streams
+    return streaming_templates.TemplateResponse(
         "questions/question.html",
         {
             "request": request,
@@ -262,9 +152,14 @@ async def question(request):
             "path": path,
             "likes_form": likes_form,
             "question_likes_form": question_likes_form,
-            "answer_results": answer_results,
-            "answer_count": len(answer_results),
+            "answer_results": answer_stream(
+                results.id, user.id if user else None, liked_answers),
+            "answer_count": await Answer.filter(question_id=id).count(),
+            "question_liked": question_liked,
+            "liked_answers": liked_answers,
         },
+        headers=etag_headers(make_etag(
+            request, results.version, results.view, results.question_like)),
     )
 
 
@@ -273,8 +168,6 @@ async def question_create(request):
     """
     Question form
     """
-    session_user = request.user.username
-    results = await User.get(username=session_user)
     data = await request.form()
     form = QuestionForm(data)
     title = form.title.data
@@ -288,18 +181,15 @@ async def question_create(request):
                 created=datetime.datetime.now(),
                 view=0,
                 question_like=0,
-                user_id=results.id,
+                user_id=request.user.id,
             )
-            await query.save()
-            tags = []
-            # split tags and make sure that is valid tags list without empty
-            # space and than insert in db
-            valid_tags_list = [i for i in form.tags.data.split(",") if i != '']
-            for idx, item in enumerate(valid_tags_list):
-                tag = Tag(name=item.lower())
-                await tag.save()
-                tags.append(tag)
-                await query.tags.add(tags[idx])
+            # tags come from the catalog, one row per name, the question
+            # is only saved along with all of them
+            async with in_transaction():
+                await query.save()
+                await add_tags(query.id, parse_tags(form.tags.data))
+            await fulltext.index_question(query.id)
+            invalidate_counts()
             return RedirectResponse(url="/questions/?page=1", status_code=302)
         tag_error = "Tags must be comma-separated"
         return templates.TemplateResponse(
@@ -317,31 +207,41 @@ async def question_edit(request):
     Question edit form
     """
     id = request.path_params["id"]
-    session_user = request.user.username
-    results = await User.get(username=session_user)
-    question = await Question.get(id=id)
+    question = await Question.get(id=id).prefetch_related("tags")
     data = await request.form()
     form = QuestionEditForm(data)
     new_form_value, form.content.data = form.content.data, question.content
     title = form.title.data
-    if request.method == "POST" and form.validate():
-        await Question.filter(id=id).update(
-            title=title,
-            slug="-".join(title.lower().split()),
-            content=new_form_value,
-            created=datetime.datetime.now(),
-            view=question.view,
-            question_like=question.question_like,
-            user_id=results.id,
-        )
-        if request.user.username == ADMIN:
-            return RedirectResponse(url="/accounts/dashboard", status_code=302)
-        return RedirectResponse(url="/accounts/profile", status_code=302)
+    tag_error = None
+    if request.method != "POST":
+        form.tags.data = ", ".join(tag.name for tag in question.tags)
+    elif form.validate():
+        # same rule as the question form
+        if "," in form.tags.data or len((form.tags.data).split()) == 1:
+            async with in_transaction():
+                await Question.filter(id=id).update(
+                    title=title,
+                    slug="-".join(title.lower().split()),
+                    content=new_form_value,
+                    created=datetime.datetime.now(),
+                    user_id=request.user.id,
+                    version=F("version") + 1,
+                )
+                await set_tags(question.id, parse_tags(form.tags.data))
+            forget_cards([question.id])
+            await fulltext.index_question(id)
+            invalidate_counts()
+            if request.user.username == ADMIN:
+                return RedirectResponse(
+                    url="/accounts/dashboard", status_code=302)
+            return RedirectResponse(url="/accounts/profile", status_code=302)
+        tag_error = "Tags must be comma-separated"
     return templates.TemplateResponse(
         "questions/question_edit.html", {
             "request": request,
             "form": form,
-            "question": question
+            "question": question,
+            "tag_error": tag_error,
         }
     )
 
@@ -353,15 +253,8 @@ async def question_delete(request):
     """
     id = request.path_params["id"]
     if request.method == "POST":
-        # delete all related tags
-        async with in_transaction() as conn:
-            await conn.execute_query(
-                f"DELETE FROM tag WHERE tag.id IN \
-                (SELECT question_tag.tag_id FROM question \
-                JOIN question_tag ON question_tag.question_id = question.id \
-                WHERE question.id={id})"
-            )
-        await Question.get(id=id).delete()
+        # answers first, in batches of a background job
+        await job_runner.submit("question_delete", id)
         if request.user.username == ADMIN:
             return RedirectResponse(url="/accounts/dashboard", status_code=302)
         return RedirectResponse(url="/accounts/profile", status_code=302)
@@ -378,10 +271,8 @@ async def answer_create(request):
         await Question.get(id=id)
         .prefetch_related("user", "tags")
     )
-    session_user = request.user.username
     data = await request.form()
     form = AnswerForm(data)
-    result = await User.get(username=session_user)
     if request.method == "POST" and form.validate():
         query = Answer(
             content=form.content.data,
@@ -389,9 +280,11 @@ async def answer_create(request):
             answer_like=0,
             is_accepted_answer=0,
             question_id=results.id,
-            ans_user_id=result.id,
+            ans_user_id=request.user.id,
         )
         await query.save()
+        await invalidate_cards([results.id])
+        await fulltext.index_question(results.id)
         return RedirectResponse(BASE_HOST + next, status_code=302)
     return templates.TemplateResponse(
         "questions/answer_create.html", {
@@ -421,6 +314,8 @@ async def answer_edit(request):
             question_id=answer.question_id,
             ans_user_id=answer.ans_user_id,
         )
+        await invalidate_cards([answer.question_id])
+        await fulltext.index_question(answer.question_id)
         if request.user.username == ADMIN:
             return RedirectResponse(url="/accounts/dashboard", status_code=302)
         return RedirectResponse(url="/accounts/profile", status_code=302)
@@ -440,12 +335,14 @@ async def answer_delete(request):
     """
     id = request.path_params["id"]
     answer = await Answer.get(id=id)
-    question = await Question.get(id=answer.question_id)
     if request.method == "POST":
         if answer.is_accepted_answer:
-            question.accepted_answer = False
-            await question.save()
+            await Question.filter(id=answer.question_id).update(
+                accepted_answer=False)
+            invalidate_counts()
         await Answer.get(id=id).delete()
+        await invalidate_cards([answer.question_id])
+        await fulltext.index_question(answer.question_id)
         if request.user.username == ADMIN:
             return RedirectResponse(url="/accounts/dashboard", status_code=302)
         return RedirectResponse(url="/accounts/profile", status_code=302)
@@ -467,8 +364,10 @@ async def accepted_answer(request):
     if request.method == "POST":
         result.is_accepted_answer = True
         await result.save()
-        res.accepted_answer = True
-        await res.save()
+        await Question.filter(id=res.id).update(
+            accepted_answer=True, version=F("version") + 1)
+        forget_cards([res.id])
+        invalidate_counts()
         return RedirectResponse(BASE_HOST + path, status_code=302)
     return templates.TemplateResponse(
         "questions/accepted_answer.html", {
@@ -485,43 +384,15 @@ async def tags(request):
     """
     All tags
     """
-    page_query = pagination.get_page_number(url=request.url)
     tag = request.path_params["tag"]
-    count = (
-        await Question.all()
-        .prefetch_related("user", "tags")
-        .filter(tags__name=tag)
-        .count()
-    )
-    paginator = pagination.Pagination(page_query, count)
-    results = (
-        await Question.all()
-        .prefetch_related("user", "tags")
-        .filter(tags__name=tag)
-        .limit(paginator.page_size)
-        .offset(paginator.offset())
-        .order_by("-id")
-    )
-    answer_count = []
-    for row in results:
-        r = (
-            await Answer.all()
-            .prefetch_related("question")
-            .filter(question__id=row.id).count()
-        )
-        answer_count.append(r)
-    page_controls = pagination.get_page_controls(
-        url=request.url,
-        current_page=paginator.current_page(),
-        total_pages=paginator.total_pages()
+    context = await question_listing(
+        request, Question.filter(tags__name=tag), ("-id",), ("tags", tag)
     )
+    context["request"] = request
+    context["tag"] = tag
     return templates.TemplateResponse(
-        "questions/tags.html", {
-            "request": request,
-            "results": zip(results, answer_count),
-            "page_controls": page_controls,
-            "tag": tag
-        }
+        "questions/tags.html", context,
+        headers=etag_headers(context["etag"])
     )
 
 
@@ -529,66 +400,18 @@ async def search(request):
     """
     Search questions
     """
-    try:
-        page_query = pagination.get_page_number(url=request.url)
-        q = request.query_params['q']
-        count = (
-            await Question.all()
-            .prefetch_related("user")
-            .filter(Q(title__icontains=q) |
-                    Q(content__icontains=q) |
-                    Q(user__username__icontains=q))
-            .distinct()
-            .count()
+    q = request.query_params.get("q")
+    if q:
+        context = await search_listing(request, q)
+    else:
+        context = await question_listing(
+            request, Question.all(), ("-id",), ALL_QUESTIONS
         )
-        paginator = pagination.Pagination(page_query, count)
-        results = (
-            await Question.all()
-            .prefetch_related("user", "tags")
-            .filter(Q(title__icontains=q) |
-                    Q(content__icontains=q) |
-                    Q(user__username__icontains=q) |
-                    Q(tags__name__icontains=q))
-            .distinct()
-            .limit(paginator.page_size)
-            .offset(paginator.offset())
-        )
-        page_controls = pagination.get_page_controls(
-            url=request.url,
-            current_page=paginator.current_page(),
-            total_pages=paginator.total_pages()
-        )
-    except KeyError:
-        page_query = pagination.get_page_number(url=request.url)
-        count = await Question.all().count()
-        paginator = pagination.Pagination(page_query, count)
-        results = (
-            await Question.all()
-            .prefetch_related("user", "tags")
-            .limit(paginator.page_size)
-            .offset(paginator.offset())
-        )
-        page_controls = pagination.get_page_controls(
-            url=request.url,
-            current_page=paginator.current_page(),
-            total_pages=paginator.total_pages()
-        )
-    answer_count = []
-    for row in results:
-        r = (
-            await Answer.all()
-            .prefetch_related("question")
-            .filter(question__id=row.id).count()
-        )
-        answer_count.append(r)
+    context["request"] = request
+    context["q"] = q
     return templates.TemplateResponse(
-        "questions/search.html", {
-            "request": request,
-            "results": zip(results, answer_count),
-            "page_controls": page_controls,
-            "count": count,
-            "q": q
-        }
+        "questions/search.html", context,
+        headers=etag_headers(context["etag"])
     )
 
 
@@ -596,11 +419,10 @@ async def tags_categories(request):
     """
     Tags categories
     """
-    # use itertools.groupby to simulate SQL GROUP BY
-    results = await Tag.all().order_by("name").values("name")
-    categories_tags = [
-        (k, sum(1 for i in g)) for k, g in it.groupby(results)
-    ]
+    # served from the maintained per-tag counters
+    categories_tags = (
+        await Tag.filter(question_count__gt=0).order_by("name")
+    )
     return templates.TemplateResponse(
         "questions/tags_categories.html", {
             "request": request,
@@ -1,9 +1,139 @@
 from starlette.config import Config
+from starlette.datastructures import CommaSeparatedStrings
 from starlette.templating import Jinja2Templates
+from utils.streaming import StreamingTemplates
+from utils.templatecache import bytecode_cache
+from utils.staticfiles import load_manifest, static_url_for
+from utils.querylog import current_queries
+from utils.metrics import TimedTemplate
+from utils.dbpool import database_config
 
 # Configuration from environment variables or '.env' file.
 config = Config(".env")
 DB_URI = config("DB_URI")
 SECRET_KEY = config("SECRET_KEY")
+# Compiled templates are cached in this directory, shared by workers and
+# kept across restarts (fill it with manage.py precompile-templates),
+# empty disables the cache. Every template is loaded at startup unless
+# TEMPLATE_WARMUP is off.
+TEMPLATE_CACHE_DIR = config("TEMPLATE_CACHE_DIR", default=".template_cache")
+TEMPLATE_WARMUP = config("TEMPLATE_WARMUP", cast=bool, default=True)
+# Fingerprinted and precompressed static files are built into this
+# directory by manage.py build-static, url_for('static', ...) links to
+# them once built.
+STATIC_BUILD_DIR = config("STATIC_BUILD_DIR", default="static_build")
+static_manifest = load_manifest(STATIC_BUILD_DIR)
+# SQL queries are counted and timed per request and sent in a
+# Server-Timing header. Requests running more than SLOW_REQUEST_QUERIES
+# queries or SLOW_REQUEST_DB_MS milliseconds of them are logged with
+# their SQL. With SQL_DEBUG_PANEL on pages list their queries at the
+# bottom, never enable it in production.
+SQL_INSTRUMENTATION = config("SQL_INSTRUMENTATION", cast=bool, default=True)
+SLOW_REQUEST_QUERIES = config("SLOW_REQUEST_QUERIES", cast=int, default=20)
+SLOW_REQUEST_DB_MS = config("SLOW_REQUEST_DB_MS", cast=float, default=100)
+SQL_DEBUG_PANEL = config("SQL_DEBUG_PANEL", cast=bool, default=False)
+# Request, query, template and event loop metrics of each process are
+# served on /metrics for Prometheus, behind the METRICS_TOKEN bearer
+# token. Without a token /metrics is not found, unless METRICS_PUBLIC
+# opens it to everyone.
+METRICS_ENABLED = config("METRICS_ENABLED", cast=bool, default=True)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+METRICS_PUBLIC = config("METRICS_PUBLIC", cast=bool, default=False)
 templates = Jinja2Templates(directory="templates")
+if METRICS_ENABLED:
+    templates.env.template_class = TimedTemplate
+templates.env.globals["url_for"] = static_url_for(static_manifest)
+if SQL_INSTRUMENTATION and SQL_DEBUG_PANEL:
+    templates.env.globals["query_log"] = current_queries
+streaming_templates = StreamingTemplates(templates)
+if TEMPLATE_CACHE_DIR:
+    templates.env.bytecode_cache = bytecode_cache(TEMPLATE_CACHE_DIR, "sync")
+    streaming_templates.env.bytecode_cache = bytecode_cache(
+        TEMPLATE_CACHE_DIR, "async")
+MODELS = {"models": ["accounts.models", "questions.models", "utils.jobs"]}
+# Postgres connection pool of each worker: DB_POOL_MIN_SIZE connections
+# are opened and checked at startup, at most DB_POOL_MAX_SIZE, idle ones
+# above the minimum are closed after DB_POOL_IDLE_TIMEOUT seconds. Each
+# connection keeps up to DB_STATEMENT_CACHE_SIZE prepared statements so
+# repeated queries are planned once (0 behind a transaction pooler like
+# pgbouncer). Options in the DB_URI query string take precedence, SQLite
+# uses a single connection.
+DB_POOL_MIN_SIZE = config("DB_POOL_MIN_SIZE", cast=int, default=2)
+DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", cast=int, default=10)
+DB_POOL_IDLE_TIMEOUT = config(
+    "DB_POOL_IDLE_TIMEOUT", cast=float, default=300)
+DB_STATEMENT_CACHE_SIZE = config(
+    "DB_STATEMENT_CACHE_SIZE", cast=int, default=100)
+DB_POOL_SETTINGS = {
+    "min_size": DB_POOL_MIN_SIZE,
+    "max_size": DB_POOL_MAX_SIZE,
+    "idle_timeout": DB_POOL_IDLE_TIMEOUT,
+    "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+}
+TORTOISE_CONFIG = database_config(DB_URI, MODELS, **DB_POOL_SETTINGS)
+# Read queries of requests go to these replicas of DB_URI (comma-separated
+# URLs, in turn), unless the request or its session wrote less than
+# DB_REPLICA_PIN seconds ago. A failing replica is skipped for
+# DB_REPLICA_RETRY seconds, its reads go to DB_URI.
+DB_REPLICA_URIS = config(
+    "DB_REPLICA_URIS", cast=CommaSeparatedStrings, default="")
+DB_REPLICA_PIN = config("DB_REPLICA_PIN", cast=float, default=5)
+DB_REPLICA_RETRY = config("DB_REPLICA_RETRY", cast=float, default=30)
+DB_REPLICAS = {
+    "replica{}".format(number): database_config(
+        url, {}, **DB_POOL_SETTINGS)["connections"]["default"]
+    for number, url in enumerate(DB_REPLICA_URIS)
+}
 BASE_HOST = "http://localhost:8000"
+
+# Listing counts are cached per listing and filter for this many seconds.
+COUNT_CACHE_TTL = config("COUNT_CACHE_TTL", cast=float, default=60)
+# Estimate instead of counting exactly on very large tables, listings then
+# show "many pages" instead of the last page numbers.
+ESTIMATED_COUNTS = config("ESTIMATED_COUNTS", cast=bool, default=False)
+COUNT_ESTIMATE_CAP = config("COUNT_ESTIMATE_CAP", cast=int, default=10000)
+
+# Question views are counted in memory and written in batches at least
+# this often (seconds), or sooner once this many questions are pending.
+VIEW_FLUSH_INTERVAL = config("VIEW_FLUSH_INTERVAL", cast=float, default=5)
+VIEW_FLUSH_MAX_PENDING = config(
+    "VIEW_FLUSH_MAX_PENDING", cast=int, default=1000)
+
+# Users of authenticated requests are cached per process for this many
+# seconds, up to this many users.
+USER_CACHE_TTL = config("USER_CACHE_TTL", cast=float, default=60)
+USER_CACHE_SIZE = config("USER_CACHE_SIZE", cast=int, default=1024)
+
+# bcrypt work factor of new password hashes, older hashes are rehashed
+# on login. Hashing runs on this many threads with at most
+# PASSWORD_HASH_QUEUE more waiting, further logins are turned away.
+PASSWORD_HASH_ROUNDS = config("PASSWORD_HASH_ROUNDS", cast=int, default=12)
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", cast=int, default=2)
+PASSWORD_HASH_QUEUE = config("PASSWORD_HASH_QUEUE", cast=int, default=32)
+
+# Rendered question cards are cached per process up to this many bytes,
+# 0 disables the cache.
+FRAGMENT_CACHE_BYTES = config(
+    "FRAGMENT_CACHE_BYTES", cast=int, default=8 * 1024 * 1024)
+
+# Sessions are kept server-side, in an SQLite file shared by the workers
+# of a host ("sqlite") or in process memory ("memory"), and expire after
+# SESSION_MAX_AGE seconds without changes. The cookie only holds an id.
+SESSION_BACKEND = config("SESSION_BACKEND", default="sqlite")
+SESSION_DB = config("SESSION_DB", default=".sessions.sqlite3")
+SESSION_MAX_AGE = config("SESSION_MAX_AGE", cast=int, default=14 * 86400)
+# Questions viewed in a session are remembered in a bloom filter of this
+# many bytes, reset every VIEWED_TTL seconds so later visits count again.
+# Sessions holding nothing else expire after VIEWED_TTL seconds.
+VIEWED_FILTER_BYTES = config("VIEWED_FILTER_BYTES", cast=int, default=512)
+VIEWED_TTL = config("VIEWED_TTL", cast=float, default=86400)
+
+# Users and questions are deleted by background jobs of each process in
+# batches of JOB_BATCH_SIZE rows per transaction, JOB_BATCH_PAUSE seconds
+# apart. A job left by a stopped process is resumed JOB_LEASE seconds
+# after its last batch, queued jobs are looked up every
+# JOB_POLL_INTERVAL seconds (or right away when submitted here).
+JOB_BATCH_SIZE = config("JOB_BATCH_SIZE", cast=int, default=200)
+JOB_BATCH_PAUSE = config("JOB_BATCH_PAUSE", cast=float, default=0.05)
+JOB_LEASE = config("JOB_LEASE", cast=float, default=60)
+JOB_POLL_INTERVAL = config("JOB_POLL_INTERVAL", cast=float, default=5)
@@ -0,0 +1,38 @@
+// Polls the background jobs in progress listed on the dashboard and
+// reloads the page once they are all finished.
+(function () {
+  var rows = document.querySelectorAll("tr[data-job]");
+  if (!rows.length) {
+    return;
+  }
+
+  function update(row) {
+    return fetch(row.getAttribute("data-job"), {credentials: "same-origin"})
+      .then(function (response) {
+        return response.json();
+      })
+      .then(function (job) {
+        row.querySelector(".job-status").textContent = job.status;
+        row.querySelector(".job-progress").textContent =
+          job.done + " of " + job.total;
+        return job.status === "pending" || job.status === "running";
+      });
+  }
+
+  function poll() {
+    Promise.all(Array.prototype.map.call(rows, update)).then(
+      function (active) {
+        if (active.indexOf(true) === -1) {
+          window.location.reload();
+        } else {
+          setTimeout(poll, 1000);
+        }
+      },
+      function () {
+        setTimeout(poll, 5000);
+      }
+    );
+  }
+
+  setTimeout(poll, 1000);
+})();
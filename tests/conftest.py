@@ -0,0 +1,30 @@
+import asyncio
+import os
+import tempfile
+import pytest
+
+# settings are read on import, the app under test runs on a database of
+# its own with server-side state kept in memory
+TEST_DIR = tempfile.mkdtemp(prefix="qa-tests-")
+os.environ["DB_URI"] = "sqlite://" + os.path.join(TEST_DIR, "db.sqlite3")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ["SESSION_BACKEND"] = "memory"
+os.environ["TEMPLATE_CACHE_DIR"] = ""
+# pending views are only written on shutdown
+os.environ["VIEW_FLUSH_INTERVAL"] = "3600"
+
+
+@pytest.fixture
+def client():
+    from starlette.testclient import TestClient
+    from app import app
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def run(client):
+    """
+    Run a coroutine on the loop of the app, with its database open
+    """
+    return asyncio.get_event_loop().run_until_complete
@@ -0,0 +1,54 @@
+from tortoise.transactions import in_transaction
+from accounts.models import User
+from questions import fulltext
+from questions.deletion import delete_answers, delete_users
+from questions.models import Question, Answer, QuestionLike
+
+
+async def create_thread(name, word):
+    """
+    A question answered with ``word`` and liked by the user ``name``
+    """
+    author, answerer = [
+        await User.create(
+            username=username, email=username + "@example.com",
+            password="!", login_count=1)
+        for username in (name + "-asker", name)
+    ]
+    question = await Question.create(
+        title="Deleted answers", slug="deleted-answers", content="Body",
+        user_id=author.id, question_like=1)
+    answer = await Answer.create(
+        content="Answered with " + word, question_id=question.id,
+        ans_user_id=answerer.id, is_accepted_answer=True)
+    await Question.filter(id=question.id).update(accepted_answer=True)
+    await QuestionLike.create(user_id=answerer.id, question_id=question.id)
+    await fulltext.index_question(question.id)
+    return answerer, question, answer
+
+
+async def delete_answer_batch(answer):
+    async with in_transaction():
+        await delete_answers([answer.id])
+
+
+async def delete_user_batch(user):
+    async with in_transaction():
+        await delete_users([user.id])
+
+
+def test_answer_batch_reindexes_its_questions(client, run):
+    _, question, answer = run(create_thread("answerer", "zanzibar"))
+    assert run(fulltext.search_questions("zanzibar", 10, 0)) == [question.id]
+    run(delete_answer_batch(answer))
+    assert run(fulltext.search_questions("zanzibar", 10, 0)) == []
+    assert not run(Question.get(id=question.id)).accepted_answer
+
+
+def test_user_batch_deletes_rows_posted_since_the_plan(client, run):
+    user, question, _ = run(create_thread("late", "timbuktu"))
+    run(delete_user_batch(user))
+    assert run(fulltext.search_questions("timbuktu", 10, 0)) == []
+    question = run(Question.get(id=question.id))
+    assert question.question_like == 0
+    assert not question.accepted_answer
@@ -0,0 +1,33 @@
+import logging
+from accounts.models import User
+from questions.likes import like_question, like_answer
+from questions.models import Question, Answer
+
+
+async def create_answer():
+    user = await User.create(
+        username="liker", email="liker@example.com", password="!",
+        login_count=1)
+    question = await Question.create(
+        title="Liked", slug="liked", content="Body", user_id=user.id)
+    return user, await Answer.create(
+        content="Answer", question_id=question.id, ans_user_id=user.id)
+
+
+async def like_twice(user, answer):
+    return [
+        await like_question(user.id, answer.question_id),
+        await like_question(user.id, answer.question_id),
+        await like_answer(user.id, answer.id),
+        await like_answer(user.id, answer.id),
+    ]
+
+
+def test_repeated_like_is_not_counted_nor_logged(client, run, caplog):
+    user, answer = run(create_answer())
+    with caplog.at_level(logging.ERROR):
+        assert run(like_twice(user, answer)) == [True, False, True, False]
+    assert not caplog.records
+    question = run(Question.get(id=answer.question_id))
+    assert question.question_like == 1
+    assert run(Answer.get(id=answer.id)).answer_like == 1
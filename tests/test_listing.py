@@ -0,0 +1,93 @@
+import re
+from accounts.models import User
+from questions.counts import invalidate_counts
+from questions.models import Question, Answer
+from questions.tagging import add_tags
+from utils.pagination import encode_cursor
+
+N = 5
+LISTINGS = [
+    "/questions/",
+    "/questions/?page=2",
+    "/questions/solved",
+    "/questions/open",
+    "/questions/viewed",
+    "/questions/oldest",
+    "/questions/tags/common",
+    "/questions/search",
+]
+
+
+async def seed_questions(count):
+    """
+    ``count`` questions of a few users, each with two tags and an answer
+    """
+    first = await User.all().count()
+    users = [
+        await User.create(
+            username="lister{}".format(first + i),
+            email="lister{}@example.com".format(first + i),
+            password="!",
+            login_count=1,
+        )
+        for i in range(3)
+    ]
+    for i in range(count):
+        user = users[i % len(users)]
+        question = await Question.create(
+            title="Listed question {}".format(i),
+            slug="listed-question-{}".format(i),
+            content="Body",
+            view=i,
+            accepted_answer=i % 2 == 0,
+            user_id=user.id,
+        )
+        await add_tags(question.id, ["common", "tag{}".format(i % 4)])
+        await Answer.create(
+            content="Answer", question_id=question.id,
+            ans_user_id=users[(i + 1) % len(users)].id,
+            is_accepted_answer=i % 2 == 0)
+    invalidate_counts()
+
+
+async def deep_cursors():
+    """
+    Cursor pages of the listings keyed by id and by (view, id)
+    """
+    last = await Question.all().order_by("-id").first()
+    return {
+        "/questions/ cursor": "/questions/?cursor=" + encode_cursor(
+            [last.id]),
+        "/questions/viewed cursor": "/questions/viewed?cursor=" +
+        encode_cursor([last.view, last.id]),
+    }
+
+
+def query_count(response):
+    """
+    Queries of a request as recorded by QueryLogMiddleware
+    """
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    return int(re.search(r'desc="(\d+) queries"', timing).group(1))
+
+
+def page_queries(client, run):
+    # counted again, as after a write
+    invalidate_counts()
+    paths = {path: path for path in LISTINGS}
+    paths.update(run(deep_cursors()))
+    return {
+        label: query_count(client.get(path))
+        for label, path in paths.items()
+    }
+
+
+def test_listing_queries_do_not_grow_with_rows(client, run):
+    run(seed_questions(N))
+    small = page_queries(client, run)
+    run(seed_questions(9 * N))
+    large = page_queries(client, run)
+    assert large == small
+    # count, page, users, tags and answer counts, no count for cursors
+    assert set(small.values()) == {4, 5}
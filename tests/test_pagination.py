@@ -0,0 +1,57 @@
+import base64
+import datetime
+import json
+import pytest
+from questions.models import Question
+from utils.pagination import KeysetPagination, encode_cursor
+
+ORDERINGS = [("-id",), ("-view", "-id"), ("created", "id")]
+
+
+def token(payload):
+    data = json.dumps(payload).encode("utf8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("ordering", ORDERINGS)
+@pytest.mark.parametrize("cursor", [
+    token({"v": [[1]], "b": False}),
+    token({"v": [{"dt": "2020-01-01"}], "b": True}),
+    token({"v": ["x", "y"]}),
+    token({"v": ["x", "y"], "b": False}),
+    token({"v": [True, 1], "b": False}),
+    token({"v": [2 ** 70, 1], "b": False}),
+    token({"v": [1.5, 2], "b": False}),
+    token({"v": [None, 1], "b": False}),
+    token({"v": [{"dt": 5}], "b": True}),
+    token({"v": "ab", "b": False}),
+    token({"v": [1, 2, 3], "b": False}),
+    token([1]),
+    token("x"),
+    "!!!",
+])
+def test_forged_cursor_falls_back_to_first_page(ordering, cursor):
+    keyset = KeysetPagination(cursor, ordering, model=Question)
+    assert keyset.values is None
+    assert keyset.before is False
+    assert keyset.filter() is None
+    assert keyset.query_ordering() == list(ordering)
+
+
+def test_cursor_of_another_ordering_falls_back_to_first_page():
+    cursor = encode_cursor([datetime.datetime(2020, 1, 1), 7])
+    keyset = KeysetPagination(cursor, ("-view", "-id"), model=Question)
+    assert keyset.values is None
+
+
+@pytest.mark.parametrize("ordering, values", [
+    (("-id",), [7]),
+    (("-view", "-id"), [3, 7]),
+    (("created", "id"), [datetime.datetime(2020, 1, 1, 12, 30), 7]),
+])
+def test_encoded_cursor_is_accepted(ordering, values):
+    cursor = encode_cursor(values, before=True)
+    keyset = KeysetPagination(cursor, ordering, model=Question)
+    assert keyset.values == values
+    assert keyset.before is True
+    assert keyset.filter() is not None
@@ -0,0 +1,54 @@
+import html
+import re
+from accounts.models import User
+from questions import fulltext
+from questions.listing import NUMBERED_PAGES
+from questions.models import Question
+
+PAGE_SIZE = 2
+# more matches than the numbered pages show
+MATCHES = NUMBERED_PAGES * PAGE_SIZE + 7
+
+
+async def seed_matches():
+    user = await User.create(
+        username="searcher", email="searcher@example.com", password="!",
+        login_count=1)
+    for i in range(MATCHES):
+        # a few distinct ranks, ties are broken by id
+        question = await Question.create(
+            title="Quokka question {}".format(i),
+            slug="quokka-question-{}".format(i),
+            content=" ".join(["quokka"] * (i % 3 + 1)),
+            user_id=user.id)
+        await fulltext.index_question(question.id)
+
+
+def page(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    ids = [int(id) for id in re.findall(
+        r'<h4><b><a href="[^"]*/questions/(\d+)/', response.text)]
+    links = {
+        text: html.unescape(href) for href, text in re.findall(
+            r'class="page-link" href="([^"]+)"\s*>(\w+)<', response.text)
+    }
+    return ids, links
+
+
+def test_search_continues_past_the_numbered_pages(client, run):
+    run(seed_matches())
+    expected = run(fulltext.search_questions("quokka", MATCHES + 1, 0))
+    assert len(expected) == MATCHES
+    url = "/questions/search?q=quokka&page={}".format(NUMBERED_PAGES)
+    ids, links = page(client, url)
+    pages = [(url, ids)]
+    while "Next" in links:
+        url = links["Next"]
+        ids, links = page(client, url)
+        pages.append((url, ids))
+    start = (NUMBERED_PAGES - 1) * PAGE_SIZE
+    assert sum((ids for _, ids in pages), []) == expected[start:]
+    # and back from the last cursor page
+    _, links = page(client, pages[-1][0])
+    assert page(client, links["Previous"])[0] == pages[-2][1]
@@ -0,0 +1,24 @@
+from accounts.models import User
+from questions.models import Question
+from questions.viewcounter import view_counter
+
+
+async def create_question():
+    user = await User.create(
+        username="viewer", email="viewer@example.com", password="!",
+        login_count=1)
+    return await Question.create(
+        title="Viewed once", slug="viewed-once", content="Body",
+        user_id=user.id)
+
+
+def test_view_counted_once_per_session(client, run):
+    question = run(create_question())
+    url = "/questions/{}/{}".format(question.id, question.slug)
+    first = client.get(url)
+    assert first.status_code == 200
+    assert "session" in first.cookies
+    # the same cookie jar, the view is already counted
+    second = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 304
+    assert view_counter.pending == {question.id: 1}
@@ -0,0 +1,40 @@
+import base64
+import hashlib
+
+
+class BloomFilter():
+    """
+    Fixed-size set of keys answering "maybe seen" or "never seen".
+
+    A size of 512 bytes with 4 hashes stays under 1% false positives up
+    to about 400 keys. Serialized as base64 to fit JSON sessions.
+    """
+
+    def __init__(self, size=512, hashes=4, bits=None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray(size)
+
+    def positions(self, key):
+        digest = hashlib.blake2b(
+            str(key).encode(), digest_size=4 * self.hashes).digest()
+        for offset in range(0, len(digest), 4):
+            yield int.from_bytes(
+                digest[offset:offset + 4], "little") % (self.size * 8)
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(key))
+
+    def dumps(self):
+        return base64.b64encode(bytes(self.bits)).decode("ascii")
+
+    @classmethod
+    def loads(cls, data, hashes=4):
+        bits = base64.b64decode(data)
+        return cls(len(bits), hashes, bits)
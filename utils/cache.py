@@ -0,0 +1,42 @@
+import time
+import typing
+from collections import OrderedDict
+
+
+class TTLCache():
+    """
+    In-process LRU cache whose entries expire ``ttl`` seconds after
+    they are set. Not shared between workers, so anything cached here
+    may be stale for up to ``ttl`` seconds in the other processes.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # type: OrderedDict
+
+    def get(self, key: typing.Hashable, default: typing.Any = None):
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            return default
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: typing.Hashable, value: typing.Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: typing.Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,88 @@
+import hashlib
+import os
+from starlette.responses import Response
+
+# Changes when templates are deployed, so cached pages are not reused
+# across template changes. Computed once per process from the template
+# files, so every worker of a deployment agrees on it.
+TEMPLATE_DIRECTORY = "templates"
+
+
+def template_stamp(directory=TEMPLATE_DIRECTORY):
+    stamp = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            stamp.append((root, name, stat.st_mtime, stat.st_size))
+    return sorted(stamp)
+
+
+TEMPLATE_STAMP = template_stamp()
+
+
+class NotModified(Exception):
+    """
+    Raised by a view when the client copy of the page is still current,
+    answered with an empty 304 response
+    """
+
+    def __init__(self, etag):
+        super().__init__(etag)
+        self.etag = etag
+
+
+def viewer(request):
+    """
+    The parts of a request that change the rendered page for the same
+    data, ie. who is logged in and the admin cookie used by the navbar
+    """
+    username = ""
+    if request.user.is_authenticated:
+        username = request.user.username
+    return username, request.cookies.get("admin")
+
+
+def make_etag(request, *parts):
+    """
+    Weak ETag of a page from the validators of the data shown in it
+    """
+    key = repr((TEMPLATE_STAMP, str(request.url), viewer(request), parts))
+    return 'W/"{}"'.format(hashlib.md5(key.encode("utf-8")).hexdigest())
+
+
+def is_fresh(request, etag):
+    """
+    Whether the If-None-Match header of the request matches ``etag``,
+    compared weakly as required for GET
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def check_etag(request, etag):
+    """
+    Raise NotModified when the client already has this version of the
+    page, only GET and HEAD requests are answered from the client copy
+    """
+    if request.method in ("GET", "HEAD") and is_fresh(request, etag):
+        raise NotModified(etag)
+
+
+def etag_headers(etag):
+    # pages differ per logged in user, shared caches must key on the cookie
+    return {"ETag": etag, "Vary": "Cookie", "Cache-Control": "no-cache"}
+
+
+def not_modified_response(exc):
+    return Response(status_code=304, headers=etag_headers(exc.etag))
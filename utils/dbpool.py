@@ -0,0 +1,198 @@
+import asyncio
+import time
+import typing
+from tortoise import Tortoise
+from tortoise.backends.base.config_generator import expand_db_url
+from utils.metrics import registry
+
+ASYNCPG_ENGINE = "tortoise.backends.asyncpg"
+
+
+def database_config(
+    db_url: str,
+    modules: typing.Dict[str, typing.List[str]],
+    min_size: int = 1,
+    max_size: int = 5,
+    idle_timeout: float = 300.0,
+    statement_cache_size: int = 100,
+) -> dict:
+    """
+    Tortoise config of ``db_url`` with the asyncpg pool settings, options
+    in the query string of the URL (eg. ?max_size=20) take precedence.
+    SQLite has a single connection and no pool.
+    """
+    connection = expand_db_url(db_url)
+    if connection["engine"] == ASYNCPG_ENGINE:
+        credentials = connection["credentials"]
+        # Tortoise reads the pool size from minsize/maxsize only
+        credentials["minsize"] = credentials.pop("min_size", min_size)
+        credentials["maxsize"] = credentials.pop("max_size", max_size)
+        credentials.setdefault(
+            "max_inactive_connection_lifetime", idle_timeout)
+        credentials.setdefault("statement_cache_size", statement_cache_size)
+    return {
+        "connections": {"default": connection},
+        "apps": {
+            name: {"models": models, "default_connection": "default"}
+            for name, models in modules.items()
+        },
+    }
+
+
+class PoolStats():
+    """
+    Waits for a database connection: the asyncpg pool, or the lock of
+    the single SQLite connection
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.reset()
+
+    def reset(self) -> None:
+        self.acquired = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def timed(self, acquire: typing.Awaitable) -> typing.Any:
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        start = time.perf_counter()
+        try:
+            return await acquire
+        finally:
+            wait = time.perf_counter() - start
+            self.waiting -= 1
+            self.acquired += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            pool_wait.observe(wait, (self.name,))
+
+
+class TimedLock(asyncio.Lock):
+    """
+    Connection lock of the SQLite client counting the waits for it
+    """
+
+    def __init__(self, stats: PoolStats) -> None:
+        super().__init__()
+        self.stats = stats
+
+    async def acquire(self) -> bool:
+        return await self.stats.timed(super().acquire())
+
+
+def timed_acquire(acquire: typing.Callable,
+                  stats: PoolStats) -> typing.Callable:
+    # Tortoise always awaits pool.acquire(), a coroutine does as well
+    async def acquire_timed(*args, **kwargs):
+        return await stats.timed(acquire(*args, **kwargs))
+    return acquire_timed
+
+
+# PoolStats of each connection name, once instrumented
+pool_stats = {}  # type: typing.Dict[str, PoolStats]
+
+
+def instrument_pools() -> None:
+    """
+    Count the waits for connections of the open Tortoise connections
+    """
+    for name, connection in Tortoise._connections.items():
+        if name in pool_stats:
+            continue
+        stats = pool_stats[name] = PoolStats(name)
+        pool = getattr(connection, "_pool", None)
+        if pool is not None:
+            pool.acquire = timed_acquire(pool.acquire, stats)
+        elif hasattr(connection, "_lock"):
+            # transactions take the same lock as single queries
+            connection._lock = TimedLock(stats)
+
+
+async def warm_up_pools() -> None:
+    """
+    Open the minimum number of connections of every pool and run a
+    query on each, so the first requests don't wait for connecting and
+    a database that can't be reached fails the startup
+    """
+    for connection in Tortoise._connections.values():
+        pool = getattr(connection, "_pool", None)
+        if pool is None:
+            await connection.execute_query("SELECT 1")
+            continue
+
+        async def check():
+            pooled = await pool.acquire()
+            try:
+                await pooled.fetchval("SELECT 1")
+            finally:
+                await pool.release(pooled)
+        # held at the same time, so each check gets its own connection
+        await asyncio.gather(*[
+            check() for _ in range(connection.pool_minsize)])
+
+
+def pool_usage() -> typing.Dict[typing.Tuple[str, str], float]:
+    """
+    Open, busy, maximum and awaited connections of each database
+    connection, asyncpg pools report their holders, SQLite has one
+    connection
+    """
+    usage = {}
+    for name, connection in Tortoise._connections.items():
+        pool = getattr(connection, "_pool", None)
+        if pool is not None:
+            holders = pool._holders
+            size = sum(1 for holder in holders if holder._con is not None)
+            busy = sum(1 for holder in holders if holder._in_use is not None)
+            limit = connection.pool_maxsize
+        else:
+            size = int(getattr(connection, "_connection", None) is not None)
+            lock = getattr(connection, "_lock", None)
+            busy = int(lock is not None and lock.locked())
+            limit = 1
+        usage[(name, "open")] = size
+        usage[(name, "busy")] = busy
+        usage[(name, "max")] = limit
+        if name in pool_stats:
+            usage[(name, "waiting")] = pool_stats[name].waiting
+    return usage
+
+
+def pool_summary() -> typing.List[dict]:
+    """
+    Usage and waits of each database connection for the dashboard
+    """
+    usage = pool_usage()
+    summary = []
+    for name in Tortoise._connections:
+        stats = pool_stats.get(name) or PoolStats(name)
+        limit = usage[(name, "max")]
+        summary.append({
+            "name": name,
+            "open": usage[(name, "open")],
+            "busy": usage[(name, "busy")],
+            "max": limit,
+            "saturation": usage[(name, "busy")] / limit,
+            "waiting": stats.waiting,
+            "max_waiting": stats.max_waiting,
+            "acquired": stats.acquired,
+            "wait_avg_ms": (
+                stats.wait_total * 1000 / stats.acquired
+                if stats.acquired else 0.0),
+            "wait_max_ms": stats.wait_max * 1000,
+        })
+    return summary
+
+
+registry.gauge(
+    "db_pool_connections",
+    "Open, busy, maximum and awaited database connections.",
+    ("database", "state"), collect=pool_usage)
+pool_wait = registry.histogram(
+    "db_pool_wait_seconds", "Time waited for a database connection.",
+    ("database",), buckets=(
+        0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import functools
+import importlib
+import itertools
+import logging
+import time
+import typing
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from tortoise import Tortoise
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# client methods that can read, the others always write
+READ_METHODS = ("execute_query", "execute_query_dict")
+WRITE_METHODS = ("execute_insert", "execute_many", "execute_script")
+# session key of the time until which the session reads the primary
+PIN_KEY = "db_primary_until"
+
+
+class RoutingState():
+    """
+    Routing of one request: reads may go to replicas until it writes
+    """
+
+    def __init__(self, pinned: bool = False) -> None:
+        self.pinned = pinned
+        self.wrote = False
+
+
+# state of the request being handled, None outside of requests (startup,
+# background flushes) where everything goes to the primary
+current_state = contextvars.ContextVar(
+    "current_state", default=None)  # type: contextvars.ContextVar
+
+
+def is_read(query: str) -> bool:
+    return query.lstrip()[:6].upper() == "SELECT"
+
+
+class Replica():
+    def __init__(self, name: str, info: dict) -> None:
+        self.name = name
+        self.info = info
+        self.client = None
+        self.down_until = 0.0
+
+    async def connect(self) -> None:
+        engine = importlib.import_module(self.info["engine"])
+        client = engine.client_class(
+            connection_name=self.name, **self.info["credentials"])
+        try:
+            await client.create_connection(with_db=True)
+        except Exception:
+            # aiosqlite keeps the thread of a failed connection running
+            connection = getattr(client, "_connection", None)
+            if hasattr(connection, "_running"):
+                connection._running = False
+            raise
+        self.client = client
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+
+class DatabaseRouter():
+    """
+    Sends the SELECT statements of requests to replica databases, round
+    robin, and everything else to the primary (the "default" Tortoise
+    connection).
+
+    A request that writes reads from the primary from then on, and so
+    does its session for ``pin_seconds`` so the pages after a form post
+    see the change despite replication lag. Transactions always run on
+    the primary. A replica that fails is left out for ``retry_seconds``,
+    the failed read is sent to the primary instead.
+    """
+
+    def __init__(self, replicas: typing.Dict[str, dict],
+                 pin_seconds: float = 5.0,
+                 retry_seconds: float = 30.0) -> None:
+        self.replicas = [Replica(name, info)
+                         for name, info in replicas.items()]
+        self.pin_seconds = pin_seconds
+        self.retry_seconds = retry_seconds
+        self.primary = None
+        self._next = itertools.cycle(self.replicas)
+
+    async def start(self) -> None:
+        """
+        Connect the replicas and route the queries of the primary, call
+        once Tortoise is initialized
+        """
+        if not self.replicas:
+            return
+        self.primary = Tortoise.get_connection("default")
+        for replica in self.replicas:
+            await self.reconnect(replica)
+        cls = type(self.primary)
+        for name in READ_METHODS:
+            method = cls.__dict__.get(name)
+            if method is not None and not getattr(method, "routed", False):
+                setattr(cls, name, self.routed_read(method))
+        # transaction wrappers subclass the client class
+        for subclass in [cls] + cls.__subclasses__():
+            for name in READ_METHODS + WRITE_METHODS:
+                method = subclass.__dict__.get(name)
+                if (method is not None
+                        and not getattr(method, "pinning", False)):
+                    setattr(subclass, name, self.pinning(method))
+
+    async def stop(self) -> None:
+        for replica in self.replicas:
+            await replica.close()
+
+    async def reconnect(self, replica: Replica) -> bool:
+        try:
+            await replica.close()
+            await replica.connect()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self.failed(replica, exc)
+            return False
+        return True
+
+    def failed(self, replica: Replica, exc: Exception) -> None:
+        logger.warning("Replica %s failed, reading from the primary for "
+                       "%.0f s: %r", replica.name, self.retry_seconds, exc)
+        replica.down_until = time.monotonic() + self.retry_seconds
+        replica_failures.inc((replica.name,))
+
+    async def replica(self) -> typing.Optional[Replica]:
+        """
+        Next replica that is up, reconnected if it failed before
+        """
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            replica = next(self._next)
+            if replica.down_until > now:
+                continue
+            if replica.down_until and not await self.reconnect(replica):
+                continue
+            replica.down_until = 0.0
+            return replica
+        return None
+
+    def pinning(self, method: typing.Callable) -> typing.Callable:
+        @functools.wraps(method)
+        async def wrapper(client, query, *args, **kwargs):
+            state = current_state.get()
+            if state is not None and not (
+                    method.__name__ in READ_METHODS and is_read(query)):
+                state.wrote = state.pinned = True
+            return await method(client, query, *args, **kwargs)
+        wrapper.pinning = True
+        return wrapper
+
+    def routed_read(self, method: typing.Callable) -> typing.Callable:
+        @functools.wraps(method)
+        async def wrapper(client, query, *args, **kwargs):
+            state = current_state.get()
+            if (client is not self.primary or state is None
+                    or not is_read(query)):
+                return await method(client, query, *args, **kwargs)
+            replica = None if state.pinned else await self.replica()
+            if replica is not None:
+                try:
+                    result = await method(
+                        replica.client, query, *args, **kwargs)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    self.failed(replica, exc)
+                else:
+                    routed_reads.inc((replica.name,))
+                    return result
+            routed_reads.inc(("default",))
+            return await method(client, query, *args, **kwargs)
+        wrapper.routed = True
+        return wrapper
+
+
+class ReplicaRoutingMiddleware():
+    """
+    Pure ASGI middleware giving each HTTP request its routing state,
+    pinned to the primary if its session wrote recently. Goes inside the
+    session middleware.
+    """
+
+    def __init__(self, app: ASGIApp, router: DatabaseRouter) -> None:
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope["type"] != "http" or not self.router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        session = scope.get("session", {})
+        state = RoutingState(
+            pinned=session.get(PIN_KEY, 0) > time.time())
+        token = current_state.set(state)
+
+        async def send_with_pin(message: Message) -> None:
+            if message["type"] == "http.response.start" and state.wrote:
+                session[PIN_KEY] = time.time() + self.router.pin_seconds
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_pin)
+        finally:
+            current_state.reset(token)
+
+
+routed_reads = registry.counter(
+    "db_routed_reads_total", "Read queries of requests by database.",
+    ("database",))
+replica_failures = registry.counter(
+    "db_replica_failures_total",
+    "Failed replica queries or connections, retried on the primary.",
+    ("database",))
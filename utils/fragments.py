@@ -0,0 +1,69 @@
+import typing
+from collections import OrderedDict
+
+
+class FragmentCache():
+    """
+    In-process LRU cache of rendered HTML fragments bounded by their
+    total size in bytes.
+
+    Each key holds a single fragment together with the ``stamp`` it was
+    rendered for (eg. a version number and the counters shown in it). A
+    lookup with a different stamp is a miss and the next ``set`` replaces
+    the outdated fragment, so stale entries never pile up. A ``maxbytes``
+    of 0 disables the cache.
+    """
+
+    def __init__(self, maxbytes: int) -> None:
+        self.maxbytes = maxbytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # type: OrderedDict
+
+    def get(self, key: typing.Hashable, stamp: typing.Hashable):
+        entry = self._data.get(key)
+        if entry is None or entry[0] != stamp:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: typing.Hashable, stamp: typing.Hashable,
+            fragment: str) -> None:
+        self.delete(key)
+        size = len(fragment.encode("utf-8"))
+        if size > self.maxbytes:
+            return
+        self._data[key] = (stamp, fragment, size)
+        self.size += size
+        while self.size > self.maxbytes:
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self.size -= evicted
+            self.evictions += 1
+
+    def delete(self, key: typing.Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.size,
+            "maxbytes": self.maxbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
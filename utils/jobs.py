@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import time
+import typing
+from tortoise import fields
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# jobs a runner picks up, failed ones wait to be submitted again
+ACTIVE = (PENDING, RUNNING)
+
+
+class Job(Model):
+    """
+    Background job with its plan and progress, one batch at a time
+    """
+    id = fields.IntField(pk=True)
+    kind = fields.CharField(max_length=50)
+    target_id = fields.IntField()
+    status = fields.CharField(max_length=20, default=PENDING)
+    # JSON list of [step name, ids], fixed when the job starts
+    plan = fields.TextField(default="")
+    # next batch: index of its step in the plan and of its first id
+    step = fields.IntField(default=0)
+    position = fields.IntField(default=0)
+    done = fields.IntField(default=0)
+    total = fields.IntField(default=0)
+    error = fields.TextField(default="")
+    created = fields.DatetimeField(auto_now_add=True)
+    # time.time() until which a runner holds the job, renewed each batch
+    lease_until = fields.FloatField(default=0)
+
+    class Meta:
+        table = "job"
+        indexes = (("status", "id"), ("kind", "target_id"))
+
+    def state(self) -> dict:
+        """
+        Progress of the job as polled by the dashboard
+        """
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "target_id": self.target_id,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+        }
+
+
+class Step():
+    """
+    Batch function of a job: ``run(ids)`` within the transaction that
+    records the progress, ``after(result)`` once it committed, for state
+    of this process only (caches)
+    """
+
+    def __init__(self, run: typing.Callable,
+                 after: typing.Callable = None) -> None:
+        self.run = run
+        self.after = after
+
+
+class JobKind():
+    def __init__(self, plan: typing.Callable,
+                 steps: typing.Dict[str, Step]) -> None:
+        self.plan = plan
+        self.steps = steps
+
+
+class JobRunner():
+    """
+    In-process runner of the jobs recorded in the job table, one job and
+    one batch at a time so requests keep getting the database.
+
+    A job is planned when it starts: ``plan(target_id)`` returns its
+    steps as (step name, ids) pairs, read in one transaction and stored
+    with the job, every batch then works on the rows found then. Each
+    batch of ``batch_size`` ids commits along with the job progress, so
+    a job stopped halfway resumes with its next batch, in this process
+    or, once its ``lease`` (seconds) ran out, in another one.
+    """
+
+    def __init__(self, batch_size: int = 200, pause: float = 0.05,
+                 lease: float = 60.0, interval: float = 5.0) -> None:
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lease = lease
+        self.interval = interval
+        self.kinds = {}  # type: typing.Dict[str, JobKind]
+        self.current = None
+        self._wakeup = None
+        self._task = None
+
+    def register(self, kind: str, plan: typing.Callable,
+                 steps: typing.Dict[str, Step]) -> None:
+        self.kinds[kind] = JobKind(plan, steps)
+
+    async def submit(self, kind: str, target_id: int) -> Job:
+        """
+        Queue a job, or return the one already queued for the same
+        target. A failed job is resumed from its last batch.
+        """
+        job = await Job.filter(
+            kind=kind, target_id=target_id, status__in=ACTIVE + (FAILED,)
+        ).order_by("-id").first()
+        if job is None:
+            job = await Job.create(kind=kind, target_id=target_id)
+        elif job.status == FAILED:
+            job.status = RUNNING if job.plan else PENDING
+            job.error = ""
+            job.lease_until = 0
+            await job.save()
+        self.wake()
+        return job
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def claim(self, job: Job) -> bool:
+        now = time.time()
+        return bool(await Job.filter(
+            id=job.id, status__in=ACTIVE, lease_until__lt=now
+        ).update(lease_until=now + self.lease))
+
+    async def run_pending(self) -> None:
+        """
+        Run the queued jobs and the ones left by a stopped runner, oldest
+        first
+        """
+        while True:
+            job = await Job.filter(
+                status__in=ACTIVE, lease_until__lt=time.time()
+            ).order_by("id").first()
+            if job is None:
+                return
+            if await self.claim(job):
+                self.current = job
+                try:
+                    await self.run_job(job)
+                finally:
+                    self.current = None
+
+    async def run_job(self, job: Job) -> None:
+        try:
+            kind = self.kinds.get(job.kind)
+            if kind is None:
+                raise LookupError("Unknown job kind %r" % job.kind)
+            if job.status == PENDING:
+                await self.start_job(job, kind)
+            plan = json.loads(job.plan)
+            while job.step < len(plan):
+                name, ids = plan[job.step]
+                await self.run_batch(job, kind.steps[name], ids)
+                await asyncio.sleep(self.pause)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("Job %d (%s %d) failed", job.id, job.kind,
+                             job.target_id)
+            # progress is left as of the last committed batch
+            await Job.filter(id=job.id).update(
+                status=FAILED, error=repr(exc), lease_until=0)
+            return
+        job.status = DONE
+        job.lease_until = 0
+        await job.save()
+
+    async def start_job(self, job: Job, kind: JobKind) -> None:
+        async with in_transaction() as conn:
+            if conn.capabilities.dialect == "postgres":
+                # all queries of the plan see the same snapshot
+                await conn.execute_query(
+                    "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            plan = [[name, list(ids)]
+                    for name, ids in await kind.plan(job.target_id) if ids]
+            job.plan = json.dumps(plan)
+            job.total = sum(len(ids) for _, ids in plan)
+            job.status = RUNNING
+            job.lease_until = time.time() + self.lease
+            await job.save()
+
+    async def run_batch(self, job: Job, step: Step,
+                        ids: typing.List[int]) -> None:
+        batch = ids[job.position:job.position + self.batch_size]
+        step_index, position = job.step, job.position + len(batch)
+        if position >= len(ids):
+            step_index, position = job.step + 1, 0
+        async with in_transaction():
+            result = await step.run(batch)
+            await Job.filter(id=job.id).update(
+                step=step_index,
+                position=position,
+                done=job.done + len(batch),
+                lease_until=time.time() + self.lease,
+            )
+        job.step, job.position = step_index, position
+        job.done += len(batch)
+        if step.after is not None:
+            step.after(result)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.run_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Running background jobs failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def start(self) -> None:
+        # the event has to be bound to the running loop
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stop after rolling back the batch in progress, its job is left to
+        the next runner to start
+        """
+        if self._task is None:
+            return
+        current, self.current = self.current, None
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if current is not None:
+            await Job.filter(id=current.id, status=RUNNING).update(
+                lease_until=0)
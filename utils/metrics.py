@@ -0,0 +1,298 @@
+import asyncio
+import bisect
+import hmac
+import time
+import typing
+import jinja2
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Mount, Route
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# route label of requests no route matched
+UNMATCHED = "unmatched"
+
+Labels = typing.Tuple[str, ...]
+
+
+def format_labels(names: Labels, values: Labels) -> str:
+    if not names:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, value.replace("\\", "\\\\")
+                     .replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values))
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter():
+    """
+    Monotonic count per label values.
+
+    Metrics are only recorded from the event loop thread, plain dict
+    updates are atomic there so no lock is taken on the request path.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Labels = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}  # type: typing.Dict[Labels, float]
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> typing.Iterator[typing.Tuple[str, Labels, float]]:
+        for labels, value in self.values.items():
+            yield self.name, labels, value
+
+
+class Gauge(Counter):
+    """
+    Current value per label values, set when recorded or read from
+    ``collect`` (returning {label values: value}) at every scrape
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Labels = (),
+                 collect: typing.Callable = None) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        self.values[labels] = value
+
+    def samples(self) -> typing.Iterator[typing.Tuple[str, Labels, float]]:
+        if self.collect is not None:
+            self.values = self.collect()
+        yield from super().samples()
+
+
+class Histogram(Counter):
+    """
+    Observations counted into fixed buckets per label values, the
+    buckets are made cumulative only when scraped
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Labels = (),
+                 buckets: typing.Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket and +Inf, sum]
+        self.values = {}  # type: typing.Dict[Labels, list]
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [
+                [0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> typing.Iterator[typing.Tuple[str, Labels, float]]:
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield (self.name + "_bucket",
+                       labels + (format_value(bound),), cumulative)
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, cumulative
+
+
+class Registry():
+    """
+    Metrics of this process in the Prometheus text exposition format
+    """
+
+    def __init__(self) -> None:
+        self.metrics = []  # type: typing.List[Counter]
+
+    def register(self, metric: Counter) -> Counter:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append("# HELP %s %s" % (metric.name, metric.documentation))
+            lines.append("# TYPE %s %s" % (metric.name, metric.kind))
+            for name, labels, value in metric.samples():
+                labelnames = metric.labelnames
+                if name.endswith("_bucket"):
+                    labelnames += ("le",)
+                lines.append("%s%s %s" % (
+                    name, format_labels(labelnames, labels),
+                    format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route, method and status.",
+    ("route", "method", "status"))
+http_latency = registry.histogram(
+    "http_request_duration_seconds",
+    "Time from the request to the end of the response body by route.",
+    ("route",))
+db_queries = registry.counter(
+    "db_queries_total", "SQL queries run by route.", ("route",))
+db_time = registry.counter(
+    "db_query_seconds_total", "Time spent in SQL queries by route.",
+    ("route",))
+template_render = registry.histogram(
+    "template_render_seconds", "Render time of (non-streamed) templates.",
+    ("template",))
+loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Delay of event loop callbacks past their "
+    "scheduled time.", buckets=(
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+
+class TimedTemplate(jinja2.Template):
+    """
+    Template recording its render time, set as the template_class of an
+    environment before templates are loaded
+    """
+
+    def render(self, *args, **kwargs) -> str:
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            template_render.observe(
+                time.perf_counter() - start, (self.name or "",))
+
+
+def route_names(routes: typing.Sequence) -> typing.Dict[typing.Any, str]:
+    """
+    Route name of each endpoint (and mounted app) of the routes
+    """
+    names = {}
+    for route in routes:
+        if isinstance(route, Route):
+            names[route.endpoint] = route.name
+        elif isinstance(route, Mount):
+            if route.routes:
+                names.update(route_names(route.routes))
+            else:
+                names[route.app] = route.name
+    return names
+
+
+class MetricsMiddleware():
+    """
+    Pure ASGI middleware counting HTTP requests and their latency and
+    queries (from the query log of QueryLogMiddleware, if it runs
+    outside) by the name of the matched route.
+    """
+
+    def __init__(self, app: ASGIApp, routes: typing.Sequence) -> None:
+        self.app = app
+        self.routes = routes
+        self.names = None
+
+    def route_name(self, scope: Scope) -> str:
+        if self.names is None:
+            # routes are complete by the first request
+            self.names = route_names(self.routes)
+        return self.names.get(scope.get("endpoint"), UNMATCHED)
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        method = scope["method"]
+        start = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = self.route_name(scope)
+            http_requests.inc((route, method, str(status)))
+            http_latency.observe(time.perf_counter() - start, (route,))
+            log = scope.get("query_log")
+            if log is not None:
+                db_queries.inc((route,), log.count)
+                db_time.inc((route,), log.total_ms / 1000)
+
+
+class LoopLagMonitor():
+    """
+    Measures how late the event loop wakes up a task sleeping
+    ``interval`` seconds, long synchronous work (rendering, hashing,
+    JSON) in a request shows up as lag of every other request.
+    """
+
+    def __init__(self, interval: float = 0.5) -> None:
+        self.interval = interval
+        self._task = None
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            loop_lag.observe(max(0.0, loop.time() - start - self.interval))
+
+    async def start(self):
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+def metrics_endpoint(token: str = "",
+                     public: bool = False) -> typing.Callable:
+    """
+    /metrics view, requiring ``Authorization: Bearer <token>``. Without a
+    token it is not found unless ``public`` opens it to everyone.
+    """
+    async def metrics(request) -> Response:
+        if not token and not public:
+            return PlainTextResponse("Not Found", status_code=404)
+        if token and not hmac.compare_digest(
+                request.headers.get("authorization", "").encode(),
+                ("Bearer " + token).encode()):
+            return PlainTextResponse("Forbidden", status_code=403)
+        return PlainTextResponse(
+            registry.expose(), media_type="text/plain; version=0.0.4")
+    return metrics
@@ -0,0 +1,57 @@
+import typing
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# headers that keep clients from storing a response, left out when the
+# response sets its own Cache-Control (pages with an ETag, static files)
+CACHE_HEADERS = {"cache-control", "pragma", "expires"}
+
+
+class SecureHeadersMiddleware():
+    """
+    Pure ASGI middleware adding security headers to every HTTP response.
+
+    The header lines are encoded once, each response start message gets
+    them appended in place of headers of the same name, without wrapping
+    the response body.
+    """
+
+    def __init__(self, app: ASGIApp, headers: typing.Dict[str, str]) -> None:
+        self.app = app
+        raw_headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in headers.items()
+        ]
+        # (headers added, names they replace) without and with a
+        # Cache-Control of the response
+        self.added = self.header_set(raw_headers)
+        self.added_keeping_cache = self.header_set([
+            (name, value) for name, value in raw_headers
+            if name.decode() not in CACHE_HEADERS
+        ])
+
+    @staticmethod
+    def header_set(raw_headers: typing.List[typing.Tuple[bytes, bytes]]):
+        return raw_headers, {name for name, _ in raw_headers}
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                raw_headers = message.get("headers", [])
+                own_cache_control = any(
+                    name.lower() == b"cache-control"
+                    for name, _ in raw_headers)
+                added, names = (
+                    self.added_keeping_cache if own_cache_control
+                    else self.added)
+                message = dict(message, headers=[
+                    (name, value) for name, value in raw_headers
+                    if name.lower() not in names
+                ] + added)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -1,10 +1,16 @@
 # pagination from encode hostedapi
 # https://github.com/encode/hostedapi/blob/master/source/pagination.py
 
+import base64
+import datetime
+import json
 import typing
 from dataclasses import dataclass
-from math import ceil
+from functools import reduce
+from math import ceil, isfinite
+from operator import or_
 from starlette.datastructures import URL, QueryParams
+from tortoise.query_utils import Q
 
 
 @dataclass
@@ -36,21 +42,125 @@ def get_page_number(url: URL) -> int:
         return 1
 
 
+def get_cursor(url: URL) -> typing.Optional[str]:
+    """
+    Return a keyset cursor token specified in the URL query parameters.
+    """
+    return QueryParams(url.query).get("cursor") or None
+
+
+def encode_cursor(values: typing.Sequence, before: bool = False) -> str:
+    """
+    Return an opaque token for the rows after (or before) the given
+    ordering key values.
+    """
+    payload = {
+        "v": [
+            {"dt": value.isoformat()}
+            if isinstance(value, datetime.datetime) else value
+            for value in values
+        ],
+        "b": before,
+    }
+    data = json.dumps(payload, separators=(",", ":")).encode("utf8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(
+    token: str
+) -> typing.Optional[typing.Tuple[typing.List, bool]]:
+    """
+    Return the (values, before) pair of a cursor token, or None when the
+    token is malformed.
+    """
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(data)
+        values = [
+            datetime.datetime.fromisoformat(value["dt"])
+            if isinstance(value, dict) else value
+            for value in payload["v"]
+        ]
+        return values, bool(payload["b"])
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
+# types an ordering key value may have in a cursor token
+KEY_TYPES = (int, float, str, datetime.datetime)
+# bounds of the 64-bit integer columns the values are compared with
+MIN_INT, MAX_INT = -2 ** 63, 2 ** 63 - 1
+
+
+def valid_key(values: typing.Sequence, types: typing.Sequence) -> bool:
+    """
+    Whether decoded cursor values fit the ordering fields, one value of
+    the field type (or any key type when it is None) per field
+    """
+    if len(values) != len(types):
+        return False
+    for value, expected in zip(values, types):
+        if isinstance(value, bool) or not isinstance(value, KEY_TYPES):
+            return False
+        if expected is not None and not isinstance(value, expected):
+            return False
+        if isinstance(value, int) and not MIN_INT <= value <= MAX_INT:
+            return False
+        if isinstance(value, float) and not isfinite(value):
+            return False
+    return True
+
+
+def cursor_url(url: URL, cursor: typing.Optional[str]) -> typing.Optional[URL]:
+    """
+    Return the URL of the page a cursor token points at.
+    """
+    if cursor is None:
+        return None
+    return url.remove_query_params("page").include_query_params(cursor=cursor)
+
+
 def get_page_controls(
-    url: URL, current_page: int, total_pages: int
+    url: URL,
+    current_page: typing.Optional[int],
+    total_pages: typing.Optional[int],
+    previous_cursor: typing.Optional[str] = None,
+    next_cursor: typing.Optional[str] = None,
+    is_estimate: bool = False,
 ) -> typing.List[PageControl]:
     """
     Returns a list of pagination controls, using GitHub's style for rendering
     which controls should be displayed. See eg. issue pages in GitHub.
 
     Previous [1] 2 3 4 5 ... 14 15 Next
+
+    In keyset mode (``current_page`` is None) only First, Previous and
+    Next controls are rendered from the cursor tokens. In numbered mode a
+    ``next_cursor`` on the last page links on to keyset mode. When the
+    total is only an estimate the last pages are replaced by "many pages".
     """
+    if current_page is None:
+        first_url = url.remove_query_params(["page", "cursor"])
+        return [
+            PageControl(text="First", url=first_url),
+            PageControl(
+                text="Previous",
+                url=cursor_url(url, previous_cursor),
+                is_disabled=previous_cursor is None,
+            ),
+            PageControl(
+                text="Next",
+                url=cursor_url(url, next_cursor),
+                is_disabled=next_cursor is None,
+            ),
+        ]
+
     assert total_pages >= 1
     assert current_page >= 1
     assert current_page <= total_pages
 
     # If we've only got a single page, then don't include pagination controls.
-    if total_pages == 1:
+    if total_pages == 1 and next_cursor is None:
         return []
 
     # We always have 5 contextual page numbers around the current page.
@@ -97,6 +207,10 @@ def get_page_controls(
         # 91 92 [93] 94 95 … 98 99 |
         end_block = [None] + end_block
 
+    if is_estimate:
+        # We don't know where the last page is, don't link to it.
+        end_block = []
+
     # We've got a list of integer/None values representing which pages to
     # display in the controls. Now we use those to generate the actual
     # PageControl instances.
@@ -136,8 +250,15 @@ def get_page_controls(
             )
             controls.append(page)
 
+    if is_estimate:
+        controls.append(PageControl(text="many pages", is_disabled=True))
+
     # Add a 'Next' page control.
-    if current_page == total_pages:
+    if current_page == total_pages and next_cursor is not None:
+        # Past the last numbered page, continue with keyset pagination.
+        next_url = cursor_url(url, next_cursor)
+        next_disabled = False
+    elif current_page == total_pages:
         next_url = None
         next_disabled = True
     else:
@@ -155,12 +276,111 @@ class Pagination():
     page_query: str
     count: int
     page_size: int = 2  # change to set more result per page
+    max_pages: int = None  # deeper pages are only reachable by cursor
+    is_estimate: bool = False  # count is a lower bound or planner estimate
 
     def total_pages(self) -> int:
-        return max(ceil(self.count / self.page_size), 1)
+        pages = max(ceil(self.count / self.page_size), 1)
+        if self.max_pages:
+            return min(pages, self.max_pages)
+        return pages
+
+    def is_truncated(self) -> bool:
+        # an estimated count is a lower bound, assume there is more
+        return (self.is_estimate or
+                ceil(self.count / self.page_size) > self.total_pages())
 
     def current_page(self) -> int:
         return max(min(self.page_query, self.total_pages()), 1)
 
     def offset(self) -> int:
         return (self.current_page() - 1) * self.page_size
+
+
+@dataclass
+class KeysetPagination():
+    """
+    Seek pagination over an ordering whose last field is unique (eg. id).
+
+    Instead of OFFSET, each page filters on the ordering key of the row
+    next to it, so page 10,000 costs the same index seek as page 1.
+    """
+    cursor: typing.Optional[str]
+    ordering: typing.Sequence[str]
+    page_size: int = 2  # change to set more result per page
+    model: typing.Any = None  # model the cursor values are checked against
+    types: typing.Sequence = None  # or their types, without a model
+
+    def __post_init__(self):
+        self.fields = [
+            (field.lstrip("-"), field.startswith("-"))
+            for field in self.ordering
+        ]
+        # a token that does not fit the ordering was forged or belongs to
+        # another listing, start again from the first page
+        decoded = decode_cursor(self.cursor) if self.cursor else None
+        if decoded is None or not valid_key(decoded[0], self.key_types()):
+            decoded = None, False
+        self.values, self.before = decoded
+
+    def key_types(self) -> typing.List:
+        if self.types is not None:
+            return list(self.types)
+        if self.model is None:
+            return [None] * len(self.fields)
+        fields_map = self.model._meta.fields_map
+        return [fields_map[name].field_type for name, _ in self.fields]
+
+    def filter(self) -> typing.Optional[Q]:
+        """
+        Return the seek predicate, eg. for ("-view", "-id") after (v, i):
+        view < v OR (view = v AND id < i)
+        """
+        if self.values is None:
+            return None
+        clauses = []
+        for idx, (name, descending) in enumerate(self.fields):
+            lookup = "lt" if descending != self.before else "gt"
+            kwargs = {
+                field: value for (field, _), value
+                in zip(self.fields[:idx], self.values[:idx])
+            }
+            kwargs["{}__{}".format(name, lookup)] = self.values[idx]
+            clauses.append(Q(**kwargs))
+        return reduce(or_, clauses)
+
+    def query_ordering(self) -> typing.List[str]:
+        """
+        Ordering for the page query, reversed when paging backwards.
+        """
+        if not self.before:
+            return list(self.ordering)
+        return [
+            name if descending else "-" + name
+            for name, descending in self.fields
+        ]
+
+    def limit(self) -> int:
+        # one extra row tells whether there is another page
+        return self.page_size + 1
+
+    def key(self, row) -> typing.List:
+        return [getattr(row, name) for name, _ in self.fields]
+
+    def paginate(self, rows: typing.List) -> typing.List:
+        """
+        Trim the extra row, restore display order and compute the
+        previous and next cursor tokens.
+        """
+        has_more = len(rows) > self.page_size
+        rows = list(rows[:self.page_size])
+        if self.before:
+            rows.reverse()
+        self.previous_cursor = self.next_cursor = None
+        if rows and (self.values is not None or self.before):
+            if has_more or not self.before:
+                self.previous_cursor = encode_cursor(
+                    self.key(rows[0]), before=True)
+        if rows and (has_more or self.before):
+            self.next_cursor = encode_cursor(self.key(rows[-1]))
+        return rows
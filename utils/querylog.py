@@ -0,0 +1,155 @@
+import contextvars
+import functools
+import logging
+import time
+import typing
+from collections import OrderedDict
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from tortoise import Tortoise
+
+logger = logging.getLogger(__name__)
+
+# Tortoise client methods that send SQL to the database
+QUERY_METHODS = (
+    "execute_query",
+    "execute_query_dict",
+    "execute_insert",
+    "execute_many",
+    "execute_script",
+)
+
+
+class QueryLog():
+    """
+    SQL statements of one request with their durations in milliseconds
+    """
+
+    def __init__(self) -> None:
+        self.queries = []  # type: typing.List[typing.Tuple[str, float]]
+
+    def add(self, sql: str, duration: float) -> None:
+        self.queries.append((sql, duration))
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(duration for _, duration in self.queries)
+
+    def grouped(self) -> typing.List[typing.Tuple[str, int, float]]:
+        """
+        (sql, times run, total ms) of each distinct statement, slowest
+        first, so repeated per-row queries stand out
+        """
+        groups = OrderedDict()  # type: OrderedDict
+        for sql, duration in self.queries:
+            count, total = groups.get(sql, (0, 0.0))
+            groups[sql] = (count + 1, total + duration)
+        return sorted(
+            ((sql, count, total) for sql, (count, total) in groups.items()),
+            key=lambda group: group[2], reverse=True)
+
+
+# log of the request being handled, None outside of requests
+current_log = contextvars.ContextVar(
+    "current_log", default=None)  # type: contextvars.ContextVar
+
+
+def current_queries() -> typing.Optional[QueryLog]:
+    """
+    Query log of the current request
+    """
+    return current_log.get()
+
+
+def timed(method: typing.Callable) -> typing.Callable:
+    @functools.wraps(method)
+    async def wrapper(client, query, *args, **kwargs):
+        log = current_log.get()
+        if log is None:
+            return await method(client, query, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await method(client, query, *args, **kwargs)
+        finally:
+            log.add(query, (time.perf_counter() - start) * 1000)
+    wrapper.timed = True
+    return wrapper
+
+
+def client_classes(cls: type) -> typing.Iterator[type]:
+    yield cls
+    # transaction wrappers subclass the client and override some methods
+    for subclass in cls.__subclasses__():
+        yield from client_classes(subclass)
+
+
+def instrument_queries() -> None:
+    """
+    Time the statements sent through the Tortoise connections, call once
+    they are open. Queries are only recorded within QueryLogMiddleware.
+    """
+    for connection in Tortoise._connections.values():
+        for cls in client_classes(type(connection)):
+            for name in QUERY_METHODS:
+                method = cls.__dict__.get(name)
+                if method is None or getattr(method, "timed", False):
+                    continue
+                setattr(cls, name, timed(method))
+
+
+class QueryLogMiddleware():
+    """
+    Pure ASGI middleware recording the queries of each HTTP request.
+
+    The log is kept in ``scope["query_log"]``, its count and time are
+    sent in a Server-Timing header along with the time to the response
+    start (queries of a streamed body come later and only count towards
+    the log). Requests running more than ``max_queries`` queries or
+    ``max_db_ms`` of database time are logged as warnings with their SQL.
+    """
+
+    def __init__(self, app: ASGIApp, max_queries: int = 20,
+                 max_db_ms: float = 100.0) -> None:
+        self.app = app
+        self.max_queries = max_queries
+        self.max_db_ms = max_db_ms
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = scope["query_log"] = QueryLog()
+        token = current_log.set(log)
+        start = time.perf_counter()
+        # mounted apps rewrite the path of the scope
+        request_line = "%s %s" % (scope["method"], scope["path"])
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(
+                    "Server-Timing",
+                    'db;dur=%.1f;desc="%d queries", app;dur=%.1f' % (
+                        log.total_ms, log.count,
+                        (time.perf_counter() - start) * 1000))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_log.reset(token)
+            if (log.count > self.max_queries
+                    or log.total_ms > self.max_db_ms):
+                self.log_slow(request_line, log)
+
+    def log_slow(self, request_line: str, log: QueryLog) -> None:
+        lines = ["%s ran %d queries in %.1f ms" % (
+            request_line, log.count, log.total_ms)]
+        for sql, count, total in log.grouped():
+            lines.append("  %4dx %8.1f ms  %s" % (count, total, sql))
+        logger.warning("\n".join(lines))
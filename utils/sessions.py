@@ -0,0 +1,204 @@
+import json
+import secrets
+import time
+import typing
+import aiosqlite
+import itsdangerous
+from itsdangerous.exc import BadSignature
+from starlette.datastructures import MutableHeaders, Secret
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# expired sessions are removed at most this often (seconds)
+PURGE_INTERVAL = 600
+
+
+class MemorySessionStore():
+    """
+    Sessions of this process only, lost on restart
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.last_purge = time.monotonic()
+
+    async def load(self, session_id: str) -> typing.Optional[str]:
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            return None
+        expires, data = entry
+        if expires < time.time():
+            del self.sessions[session_id]
+            return None
+        return data
+
+    async def save(self, session_id: str, data: str, max_age: int) -> None:
+        self.sessions[session_id] = (time.time() + max_age, data)
+        if time.monotonic() - self.last_purge > PURGE_INTERVAL:
+            self.last_purge = time.monotonic()
+            now = time.time()
+            for key, (expires, _) in list(self.sessions.items()):
+                if expires < now:
+                    del self.sessions[key]
+
+    async def delete(self, session_id: str) -> None:
+        self.sessions.pop(session_id, None)
+
+    async def close(self) -> None:
+        self.sessions.clear()
+
+
+class SQLiteSessionStore():
+    """
+    Sessions in an SQLite file, shared by the workers of one host and
+    kept across restarts
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = None
+        self.last_purge = time.monotonic()
+
+    async def connect(self) -> aiosqlite.Connection:
+        if self.db is None:
+            self.db = await aiosqlite.connect(self.path)
+            # a crash may lose the last session writes, not corrupt them
+            await self.db.execute("PRAGMA journal_mode=WAL")
+            await self.db.execute("PRAGMA synchronous=NORMAL")
+            await self.db.execute(
+                "CREATE TABLE IF NOT EXISTS session ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                "expires REAL NOT NULL)")
+            await self.db.commit()
+        return self.db
+
+    async def load(self, session_id: str) -> typing.Optional[str]:
+        db = await self.connect()
+        cursor = await db.execute(
+            "SELECT data FROM session WHERE id = ? AND expires >= ?",
+            (session_id, time.time()))
+        row = await cursor.fetchone()
+        await cursor.close()
+        return row[0] if row else None
+
+    async def save(self, session_id: str, data: str, max_age: int) -> None:
+        db = await self.connect()
+        await db.execute(
+            "INSERT OR REPLACE INTO session (id, data, expires) "
+            "VALUES (?, ?, ?)", (session_id, data, time.time() + max_age))
+        if time.monotonic() - self.last_purge > PURGE_INTERVAL:
+            self.last_purge = time.monotonic()
+            await db.execute(
+                "DELETE FROM session WHERE expires < ?", (time.time(),))
+        await db.commit()
+
+    async def delete(self, session_id: str) -> None:
+        db = await self.connect()
+        await db.execute("DELETE FROM session WHERE id = ?", (session_id,))
+        await db.commit()
+
+    async def close(self) -> None:
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
+
+SESSION_STORES = {
+    "memory": lambda path: MemorySessionStore(),
+    "sqlite": SQLiteSessionStore,
+}
+
+
+def make_session_store(backend: str, path: str):
+    """
+    Session store of a SESSION_BACKEND name
+    """
+    return SESSION_STORES[backend](path)
+
+
+class ServerSessionMiddleware():
+    """
+    Drop-in replacement of Starlette's SessionMiddleware keeping the
+    session data in a store, the cookie only carries a signed random id.
+
+    The data and the cookie are written only when the request changed
+    the session, so sessions expire max_age seconds after their last
+    change. A cleared session is deleted along with its cookie.
+
+    Sessions holding nothing but ``transient_keys`` expire after
+    ``transient_max_age`` seconds instead, so the rows left by clients
+    that never return cookies (crawlers) are purged soon.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: typing.Any,
+        secret_key: typing.Union[str, Secret],
+        session_cookie: str = "session",
+        max_age: int = 14 * 24 * 60 * 60,  # 14 days, in seconds
+        same_site: str = "lax",
+        https_only: bool = False,
+        transient_keys: typing.Sequence[str] = (),
+        transient_max_age: int = None,
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.signer = itsdangerous.Signer(str(secret_key))
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.transient_keys = set(transient_keys)
+        self.transient_max_age = transient_max_age or max_age
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:  # Secure flag can be used with HTTPS only
+            self.security_flags += "; secure"
+
+    async def load(self, scope: Scope) -> typing.Tuple[str, str]:
+        cookie = HTTPConnection(scope).cookies.get(self.session_cookie)
+        if cookie:
+            try:
+                session_id = self.signer.unsign(cookie).decode()
+            except BadSignature:
+                return None, None
+            return session_id, await self.store.load(session_id)
+        return None, None
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id, initial = await self.load(scope)
+        scope["session"] = json.loads(initial) if initial else {}
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal session_id
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                data = json.dumps(session) if session else None
+                if data is not None and data != initial:
+                    transient = set(session) <= self.transient_keys
+                    max_age = (
+                        self.transient_max_age if transient
+                        else self.max_age)
+                    if initial is None:
+                        session_id = secrets.token_urlsafe(18)
+                    await self.store.save(session_id, data, max_age)
+                    MutableHeaders(scope=message).append(
+                        "Set-Cookie", "%s=%s; path=/; Max-Age=%d; %s" % (
+                            self.session_cookie,
+                            self.signer.sign(session_id).decode(),
+                            max_age,
+                            self.security_flags,
+                        ))
+                elif data is None and initial is not None:
+                    # the session has been cleared
+                    await self.store.delete(session_id)
+                    MutableHeaders(scope=message).append(
+                        "Set-Cookie", "%s=null; path=/; expires=Thu, "
+                        "01 Jan 1970 00:00:00 GMT; %s" % (
+                            self.session_cookie, self.security_flags))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
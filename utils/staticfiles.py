@@ -0,0 +1,164 @@
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import typing
+import jinja2
+from aiofiles.os import stat as aio_stat
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+from whitenoise.compress import Compressor
+
+MANIFEST = "manifest.json"
+# fingerprinted files never change, clients keep them for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+# precompressed variants, preferred in this order
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+ZEROCOPY = "http.response.zerocopysend"
+
+
+def fingerprint(path: str, data: bytes) -> str:
+    """
+    css/site.css -> css/site.<first 12 hex digits of the md5>.css
+    """
+    base, ext = os.path.splitext(path)
+    return "{}.{}{}".format(base, hashlib.md5(data).hexdigest()[:12], ext)
+
+
+def build_static(source: str, target: str) -> typing.Dict[str, str]:
+    """
+    Copy every file of source into a fresh target directory under its
+    fingerprinted name, with gzip and brotli (if installed) variants when
+    they are worth it, and write the manifest of names. Returns the
+    manifest.
+    """
+    shutil.rmtree(target, ignore_errors=True)
+    compressor = Compressor(quiet=True)
+    manifest = {}
+    for root, _, files in os.walk(source):
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, source).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                hashed = fingerprint(name, f.read())
+            output = os.path.join(target, hashed)
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            shutil.copy2(path, output)
+            if compressor.should_compress(output):
+                list(compressor.compress(output))
+            manifest[name] = hashed
+    with open(os.path.join(target, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(directory: str) -> typing.Dict[str, str]:
+    """
+    Manifest written by build_static, empty if it was not run
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def static_url_for(manifest: typing.Dict[str, str]) -> typing.Callable:
+    """
+    url_for template global emitting fingerprinted static URLs for the
+    files of the manifest
+    """
+    @jinja2.contextfunction
+    def url_for(context: dict, name: str, **path_params: typing.Any) -> str:
+        if name == "static":
+            path = path_params["path"].lstrip("/")
+            path_params["path"] = "/" + manifest.get(path, path)
+        return context["request"].url_for(name, **path_params)
+
+    return url_for
+
+
+def accepted_encodings(headers: Headers) -> typing.Set[str]:
+    encodings = set()
+    for item in headers.get("accept-encoding", "").split(","):
+        encoding, _, params = item.partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00"):
+            continue
+        encodings.add(encoding.strip().lower())
+    return encodings
+
+
+class StaticFileResponse(FileResponse):
+    """
+    File response sent with the ASGI zero-copy extension when the server
+    offers it, read in 64 KiB chunks otherwise
+    """
+    chunk_size = 64 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if (self.send_header_only or self.stat_result is None
+                or ZEROCOPY not in scope.get("extensions", {})):
+            await super().__call__(scope, receive, send)
+            return
+        with open(self.path, "rb") as file:
+            await send({
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            })
+            await send({"type": ZEROCOPY, "file": file, "more_body": False})
+
+
+class HashedStaticFiles(StaticFiles):
+    """
+    Serves the fingerprinted files of a build_static directory with
+    immutable cache headers, as the smallest precompressed variant the
+    client accepts. Other paths are served from directory as before.
+    """
+
+    def __init__(self, *, directory: str, build_directory: str,
+                 manifest: typing.Dict[str, str]) -> None:
+        super().__init__(directory=directory)
+        self.build_directory = build_directory
+        # fingerprinted name -> (media type, available encodings)
+        self.hashed = {}
+        for name, hashed in manifest.items():
+            path = os.path.join(build_directory, hashed)
+            media_type = mimetypes.guess_type(name)[0] or "text/plain"
+            self.hashed[hashed] = (media_type, [
+                (encoding, suffix) for encoding, suffix in ENCODINGS
+                if os.path.exists(path + suffix)
+            ])
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        name = path.replace(os.sep, "/")
+        if name not in self.hashed or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        media_type, encodings = self.hashed[name]
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers)
+        full_path = os.path.join(self.build_directory, name)
+        headers = {"cache-control": IMMUTABLE, "vary": "Accept-Encoding"}
+        for encoding, suffix in encodings:
+            if encoding in accepted:
+                full_path += suffix
+                headers["content-encoding"] = encoding
+                break
+        try:
+            stat_result = await aio_stat(full_path)
+        except FileNotFoundError:
+            return await super().get_response(path, scope)
+        response = StaticFileResponse(
+            full_path,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+            method=scope["method"],
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,74 @@
+import typing
+import jinja2
+from markupsafe import Markup
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
+
+# Pages are sent in chunks of about this size, and early at every flush()
+# call of the templates (base.html flushes after the navbar).
+STREAM_CHUNK_SIZE = 16 * 1024
+FLUSH = Markup("<!-- flush -->")
+
+
+async def chunked(parts: typing.AsyncIterator[str],
+                  chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Join the many small strings produced by Jinja into chunks, sending
+    what is buffered when the template calls flush()
+    """
+    buffer, size = [], 0
+    async for part in parts:
+        if part == FLUSH:
+            if buffer:
+                yield "".join(buffer)
+            buffer, size = [], 0
+            continue
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+class StreamingTemplates():
+    """
+    Async twin of a Jinja2Templates instance: same loader and globals,
+    but templates are rendered with Jinja's async generate and streamed.
+
+    Context values may be async iterables (eg. batches of query results)
+    that are consumed while the page is sent, so the head and navbar go
+    out before the slow part is queried and the whole page is never held
+    in memory. Headers are sent first, errors while streaming cut the
+    response short instead of rendering the 500 page.
+    """
+
+    def __init__(self, templates: typing.Any) -> None:
+        self.env = jinja2.Environment(
+            loader=templates.env.loader, autoescape=True, enable_async=True)
+        self.env.globals.update(templates.env.globals)
+        self.env.globals["flush"] = lambda: FLUSH
+
+    def get_template(self, name: str) -> "jinja2.Template":
+        return self.env.get_template(name)
+
+    def TemplateResponse(
+        self,
+        name: str,
+        context: dict,
+        status_code: int = 200,
+        headers: dict = None,
+        media_type: str = "text/html",
+        background: BackgroundTask = None,
+    ) -> StreamingResponse:
+        if "request" not in context:
+            raise ValueError('context must include a "request" key')
+        template = self.get_template(name)
+        return StreamingResponse(
+            chunked(template.generate_async(context)),
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            background=background,
+        )
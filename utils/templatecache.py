@@ -0,0 +1,25 @@
+import os
+import typing
+import jinja2
+
+
+def bytecode_cache(directory: str, prefix: str) -> jinja2.BytecodeCache:
+    """
+    Bytecode cache in directory, created if missing. Environments with
+    different compile options (async) need different prefixes, their
+    code is not interchangeable.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return jinja2.FileSystemBytecodeCache(
+        directory, "{}-%s.cache".format(prefix))
+
+
+def load_templates(env: jinja2.Environment) -> typing.List[str]:
+    """
+    Load every template of the environment into its template cache,
+    compiling (and writing the bytecode cache of) those not cached yet
+    """
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return names